@@ -0,0 +1,143 @@
+"""Run a batch of requests through BatchRunner against a local stub LLM.
+
+The stub answers each request with a fixed response after ``--latency``
+seconds. The batch mixes aggregations, a request that adds a column and
+later requests that use it, plotly and matplotlib plots, an explanation,
+a profile answer and failing code. It runs once with one LLM call at a
+time and once with ``--concurrency`` calls in flight.
+
+Checks that every request gets its expected output, that prompts sent
+before the column was added are sent again with the new schema, that
+figures are written and that overlapping LLM calls with code execution
+cuts the wall time.
+
+Usage: python benchmarks/bench_batch.py [--rows 500000] [--latency 0.4] [--concurrency 4]
+Exits with status 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from batch import BatchRequest, BatchRunner  # noqa: E402
+from llm.chain import LLMChainManager  # noqa: E402
+from stub_llm import StubLLMServer  # noqa: E402
+from utils.sandbox import run_code  # noqa: E402
+
+
+def code(source: str) -> str:
+    return json.dumps({"response_type": "code", "content": source})
+
+
+# request -> (stub response, text expected in the output or content)
+REQUESTS = {
+    "average price per region": (code("print(df.groupby('region')['price'].mean().round(2))"), "north"),
+    "median quantity per category": (code("print(df.groupby('category')['quantity'].median())"), "books"),
+    "add a revenue column": (code("df['revenue'] = df['price'] * df['quantity']"), ""),
+    "total revenue per region": (code("print(df.groupby('region')['revenue'].sum().round(0))"), "south"),
+    "bar chart of revenue by region": (code(
+        "import plotly.express as px\n"
+        "fig = px.bar(df.groupby('region', as_index=False)['revenue'].sum(), x='region', y='revenue')"), ""),
+    "histogram of unit cost with matplotlib": (code(
+        "import matplotlib.pyplot as plt\nfig, ax = plt.subplots()\nax.hist(df['unit_cost'], bins=30)"), ""),
+    "what does the quantity column mean?": (json.dumps(
+        {"response_type": "explanation", "content": "Units sold in each order."}), "Units sold"),
+    "describe the data": (code("print(df.describe())"), "rows"),
+    "rolling mean of price": (code("print(df['price'].rolling(1000).mean().tail(3))"), ""),
+    "price quantiles per region": (code("print(df.groupby('region')['price'].quantile([0.1, 0.9]))"), "0.9"),
+    "use a column that does not exist": (code("print(df['colour'].mean())"), ""),
+    "orders above 100 revenue": (code("print((df['revenue'] > 100).sum())"), ""),
+}
+FAILING = "use a column that does not exist"
+USES_NEW_COLUMN = ["total revenue per region", "bar chart of revenue by region", "orders above 100 revenue"]
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "price": rng.gamma(2.0, 20.0, size=rows),
+        "quantity": rng.integers(1, 50, size=rows),
+        "unit_cost": rng.normal(10, 2, size=rows),
+        "region": rng.choice(["north", "south", "east", "west"], size=rows),
+        "category": rng.choice(["toys", "books", "garden", "food", "tools"], size=rows),
+    })
+
+
+def prompt_request(body: dict) -> str:
+    prompt = body["contents"][0]["parts"][0]["text"]
+    return re.findall(r"User request: (.*)", prompt)[-1].strip()
+
+
+def run_batch(df: pd.DataFrame, concurrency: int, latency: float, failures: list) -> dict:
+    with StubLLMServer(lambda body: REQUESTS[prompt_request(body)][0], latency=latency) as server, \
+            tempfile.TemporaryDirectory() as out_dir:
+        os.environ["GEMINI_BASE_URL"] = server.url
+        LLMChainManager.configure()
+        LLMChainManager._cache = None  # a fresh response cache per run
+        requests = [BatchRequest(str(i), request) for i, request in enumerate(REQUESTS, 1)]
+        summary = BatchRunner(df, out_dir, file_path="orders.csv", concurrency=concurrency).run(requests)
+        with open(os.path.join(out_dir, "results.jsonl")) as f:
+            records = {record["request"]: record for record in map(json.loads, f)}
+        figures = sorted(os.listdir(os.path.join(out_dir, "figures")))
+        prompts = [body["contents"][0]["parts"][0]["text"] for body in server.prompts]
+
+    label = f"concurrency {concurrency}"
+    for request, (_, expected) in REQUESTS.items():
+        record = records[request]
+        if request == FAILING:
+            if not record["error"] or "colour" not in record["error"]:
+                failures.append(f"{label}: {request!r} should fail, got {record['error']!r}")
+        elif record["error"] or expected not in (record["output"] or "") + (record["content"] or ""):
+            failures.append(f"{label}: {request!r} expected {expected!r}, got {record}")
+    for request in USES_NEW_COLUMN:
+        sent = [p for p in prompts if re.findall(r"User request: (.*)", p)[-1].strip() == request]
+        if not sent or "revenue" not in sent[-1].split("User request:")[0].split("Schema summary:")[1]:
+            failures.append(f"{label}: last prompt for {request!r} does not describe the revenue column")
+    if records["describe the data"]["source"] != "profile":
+        failures.append(f"{label}: 'describe the data' was not answered from the profile")
+    if not any(name.endswith(".html") for name in figures) or not any(name.endswith(".png") for name in figures):
+        failures.append(f"{label}: figures written {figures}")
+    return dict(summary, figures=len(figures), requests_sent=len(prompts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ.update(GOOGLE_API_KEY="stub-key", LLM_PROVIDER="gemini", LLM_RATE_LIMIT="0")
+    df = make_frame(args.rows)
+    # Start the sandbox workers so neither run pays for it
+    run_code("print(1)", df.head())
+
+    failures = []
+    results = {}
+    for concurrency in (1, args.concurrency):
+        summary = run_batch(df, concurrency, args.latency, failures)
+        summary.pop("client", None)
+        summary.pop("cache", None)
+        results[f"concurrency_{concurrency}"] = summary
+    serial = results["concurrency_1"]["wall_s"]
+    pipelined = results[f"concurrency_{args.concurrency}"]["wall_s"]
+    results["speedup"] = round(serial / pipelined, 2)
+    if pipelined > serial * 0.7:
+        failures.append(f"pipelined run took {pipelined}s vs {serial}s with one call at a time")
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Check and time the AST preprocessing pipeline on a corpus of generated snippets.
+
+Every snippet in generated_snippets.json is cleaned, compiled and executed
+against a small sample frame; the detected figure names, removed calls and
+plot count must match the corpus. Timings compare the previous line/regex
+cleanup plus exec-from-source with the cached compiled-code path.
+
+Usage: python benchmarks/bench_code_transform.py [--repeat 200]
+Exits with status 1 if any snippet regresses.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import code_transform  # noqa: E402
+from utils.execution import run_generated_code  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(__file__), "generated_snippets.json")
+
+
+def legacy_clean(code: str) -> tuple[str, str]:
+    """Line/regex based cleanup used before the AST pipeline"""
+    code = code.replace('```python', '').replace('```', '').strip()
+    import_code = '\n'.join(line for line in code.split('\n') if 'import' in line)
+    code = '\n'.join(line for line in code.split('\n') if 'import' not in line)
+    code = re.sub(r'(?m)^\s*.*\.show\s*\([^)]*\)\s*;?\s*$', '', code)
+    code = re.sub(r'(?m)^\s*plotly\.(?:offline|io)\.(?:plot|show)\s*\([^)]*\)\s*;?\s*$', '', code)
+    code = re.sub(r'(?m)^\s*pio\.show\s*\([^)]*\)\s*;?\s*$', '', code)
+    code = re.sub(r'(?m)^\s*.*write_html\s*\([^)]*auto_open\s*=\s*True[^)]*\)\s*;?\s*$', '', code)
+    return import_code, code
+
+
+def sample_frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'price': rng.uniform(1, 100, 200),
+        'quantity': rng.integers(0, 20, 200).astype(float),
+        'region': rng.choice(['north', 'south', 'east'], 200),
+        'target': rng.integers(0, 2, 200),
+    })
+
+
+def check(snippets: list) -> list:
+    failures = []
+    for snippet in snippets:
+        name = snippet['name']
+        try:
+            prepared = code_transform.prepare_code(snippet['code'])
+            if list(prepared.figure_names) != snippet['figure_names']:
+                failures.append(f"{name}: figure names {prepared.figure_names} != {snippet['figure_names']}")
+            if sorted(prepared.removed_calls) != sorted(snippet['removed']):
+                failures.append(f"{name}: removed {prepared.removed_calls} != {snippet['removed']}")
+            _, results, _ = run_generated_code(snippet['code'], sample_frame())
+            if results['plots_created'] != snippet['plots']:
+                failures.append(f"{name}: plots_created {results['plots_created']} != {snippet['plots']}")
+        except Exception as e:
+            failures.append(f"{name}: {type(e).__name__}: {e}")
+        finally:
+            plt.close('all')
+    return failures
+
+
+def bench(snippets: list, repeat: int) -> dict:
+    sources = [s['code'] for s in snippets]
+
+    legacy_broken = set()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i, source in enumerate(sources):
+            import_code, body = legacy_clean(source)
+            try:
+                compile(import_code, '<generated>', 'exec')
+                compile(body, '<generated>', 'exec')
+            except SyntaxError:
+                legacy_broken.add(snippets[i]['name'])
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        code_transform._cache = code_transform.CodeCache()
+        for source in sources:
+            code_transform.prepare_code(source)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for source in sources:
+            code_transform.prepare_code(source)
+    warm = time.perf_counter() - start
+
+    per_snippet = 1e6 / (repeat * len(sources))
+    return {
+        'snippets': len(sources),
+        'legacy_us': round(legacy * per_snippet, 1),
+        'ast_cold_us': round(cold * per_snippet, 1),
+        'ast_cached_us': round(warm * per_snippet, 1),
+        'legacy_syntax_errors': sorted(legacy_broken),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        snippets = json.load(f)
+
+    failures = check(snippets)
+    print(json.dumps(bench(snippets, args.repeat), indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(snippets) - len(failures)}/{len(snippets)} snippets OK" if not failures else
+          f"{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""Time every stage of a request, offline, on synthetic datasets.
+
+For each dataset (narrow or wide, at each row count) the suite writes the
+frame in every format, times read_dataset on each file, then replays a
+recorded session through the same path as the app: dtype optimization,
+fingerprint and profile of the loaded frame, then for each request
+prompt (fit_prompt_inputs), llm (LLMChainManager.run on FakeStreamingLLM
+with the responses from generated_snippets.json), parse, execute
+(run_code), store (dtype optimization, fingerprint and change report of
+the result) and render (first page as Arrow, figures serialized as the
+browser would receive them).
+
+Every stage records its wall time and peak_mb, the highest resident
+memory while it ran above the level when it started, sampled every few
+milliseconds. With SANDBOX_WORKERS > 0 the execute stage only covers the
+parent process. xls is not written: pandas has no xls writer and
+read_dataset reads it like xlsx.
+
+Writes JSON: metadata (commit, versions, arguments) and one record per
+dataset and stage. --compare flags stages slower than a previous output
+by more than --tolerance.
+
+Usage: python benchmarks/bench_e2e.py [--rows 1000,100000] [--shapes narrow,wide]
+           [--formats csv,parquet,...] [--output results.json] [--compare baseline.json]
+Exits with status 1 if a stage fails or regressed against --compare.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from llm.chain import LLMChainManager, parse_llm_response  # noqa: E402
+from llm.fake import FakeStreamingLLM  # noqa: E402
+from llm.prompt import PromptBudget, fit_prompt_inputs  # noqa: E402
+from utils.dtypes import optimize_dtypes  # noqa: E402
+from utils.figures import FigureBudget  # noqa: E402
+from utils.fingerprint import describe_changes, diff_fingerprints, frame_fingerprint  # noqa: E402
+from utils.ingest import read_dataset  # noqa: E402
+from utils.profiling import profile_frame  # noqa: E402
+from utils.rendering import get_page  # noqa: E402
+from utils.sandbox import run_code  # noqa: E402
+
+from synthetic import FORMATS, NARROW_COLUMNS, file_name, make_dataset, skip_reason, write_dataset  # noqa: E402
+
+pd.set_option("mode.copy_on_write", True)
+
+SNIPPETS = os.path.join(os.path.dirname(__file__), "generated_snippets.json")
+
+# (request, recorded snippet name, or the text of an explanation)
+SESSION = [
+    ("Which columns have missing values?", "missing_values"),
+    ("Show the 10 most expensive orders", "filter_top_n"),
+    ("Total price by region as a bar chart", "groupby_bar_plotly"),
+    ("Correlation heatmap of the numeric columns", "correlation_heatmap_plotly"),
+    ("What does the quantity column represent?", None),
+    ("Add an important_score column equal to twice the price", "important_score_column"),
+    ("Histogram of price", "pandas_plot_hist"),
+    ("Scatter plot of price against quantity by region", "scatter_with_write_html"),
+    ("Share of orders per region as a pie chart", "value_counts_pie"),
+    ("Fill missing quantities with the median and make region categorical", "fillna_and_types"),
+    ("Add the price per unit", "save_to_csv_removed"),
+    ("Drop the target column", "drop_column"),
+    ("Summary statistics", "with_open_removed"),
+]
+EXPLANATION = "The number of units in each order; about 2% of orders have no quantity."
+REQUEST_STAGES = ("prompt", "llm", "parse", "execute", "store", "render")
+
+_PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_BYTES
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StageMeter:
+    """Times stages and samples resident memory on a background thread while they run"""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.records = []
+        self._peak = None
+        self._lock = threading.Lock()
+        self._running = rss_bytes() is not None
+        if self._running:
+            threading.Thread(target=self._sample, daemon=True).start()
+
+    def _sample(self):
+        while self._running:
+            rss = rss_bytes()
+            with self._lock:
+                if self._peak is not None and rss is not None and rss > self._peak:
+                    self._peak = rss
+            time.sleep(self.interval)
+
+    @contextmanager
+    def stage(self, name: str, **fields):
+        """Record the wall time and memory peak of the block as stage ``name``"""
+        start_rss = rss_bytes()
+        with self._lock:
+            self._peak = start_rss
+        started = time.perf_counter()
+        record = dict(fields, stage=name)
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 5)
+            end_rss = rss_bytes()
+            with self._lock:
+                peak, self._peak = self._peak, None
+            if start_rss is not None:
+                peak = max(peak or 0, end_rss or 0)
+                record["peak_mb"] = round((peak - start_rss) / 2 ** 20, 2)
+            self.records.append(record)
+
+    def close(self):
+        self._running = False
+
+
+def recorded_responses() -> list:
+    with open(SNIPPETS) as f:
+        snippets = {snippet["name"]: snippet["code"] for snippet in json.load(f)}
+    responses = []
+    for _, name in SESSION:
+        if name is None:
+            responses.append(json.dumps({"response_type": "explanation", "content": EXPLANATION}))
+        else:
+            responses.append(json.dumps({"response_type": "code", "content": snippets[name]}))
+    return responses
+
+
+def serialize_figures(figures: list) -> int:
+    """Convert figures as Streamlit does before sending them; returns the payload size"""
+    size = 0
+    for kind, fig, _ in figures:
+        if kind == "plotly":
+            size += len(fig.to_json())
+        elif kind == "plotly_json":
+            size += len(fig)
+        elif kind == "matplotlib":
+            import io
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png")
+            size += buffer.tell()
+            plt = sys.modules.get("matplotlib.pyplot")
+            if plt is not None:
+                plt.close(fig)
+        elif kind == "png":
+            size += len(fig)
+    return size
+
+
+def load_stages(meter: StageMeter, df: pd.DataFrame, dataset: str, formats: list, tmp: str) -> pd.DataFrame:
+    """Write df in each format and time read_dataset on it; returns the last frame loaded"""
+    loaded = None
+    for fmt in formats:
+        reason = skip_reason(fmt, df)
+        if reason is not None:
+            meter.records.append({"dataset": dataset, "stage": f"load.{fmt}", "skipped": reason})
+            continue
+        path = os.path.join(tmp, file_name(fmt))
+        write_dataset(df, path, fmt)
+        with meter.stage(f"load.{fmt}", dataset=dataset, file_mb=round(os.path.getsize(path) / 2 ** 20, 2)) as record:
+            loaded, report = read_dataset(path)
+            record["engine"] = report["engine"]
+        os.remove(path)
+    return loaded
+
+
+def replay_session(meter: StageMeter, df: pd.DataFrame, dataset: str, responses: list, llm_latency: float):
+    """Run the recorded session against df stage by stage"""
+    LLMChainManager.configure(llm=FakeStreamingLLM(responses=responses, first_token_delay=llm_latency),
+                              model_name="fake")
+    LLMChainManager._cache = None  # a fresh response cache for every dataset
+    budget = PromptBudget.from_env()
+    figure_budget = FigureBudget.from_env()
+
+    with meter.stage("optimize", dataset=dataset):
+        df, _ = optimize_dtypes(df)
+    with meter.stage("fingerprint", dataset=dataset):
+        fingerprint = frame_fingerprint(df)
+    with meter.stage("profile", dataset=dataset):
+        profile = profile_frame(df, fingerprint)
+
+    history = []
+    for number, (request, _) in enumerate(SESSION, 1):
+        fields = {"dataset": dataset, "request": number}
+        with meter.stage("prompt", **fields):
+            inputs, _ = fit_prompt_inputs(df, request, history, file_path="orders", fingerprint=fingerprint,
+                                          budget=budget, profile=profile)
+        with meter.stage("llm", **fields):
+            raw = LLMChainManager.run(inputs)
+        with meter.stage("parse", **fields):
+            response = parse_llm_response(raw)
+        history.append((request, response))
+        figures = []
+        if response.response_type == "code":
+            modified_df = None
+            with meter.stage("execute", **fields):
+                modified_df, _, figures = run_code(response.content, df.copy(deep=False),
+                                                   figure_budget=figure_budget)
+            if modified_df is not None:
+                with meter.stage("store", **fields) as record:
+                    modified_df, _ = optimize_dtypes(modified_df)
+                    after = frame_fingerprint(modified_df)
+                    record["changes"] = describe_changes(diff_fingerprints(fingerprint, after))
+                    if after.token != fingerprint.token:
+                        df, fingerprint = modified_df, after
+                        profile = profile_frame(df, fingerprint)
+        with meter.stage("render", **fields) as record:
+            get_page(df, 0, 100)
+            record["figure_bytes"] = serialize_figures(figures)
+
+
+def summarize(records: list) -> list:
+    """One record per dataset and stage; request stages are summed over the session"""
+    summary = []
+    for record in records:
+        if "request" not in record:
+            summary.append({key: value for key, value in record.items() if key != "changes"})
+    datasets = list(dict.fromkeys(record["dataset"] for record in records))
+    for dataset in datasets:
+        for stage in REQUEST_STAGES:
+            rows = [r for r in records if r.get("dataset") == dataset and r["stage"] == stage and "request" in r]
+            if not rows:
+                continue
+            summary.append({
+                "dataset": dataset,
+                "stage": f"request.{stage}",
+                "seconds": round(sum(r["seconds"] for r in rows), 5),
+                "max_seconds": max(r["seconds"] for r in rows),
+                "peak_mb": max((r.get("peak_mb", 0) for r in rows), default=None),
+                "errors": sum(1 for r in rows if "error" in r),
+            })
+    return summary
+
+
+def compare(summary: list, baseline_path: str, tolerance: float, min_seconds: float) -> list:
+    """Stages slower than the baseline by more than tolerance (and min_seconds)"""
+    with open(baseline_path) as f:
+        baseline = {(r["dataset"], r["stage"]): r for r in json.load(f)["summary"] if "seconds" in r}
+    regressions = []
+    for record in summary:
+        before = baseline.get((record["dataset"], record["stage"]))
+        if before is None or "seconds" not in record:
+            continue
+        if record["seconds"] > before["seconds"] * (1 + tolerance) and \
+                record["seconds"] - before["seconds"] > min_seconds:
+            regressions.append(f"{record['dataset']} {record['stage']}: "
+                               f"{before['seconds']:.4f}s -> {record['seconds']:.4f}s")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,100000", help="comma-separated row counts, up to 10000000")
+    parser.add_argument("--shapes", default="narrow,wide")
+    parser.add_argument("--wide-columns", type=int, default=500)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake LLM waits per call")
+    parser.add_argument("--output", help="write the full results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_RATE_LIMIT", "0")
+    formats = [fmt for fmt in args.formats.split(",") if fmt]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats {sorted(unknown)}; expected {list(FORMATS)}")
+    responses = recorded_responses()
+    started = time.perf_counter()
+
+    # Imports, sandbox workers and compiled snippets are warmed up on a small
+    # frame first so the first dataset is not charged for them
+    warmup = StageMeter()
+    with tempfile.TemporaryDirectory() as tmp:
+        small = load_stages(warmup, make_dataset(200), "warmup", formats, tmp)
+    replay_session(warmup, small if small is not None else make_dataset(200), "warmup", responses, 0.0)
+    warmup.close()
+
+    meter = StageMeter()
+    for shape in args.shapes.split(","):
+        columns = NARROW_COLUMNS if shape == "narrow" else args.wide_columns
+        for rows in (int(value) for value in args.rows.split(",")):
+            dataset = f"{shape}_{rows}"
+            df = make_dataset(rows, columns)
+            with tempfile.TemporaryDirectory() as tmp:
+                loaded = load_stages(meter, df, dataset, formats, tmp)
+            del df
+            if loaded is not None:
+                replay_session(meter, loaded, dataset, responses, args.llm_latency)
+    meter.close()
+
+    summary = summarize(meter.records)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sandbox_workers": os.getenv("SANDBOX_WORKERS", "2"),
+            "arguments": vars(args),
+            "seconds": round(time.perf_counter() - started, 2),
+        },
+        "summary": summary,
+        "stages": meter.records,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+
+    failures = [f"{r['dataset']} {r['stage']} request {r.get('request')}: {r['error']}"
+                for r in meter.records if "error" in r]
+    if args.compare:
+        failures += [f"regression {line}" for line in compare(summary, args.compare, args.tolerance, args.min_seconds)]
+    print(json.dumps({"meta": results["meta"], "summary": summary}, indent=2, default=str))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Measure figure payload size and serialization time with and without downsampling.
+
+Each case builds a figure the way generated code would, then serializes it
+as the app does (Plotly JSON, matplotlib PNG) as generated and after
+reduce_figures. The payload is what travels from the worker and on to the
+browser; serialization time stands in for render time.
+
+Usage: python benchmarks/bench_figures.py [--rows 1000000] [--repeat 3]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import plotly.express as px  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.figures import FigureBudget, reduce_figures  # noqa: E402
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'time': pd.date_range('2024-01-01', periods=rows, freq='s'),
+        'value': rng.normal(size=rows).cumsum(),
+        'x': rng.normal(size=rows),
+        'y': rng.normal(size=rows),
+        'group': rng.choice(['a', 'b', 'c'], size=rows),
+    })
+
+
+def plotly_line(df):
+    return 'plotly', px.line(df, x='time', y='value')
+
+
+def plotly_scatter(df):
+    return 'plotly', px.scatter(df, x='x', y='y', color='group')
+
+
+def matplotlib_line(df):
+    fig, ax = plt.subplots()
+    ax.plot(df['time'], df['value'])
+    return 'matplotlib', fig
+
+
+def matplotlib_scatter(df):
+    fig, ax = plt.subplots()
+    ax.scatter(df['x'], df['y'], c=df['y'], s=2)
+    return 'matplotlib', fig
+
+
+CASES = {
+    'plotly_line': plotly_line,
+    'plotly_scatter': plotly_scatter,
+    'matplotlib_line': matplotlib_line,
+    'matplotlib_scatter': matplotlib_scatter,
+}
+
+
+def serialize(kind: str, fig) -> int:
+    if kind == 'plotly':
+        return len(fig.to_json())
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.tell()
+
+
+def measure(build, df: pd.DataFrame, budget: FigureBudget, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        kind, fig = build(df)
+        start = time.perf_counter()
+        [(kind, fig, note)] = reduce_figures([(kind, fig)], budget)
+        size = serialize(kind, fig)
+        times.append(time.perf_counter() - start)
+        plt.close('all')
+    return {'bytes': size, 'best_s': round(min(times), 4), 'note': note}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    results = []
+    for name, build in CASES.items():
+        original = measure(build, df, FigureBudget(enabled=False), args.repeat)
+        reduced = measure(build, df, FigureBudget(), args.repeat)
+        results.append({
+            'case': name,
+            'rows': args.rows,
+            'original': {k: v for k, v in original.items() if k != 'note'},
+            'reduced': reduced,
+            'payload_ratio': round(original['bytes'] / reduced['bytes'], 1),
+        })
+        print(f"{name:20} {original['bytes'] / 2 ** 20:8.2f} MB {original['best_s']:7.3f}s  ->  "
+              f"{reduced['bytes'] / 2 ** 20:8.2f} MB {reduced['best_s']:7.3f}s")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
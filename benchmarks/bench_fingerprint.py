@@ -0,0 +1,111 @@
+"""Time DataFrame fingerprinting and check the changes it reports.
+
+Builds a frame with the dtypes optimize_dtypes produces, applies a few
+typical operations and verifies that diff_fingerprints reports exactly the
+touched columns and chunks. Timings compare frame_fingerprint with hashing
+every row through pd.util.hash_pandas_object and with the structural
+describe_data_changes summary it replaces.
+
+Usage: python benchmarks/bench_fingerprint.py [--rows 10000000] [--repeat 3]
+Exits with status 1 if a reported change is wrong.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.execution import describe_data_changes  # noqa: E402
+from utils.fingerprint import CHUNK_ROWS, diff_fingerprints, frame_fingerprint  # noqa: E402
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'value': rng.normal(size=rows),
+        'count': rng.integers(0, 1000, size=rows).astype(np.int32),
+        'region': pd.Categorical(rng.choice(['north', 'south', 'east', 'west'], size=rows)),
+        'time': pd.date_range('2024-01-01', periods=rows, freq='s'),
+        'label': pd.array(rng.integers(0, 100_000, size=rows).astype(str), dtype='string[pyarrow]'),
+    })
+
+
+def edit_cell(df):
+    df = df.copy()
+    df.loc[len(df) // 2, 'value'] = -1.0
+    return df, {'value'}
+
+
+def add_column(df):
+    df = df.copy()
+    df['ratio'] = df['value'] / (df['count'] + 1)
+    return df, {'ratio'}
+
+
+def fill_label(df):
+    df = df.copy()
+    df['label'] = df['label'].str.upper()
+    return df, set()  # digits only: upper() leaves the content unchanged
+
+
+def noop_plot(df):
+    return df, set()
+
+
+OPERATIONS = {'edit_cell': edit_cell, 'add_column': add_column, 'fill_label': fill_label, 'noop_plot': noop_plot}
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(min(times), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    before = frame_fingerprint(df)
+    failures = []
+    results = {
+        'rows': args.rows,
+        'columns': len(df.columns),
+        'fingerprint_s': best_of(lambda: frame_fingerprint(df), args.repeat),
+        'hash_pandas_object_s': best_of(lambda: pd.util.hash_pandas_object(df), args.repeat),
+        'describe_data_changes_s': best_of(lambda: describe_data_changes(df, df), args.repeat),
+        'operations': [],
+    }
+    for name, operation in OPERATIONS.items():
+        modified, expected = operation(df)
+        start = time.perf_counter()
+        diff = diff_fingerprints(before, frame_fingerprint(modified))
+        elapsed = time.perf_counter() - start
+        if set(diff.changed_columns) != expected:
+            failures.append(f"{name}: changed {diff.changed_columns}, expected {sorted(expected)}")
+        if name == 'edit_cell':
+            row = args.rows // 2
+            chunk = (row // CHUNK_ROWS * CHUNK_ROWS, min((row // CHUNK_ROWS + 1) * CHUNK_ROWS, args.rows))
+            if diff.changed.get('value') != [chunk]:
+                failures.append(f"{name}: ranges {diff.changed.get('value')}, expected {[chunk]}")
+        results['operations'].append({'operation': name, 'diff_s': round(elapsed, 4),
+                                      'changed': {col: diff.changed.get(col, 'added') for col in diff.changed_columns}})
+
+    print(json.dumps(results, indent=2, default=str))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
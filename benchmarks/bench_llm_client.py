@@ -0,0 +1,163 @@
+"""Exercise LLMClient against local stub servers that simulate latency and 429s.
+
+Scenarios:
+- retry: the first two requests get 429 with Retry-After; the call succeeds
+- fallback: the primary always returns 503; the secondary answers and is
+  reported as the provider that answered (its output is not cached under
+  the primary model)
+- coalesce: 20 threads ask the same prompt at once; the server sees one request
+- rate_limit: 12 distinct prompts at 300/min with a burst of 2 take >= 2s
+- pooling: 30 sequential calls reuse a few connections
+- hedge: every 25th primary response is slow; hedging to a secondary
+  caps the tail latency compared with no hedging
+- hedge_samples: the primary turns slow and loses every hedge; each
+  cancelled call still records a latency sample, so its p95 rises
+
+Usage: python benchmarks/bench_llm_client.py
+Exits with status 1 if a scenario does not behave as described.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from llm.client import LLMClient  # noqa: E402
+from llm.providers import GeminiProvider, OpenAIProvider  # noqa: E402
+from stub_llm import StubLLMServer  # noqa: E402
+
+RESPONSE = json.dumps({"response_type": "code", "content": "print(df.describe())"})
+
+
+def gemini(server: StubLLMServer) -> GeminiProvider:
+    return GeminiProvider("stub-key", model_name="stub", base_url=server.url)
+
+
+def openai(server: StubLLMServer) -> OpenAIProvider:
+    return OpenAIProvider("stub-key", model_name="stub", base_url=server.url)
+
+
+def retry(failures: list) -> dict:
+    with StubLLMServer(RESPONSE, errors=[429, 429], retry_after=0.2) as server:
+        client = LLMClient(gemini(server), rate_per_minute=0)
+        start = time.perf_counter()
+        text = client.complete("retry")
+        elapsed = time.perf_counter() - start
+        client.close()
+    if text != RESPONSE or server.requests != 3 or client.counters["retries"] != 2:
+        failures.append(f"retry: {server.requests} requests, {client.counters['retries']} retries")
+    return {"requests": server.requests, "seconds": round(elapsed, 3)}
+
+
+def fallback(failures: list) -> dict:
+    with StubLLMServer(errors=[503] * 100) as primary, StubLLMServer(RESPONSE) as secondary:
+        client = LLMClient(gemini(primary), openai(secondary), rate_per_minute=0, max_retries=1, backoff=0.05)
+        answered = []
+        text = client.complete("fallback", answered.append)
+        client.close()
+    if text != RESPONSE or client.counters["fallbacks"] != 1:
+        failures.append(f"fallback: got {text!r}, counters {client.counters}")
+    if answered != [client.secondary]:
+        failures.append(f"fallback: answered by {answered}, expected the secondary")
+    return {"primary_requests": primary.requests, "secondary_requests": secondary.requests}
+
+
+def coalesce(failures: list) -> dict:
+    with StubLLMServer(RESPONSE, latency=0.3, chunk_delay=0.01) as server:
+        client = LLMClient(gemini(server), rate_per_minute=0)
+        with ThreadPoolExecutor(20) as pool:
+            texts = list(pool.map(lambda _: client.complete("same prompt"), range(20)))
+        client.close()
+    if server.requests != 1 or any(text != RESPONSE for text in texts):
+        failures.append(f"coalesce: server saw {server.requests} requests")
+    return {"callers": 20, "requests": server.requests, "coalesced": client.counters["coalesced"]}
+
+
+def rate_limit(failures: list) -> dict:
+    with StubLLMServer(RESPONSE) as server:
+        client = LLMClient(gemini(server), rate_per_minute=300, burst=2)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(12) as pool:
+            list(pool.map(lambda i: client.complete(f"prompt {i}"), range(12)))
+        elapsed = time.perf_counter() - start
+        client.close()
+    # 2 immediately, then 10 more at 5 per second
+    if elapsed < 1.9:
+        failures.append(f"rate_limit: 12 calls took {elapsed:.2f}s")
+    return {"calls": 12, "seconds": round(elapsed, 3)}
+
+
+def pooling(failures: list) -> dict:
+    with StubLLMServer(RESPONSE) as server:
+        client = LLMClient(gemini(server), rate_per_minute=0)
+        for i in range(30):
+            client.complete(f"pooled {i}")
+        client.close()
+    if server.connections > 2:
+        failures.append(f"pooling: {server.connections} connections for 30 calls")
+    return {"requests": server.requests, "connections": server.connections}
+
+
+def hedge(failures: list) -> dict:
+    def slow_tail(number: int) -> float:
+        return 1.0 if number % 25 == 24 else 0.05
+
+    results = {}
+    for hedged in (False, True):
+        with StubLLMServer(RESPONSE, latency=slow_tail) as primary, \
+                StubLLMServer(RESPONSE, latency=0.1) as secondary:
+            client = LLMClient(gemini(primary), openai(secondary), rate_per_minute=0,
+                               hedge=hedged, hedge_min_samples=10)
+            for i in range(10):
+                client.complete(f"warmup {i}")
+            latencies = []
+            for i in range(100):
+                start = time.perf_counter()
+                client.complete(f"hedge {i}")
+                latencies.append(time.perf_counter() - start)
+            client.close()
+        latencies.sort()
+        results["hedged" if hedged else "primary_only"] = {
+            "p50_s": round(statistics.median(latencies), 3),
+            "p95_s": round(latencies[int(len(latencies) * 0.95)], 3),
+            "max_s": round(latencies[-1], 3),
+            "hedges": client.counters["hedges"],
+            "hedge_wins": client.counters["hedge_wins"],
+        }
+    if results["hedged"]["max_s"] > 0.5 or results["hedged"]["hedge_wins"] < 3:
+        failures.append(f"hedge: {results['hedged']}")
+    return results
+
+
+def hedge_samples(failures: list) -> dict:
+    with StubLLMServer(RESPONSE, latency=lambda number: 0.05 if number < 10 else 1.0) as primary, \
+            StubLLMServer(RESPONSE, latency=0.05) as secondary:
+        client = LLMClient(gemini(primary), openai(secondary), rate_per_minute=0, hedge=True, hedge_min_samples=10)
+        for i in range(30):
+            client.complete(f"samples {i}")
+        client.close()
+    latency = client._latency[client.primary.name]
+    p95 = latency.p95()
+    if len(latency.samples) != 30 or p95 is None or p95 <= 0.05:
+        failures.append(f"hedge_samples: {len(latency.samples)} primary samples, p95 {p95}")
+    return {"primary_samples": len(latency.samples), "primary_p95_s": round(p95 or 0.0, 3),
+            "hedge_wins": client.counters["hedge_wins"]}
+
+
+def main():
+    failures = []
+    results = {}
+    for scenario in (retry, fallback, coalesce, rate_limit, pooling, hedge, hedge_samples):
+        results[scenario.__name__] = scenario(failures)
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
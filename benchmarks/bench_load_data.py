@@ -0,0 +1,140 @@
+"""Compare load_data's ingestion engine with the previous eager pandas readers.
+
+Also checks that:
+  - a CSV read with a progress callback still takes the multithreaded reader
+    and reports progress;
+  - tab-separated files are split on tabs;
+  - max_bytes truncates formats read through pandas (pickle, JSON).
+
+Usage: python benchmarks/bench_load_data.py [--rows 2000000] [--repeat 3]
+
+Exits with status 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import utils.ingest as ingest  # noqa: E402
+from utils.ingest import read_dataset  # noqa: E402
+
+
+def legacy_load(path: str) -> pd.DataFrame:
+    """The extension-based dispatch load_data used before the ingestion engine"""
+    ext = path.lower().split('.')[-1]
+    if ext == 'csv':
+        return pd.read_csv(path)
+    if ext == 'parquet':
+        return pd.read_parquet(path)
+    if ext == 'feather':
+        return pd.read_feather(path)
+    if ext == 'json':
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'value': rng.normal(size=rows),
+        'count': rng.integers(0, 1000, size=rows),
+        'category': rng.choice(['north', 'south', 'east', 'west'], size=rows),
+        'label': rng.choice(['a', 'b', None], size=rows),
+    })
+
+
+def measure(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'best_s': round(min(times), 4), 'mean_s': round(sum(times) / len(times), 4)}
+
+
+def checks(tmp: str) -> list:
+    failures = []
+    df = make_frame(50_000)
+
+    csv_path = os.path.join(tmp, 'check.csv')
+    df.to_csv(csv_path, index=False)
+    threaded = []
+    read_csv = ingest.pa_csv.read_csv
+    ingest.pa_csv.read_csv = lambda *a, **k: threaded.append(True) or read_csv(*a, **k)
+    updates = []
+    try:
+        loaded, report = read_dataset(csv_path, progress=lambda fraction, message: updates.append(fraction))
+    finally:
+        ingest.pa_csv.read_csv = read_csv
+    if not threaded:
+        failures.append("CSV read with progress did not use the multithreaded reader")
+    if report['rows'] != len(df) or not updates or updates[-1] != 1.0:
+        failures.append(f"CSV read with progress: rows={report['rows']} updates={updates}")
+
+    for name in ('check.tsv', 'check_tabs.txt'):
+        tsv_path = os.path.join(tmp, name)
+        df.to_csv(tsv_path, index=False, sep='\t')
+        loaded, _ = read_dataset(tsv_path)
+        if list(loaded.columns) != list(df.columns):
+            failures.append(f"{name} columns {list(loaded.columns)[:3]}")
+
+    limit = int(df.memory_usage(deep=True).sum() // 4)
+    for fmt, write in (('pkl', df.to_pickle), ('json', lambda p: df.to_json(p, orient='records'))):
+        path = os.path.join(tmp, f'check.{fmt}')
+        write(path)
+        loaded, report = read_dataset(path, max_bytes=limit)
+        used = int(loaded.memory_usage(deep=True).sum())
+        if not report['truncated'] or used > limit or not len(loaded):
+            failures.append(f"max_bytes on {fmt}: truncated={report['truncated']} bytes={used} limit={limit}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        writers = {
+            'csv': lambda p: df.to_csv(p, index=False),
+            'parquet': lambda p: df.to_parquet(p, index=False),
+            'feather': lambda p: df.to_feather(p),
+            'json': lambda p: df.to_json(p, orient='records', lines=True),
+        }
+        for fmt, write in writers.items():
+            path = os.path.join(tmp, f'data.{fmt}')
+            write(path)
+            legacy = measure(lambda: legacy_load(path), args.repeat)
+            engine = measure(lambda: read_dataset(path), args.repeat)
+            results.append({
+                'format': fmt,
+                'rows': args.rows,
+                'file_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+                'legacy': legacy,
+                'engine': engine,
+                'speedup': round(legacy['best_s'] / engine['best_s'], 2) if engine['best_s'] else None,
+            })
+            print(f"{fmt:8} legacy {legacy['best_s']:8.3f}s   engine {engine['best_s']:8.3f}s   "
+                  f"x{results[-1]['speedup']}")
+        failures = checks(tmp)
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print("FAIL", failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Measure the cost of tracing spans and check the metrics exporters.
+
+- overhead: nanoseconds per span with METRICS_ENABLED=0, outside a trace
+  and inside a trace, against an empty loop
+- pipeline: a request run through process_user_request and
+  execute_code_safely (Streamlit in bare mode, FakeStreamingLLM) records
+  the prompt, llm, parse, exec, render and store stages and the session
+  counters; the disabled span cost is reported as a share of that request
+- export: /metrics serves Prometheus text whose histogram counts match
+  the recorded spans, with every family in one block after its HELP and
+  TYPE lines; METRICS_FILE is written as JSON or Prometheus text
+
+Usage: python benchmarks/bench_metrics.py [--spans 200000]
+Exits with status 1 if a span costs more than 1µs when disabled or a
+check fails.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import metrics  # noqa: E402
+from utils.metrics import MetricsRegistry, SessionMetrics  # noqa: E402
+
+RESPONSE = json.dumps({"response_type": "code", "content": (
+    "import plotly.express as px\nprint(df['price'].sum())\nfig = px.histogram(df, x='price')")})
+
+
+def per_span_ns(spans: int) -> float:
+    start = time.perf_counter()
+    for _ in range(spans):
+        with metrics.span("stage"):
+            pass
+    return (time.perf_counter() - start) / spans * 1e9
+
+
+def overhead(spans: int, failures: list) -> dict:
+    start = time.perf_counter()
+    for _ in range(spans):
+        pass
+    empty = (time.perf_counter() - start) / spans * 1e9
+
+    metrics.ENABLED = False
+    disabled = per_span_ns(spans)
+    metrics.ENABLED = True
+    outside = per_span_ns(spans)
+    with metrics.trace("overhead"):
+        inside = per_span_ns(min(spans, 20000))
+    if disabled - empty > 1000:
+        failures.append(f"overhead: {disabled - empty:.0f}ns per disabled span")
+    return {"empty_loop_ns": round(empty, 1), "disabled_ns": round(disabled, 1),
+            "enabled_outside_trace_ns": round(outside, 1), "enabled_in_trace_ns": round(inside, 1)}
+
+
+def pipeline(failures: list) -> dict:
+    import streamlit as st
+    import streamlit_app as app
+    from llm.chain import LLMChainManager
+    from llm.fake import FakeStreamingLLM
+    from utils.data_utils import execute_code_safely
+
+    app.initialize_session_state()
+    LLMChainManager.configure(llm=FakeStreamingLLM(responses=[RESPONSE]), model_name="fake")
+    session = st.session_state.metrics
+    df = pd.DataFrame({"price": np.random.default_rng(0).gamma(2.0, 20.0, 100_000), "region": "north"})
+    with metrics.trace("load", session):
+        app.store_dataframe(df, "load")
+    for request in ("total price", "total price"):
+        with metrics.trace("analyze", session):
+            response = app.process_user_request(request, app.session_df())
+            modified_df, _ = execute_code_safely(response, app.session_df().copy(deep=False))
+            app.store_dataframe(modified_df, request)
+
+    stages = [record.name for record in session.traces[-1].spans]
+    for stage in ("prompt", "llm", "parse", "exec", "render", "store"):
+        if stage not in stages:
+            failures.append(f"pipeline: no {stage} span in {stages}")
+    for counter in ("prompt_tokens", "rows_processed", "bytes_rendered"):
+        if not session.counters.get(counter):
+            failures.append(f"pipeline: counter {counter} not recorded ({session.counters})")
+    if not session.counters.get("llm_cache_hits", 0) + session.counters.get("llm_cache_misses", 0):
+        failures.append(f"pipeline: LLM cache lookups not counted ({session.counters})")
+    return {
+        "spans_per_request": len(session.traces[-1].spans),
+        "request_ms": round(session.traces[-1].seconds * 1000, 2),
+        "last_trace_ms": {record.name: round(record.seconds * 1000, 2) for record in session.traces[-1].spans},
+        "counters": session.counters,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def exposition_errors(text: str) -> list:
+    """Samples outside the block of their family or without its HELP and TYPE lines"""
+    helped, types, finished, errors = set(), {}, set(), []
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            helped.add(line.split()[2])
+            continue
+        if line.startswith("# TYPE "):
+            _, _, family, kind = line.split()
+            if family in types:
+                errors.append(f"{family} has two TYPE lines")
+            types[family] = kind
+            continue
+        name = line.split("{")[0].split()[0]
+        family = next((name[:-len(suffix)] for suffix in ("_bucket", "_sum", "_count")
+                       if name.endswith(suffix) and types.get(name[:-len(suffix)]) == "histogram"), name)
+        if family not in types or family not in helped:
+            errors.append(f"{name} has no HELP or TYPE line")
+        if family != current:
+            if family in finished:
+                errors.append(f"{name} is outside the block of {family}")
+            finished.add(current)
+            current = family
+    return errors
+
+
+def export(failures: list) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = MetricsRegistry(port=free_port())
+        MetricsRegistry._instance = registry
+        session = SessionMetrics()
+        for _ in range(5):
+            with metrics.trace("analyze", session):
+                with metrics.span("llm"):
+                    time.sleep(0.01)
+                metrics.count("prompt_tokens", 100)
+        port = registry._server.server_address[1]
+        text = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+        stats = json.loads(urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json").read())
+        registry.write(os.path.join(tmp, "metrics.prom"))
+        registry.write(os.path.join(tmp, "metrics.json"))
+        written = sorted(os.listdir(tmp))
+        registry.shutdown()
+
+    if 'dsa_stage_seconds_count{stage="llm"} 5' not in text or 'dsa_prompt_tokens_total{trace="analyze"} 500' not in text:
+        failures.append(f"export: unexpected /metrics output:\n{text}")
+    failures += [f"export: {error}" for error in exposition_errors(text)]
+    if stats["stages"]["llm"]["count"] != 5:
+        failures.append(f"export: /metrics.json has {stats['stages']}")
+    if written != ["metrics.json", "metrics.prom"]:
+        failures.append(f"export: wrote {written}")
+    return {"metrics_lines": len(text.splitlines()), "files": written}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spans", type=int, default=200_000)
+    args = parser.parse_args()
+
+    failures = []
+    results = {"overhead": overhead(args.spans, failures), "pipeline": pipeline(failures), "export": export(failures)}
+    # What the spans of one request cost when disabled, relative to the request
+    spans_ns = results["overhead"]["disabled_ns"] * results["pipeline"]["spans_per_request"]
+    results["disabled_share_of_request"] = f"{spans_ns / (results['pipeline']['request_ms'] * 1e6):.6%}"
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Query a dataset larger than the sandbox memory limit in place with DuckDB.
+
+A Parquet file of ``--rows`` synthetic orders is written in chunks, so the
+benchmark itself never holds more than one chunk. Loaded into pandas the
+file would need several times ``--memory-mb``, the memory limit of the
+sandbox worker the queries run in; pass ``--rows 20000000`` or more to
+exceed the machine's RAM as well.
+
+- fallback: small files are still loaded into pandas; large CSV and
+  Parquet files are queried in place
+- prompt: the prompt inputs of a LazySource select the SQL prompt and
+  describe the whole file, not the sample
+- queries: SQL-mode snippets (aggregations, a filter, a plot, an
+  unbounded SELECT) run in one sandbox worker; their time, the worker's
+  peak RSS above its warmed-up size and the sum of price by region, checked against totals
+  computed while writing the file, are reported
+
+Usage: python benchmarks/bench_out_of_core.py [--rows 8000000] [--memory-mb 512]
+Exits with status 1 if a query fails, a total is wrong or a check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import make_dataset  # noqa: E402
+from llm.prompt import fit_prompt_inputs  # noqa: E402
+from utils.lazy import LazySource, out_of_core_format  # noqa: E402
+from utils.sandbox import SandboxPool  # noqa: E402
+
+CHUNK_ROWS = 500_000
+
+# name -> SQL-mode code as the model is asked to write it
+SNIPPETS = {
+    "revenue_by_region": (
+        "totals = sql(\"SELECT region, sum(price) AS total FROM data GROUP BY region ORDER BY region\")\n"
+        "print(totals.to_json(orient='records'))"
+    ),
+    "monthly_orders": (
+        "monthly = sql(\"SELECT date_trunc('month', ordered_at) AS month, count(*) AS orders, "
+        "avg(price) AS avg_price FROM data GROUP BY month ORDER BY month\")\n"
+        "print(len(monthly))"
+    ),
+    "top_customers": (
+        "top = sql(\"SELECT customer, sum(price * quantity) AS spent FROM data "
+        "GROUP BY customer ORDER BY spent DESC LIMIT 10\")\n"
+        "print(top.head(3))"
+    ),
+    "returned_share": (
+        "share = sql(\"SELECT category, avg(returned::INT) AS returned FROM data "
+        "WHERE rating <= 2 GROUP BY category\")\n"
+        "print(share)"
+    ),
+    "price_histogram": (
+        "import plotly.express as px\n"
+        "bins = sql(\"SELECT floor(price / 10) * 10 AS price, count(*) AS orders FROM data "
+        "WHERE price IS NOT NULL GROUP BY 1 ORDER BY 1\")\n"
+        "fig = px.bar(bins, x='price', y='orders')"
+    ),
+    "select_everything": (
+        "rows = sql(\"SELECT * FROM data\")\n"
+        "print(len(rows))"
+    ),
+}
+
+
+def write_parquet(path: str, rows: int) -> tuple[dict, int]:
+    """Write rows orders in chunks; returns the sum of price by region and the pandas memory estimate"""
+    totals = {}
+    pandas_bytes = 0
+    writer = None
+    for i, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        chunk = make_dataset(min(CHUNK_ROWS, rows - start), seed=i)
+        chunk["order_id"] += start
+        for region, total in chunk.groupby("region")["price"].sum().items():
+            totals[region] = totals.get(region, 0.0) + total
+        pandas_bytes += int(chunk.memory_usage(deep=True).sum())
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+    writer.close()
+    return totals, pandas_bytes
+
+
+def fallback(tmp: str, path: str, failures: list) -> dict:
+    small = os.path.join(tmp, "small.csv")
+    make_dataset(1000).to_csv(small, index=False)
+    os.environ["OUT_OF_CORE_MIN_MB"] = str(max(os.path.getsize(path) // 2 ** 20, 1))
+    formats = {"small_csv": out_of_core_format(small), "large_parquet": out_of_core_format(path)}
+    if formats != {"small_csv": None, "large_parquet": "parquet"}:
+        failures.append(f"fallback: formats {formats}")
+    return formats
+
+
+def prompt(source: LazySource, sample, failures: list) -> dict:
+    inputs, report = fit_prompt_inputs(sample, "revenue by region", [], file_path="orders.parquet", source=source)
+    schema = inputs["data_schema"]
+    if inputs.get("engine") != "duckdb" or f"{source.rows:,} rows" not in schema:
+        failures.append(f"prompt: inputs do not describe the file ({inputs.get('engine')}, {schema[:80]!r})")
+    return {"engine": inputs.get("engine"), "total_tokens": report["total_tokens"]}
+
+
+def peak_rss(pid: int) -> int:
+    """VmHWM of a process; unlike ru_maxrss it does not include the parent's memory before the worker started"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def queries(pool: SandboxPool, source: LazySource, totals: dict, failures: list) -> dict:
+    results = {}
+    for name, code in SNIPPETS.items():
+        notices = []
+        started = time.perf_counter()
+        try:
+            execution_results, figures = pool.run_lazy(code, source, notify=notices.append)
+        except Exception as e:
+            failures.append(f"{name}: {e}")
+            continue
+        results[name] = {"seconds": round(time.perf_counter() - started, 3), "figures": len(figures)}
+        if name == "revenue_by_region":
+            got = {row["region"]: row["total"] for row in json.loads(execution_results["output"])}
+            if set(got) != set(totals) or any(not np.isclose(got[key], totals[key]) for key in totals):
+                failures.append(f"revenue_by_region: {got} != {totals}")
+        if name == "price_histogram" and len(figures) != 1:
+            failures.append(f"price_histogram: {len(figures)} figures")
+        if name == "select_everything":
+            if execution_results["output"] != str(source.max_result_rows) or not notices:
+                failures.append(f"select_everything: {execution_results['output']} rows, notices {notices}")
+            results[name]["notices"] = notices
+
+    # The worker ran every query, so its high-water mark covers all of them;
+    # the memory limit applies on top of what it holds after its warm-up
+    worker = pool._idle.queue[0]
+    results["worker_baseline_rss_mb"] = round(worker.baseline_rss / 2 ** 20, 1)
+    results["worker_peak_rss_mb"] = round((peak_rss(worker.process.pid) - worker.baseline_rss) / 2 ** 20, 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=8_000_000)
+    parser.add_argument("--memory-mb", type=int, default=512)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.parquet")
+        started = time.perf_counter()
+        totals, pandas_bytes = write_parquet(path, args.rows)
+        results = {"rows": args.rows, "file_mb": round(os.path.getsize(path) / 2 ** 20, 1),
+                   "pandas_estimate_mb": round(pandas_bytes / 2 ** 20, 1), "memory_limit_mb": args.memory_mb,
+                   "write_s": round(time.perf_counter() - started, 2)}
+        if pandas_bytes <= args.memory_mb * 2 ** 20:
+            failures.append("the dataset fits in the memory limit; raise --rows")
+        results["fallback"] = fallback(tmp, path, failures)
+
+        # DuckDB gets half the worker's limit; the rest is the interpreter and the results
+        source = LazySource(path, "parquet", memory_limit_mb=args.memory_mb // 2, max_result_rows=100_000,
+                            temp_dir=os.path.join(tmp, "spill"))
+        started = time.perf_counter()
+        source.analyze()
+        sample = source.sample()
+        source.close()
+        results["analyze_s"] = round(time.perf_counter() - started, 2)
+        if source.rows != args.rows:
+            failures.append(f"analyze: {source.rows} rows")
+        results["prompt"] = prompt(source, sample, failures)
+
+        pool = SandboxPool(workers=1, memory_mb=args.memory_mb, wall_seconds=600, cpu_seconds=600)
+        try:
+            results["queries"] = queries(pool, source, totals, failures)
+        finally:
+            pool.shutdown()
+        if results["queries"].get("worker_peak_rss_mb", 0) > args.memory_mb:
+            failures.append(f"worker peak RSS {results['queries']['worker_peak_rss_mb']} MB over the limit")
+
+    print(json.dumps(results, indent=2, default=str))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
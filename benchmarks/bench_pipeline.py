@@ -0,0 +1,192 @@
+"""Replay a recorded pipeline on refreshed data and export it as a script.
+
+A session's operations (the code the model generated for each request)
+are replayed without calling the model:
+
+- analysis: the columns a few snippets read and write
+- partial: a step assigning some rows of a column is replayed on data
+  where only that column changed; it must run again
+- refresh: the pipeline runs on ``--rows`` synthetic orders, then on the
+  same orders with one column updated; steps that do not read it are
+  taken from the StepMemo. Results are compared with a full recompute
+  without the memo and the time of both is reported
+- next_week: a new file with other rows, where every step that reads
+  data runs again
+- script: the exported script is run in a subprocess on the refreshed
+  data and its result compared with the replay
+
+Usage: python benchmarks/bench_pipeline.py [--rows 500000]
+Exits with status 1 if a replay differs from the full recompute, the
+memo skips the wrong steps, the exported script differs or the model is
+called.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import make_dataset  # noqa: E402
+from utils.dtypes import optimize_dtypes  # noqa: E402
+from utils.execution import run_generated_code  # noqa: E402
+from utils.pipeline import Pipeline, StepMemo, analyze_code  # noqa: E402
+
+pd.set_option("mode.copy_on_write", True)
+
+# (request, code) as recorded in the execution history
+STEPS = [
+    ("add revenue", "df['revenue'] = df['price'] * df['quantity']"),
+    ("add margin", "df['margin'] = df['revenue'] - df['unit_cost'] * df['quantity']"),
+    ("comment length", "df['comment_length'] = df['comment'].astype(str).str.len()"),
+    ("revenue by region", "print(df.groupby('region', observed=True)['revenue'].sum().round(2))"),
+    ("margin histogram", "import plotly.express as px\nfig = px.histogram(df, x='margin')"),
+    ("drop the target", "df = df.drop(columns=['target'])"),
+    ("drop missing prices", "df = df.dropna(subset=['price'])"),
+    ("shape", "print(df.shape)"),
+]
+# Steps the refresh, which changes only the comment column, must run again
+REFRESH_RUNS = {3, 7, 8}
+# Steps reused on other rows: dropping a column reads none
+NEXT_WEEK_SKIPS = {6}
+
+# code -> (reads, writes); None means the whole frame
+ANALYSIS = {
+    "df['revenue'] = df['price'] * df['quantity']": ({"price", "quantity"}, {"revenue"}),
+    "print(df.groupby('region')['revenue'].sum())": ({"region", "revenue"}, set()),
+    "import plotly.express as px\nfig = px.histogram(df, x='margin')": ({"margin"}, set()),
+    "df = df.drop(columns=['target'])": (set(), {"target"}),
+    "df.rename(columns={'price': 'unit_price'}, inplace=True)": ({"price"}, {"price", "unit_price"}),
+    "df = df.dropna(subset=['price'])": (None, None),
+    "df.loc[df['price'] > 50, 'discount'] = 0.1": ({"price", "discount"}, {"discount"}),
+    "df.at[0, 'discount'] = 0.2": ({"discount"}, {"discount"}),
+    "df.loc[:, 'discount'] = 0.0": (set(), {"discount"}),
+    "print(df.describe())": (None, set()),
+}
+
+
+def analysis(failures: list) -> dict:
+    for code, (reads, writes) in ANALYSIS.items():
+        info = analyze_code(code)
+        got = (None if info.reads is None else set(info.reads), None if info.writes is None else set(info.writes))
+        if got != (reads, writes):
+            failures.append(f"analysis: {code!r} reads/writes {got}, expected {(reads, writes)}")
+    return {"snippets": len(ANALYSIS)}
+
+
+def partial(failures: list) -> dict:
+    """The rows a masked assignment does not select keep their values from the input"""
+    pipeline = Pipeline.from_codes(["df.loc[df['a'] > 0, 'b'] = 1"], ["set b where a is positive"])
+    memo = StepMemo()
+    pipeline.replay(pd.DataFrame({"a": [1, -1, 1], "b": [10, 20, 30]}), memo=memo, run=run_generated_code)
+    result = pipeline.replay(pd.DataFrame({"a": [1, -1, 1], "b": [100, 200, 300]}), memo=memo,
+                             run=run_generated_code)
+    if result.failed or result.frame["b"].tolist() != [1, 200, 1]:
+        failures.append(f"partial: b is {result.frame['b'].tolist()} after the replay, expected [1, 200, 1]")
+    return {"ran": result.count("ran")}
+
+
+def replay(pipeline: Pipeline, df: pd.DataFrame, memo=None) -> tuple:
+    started = time.perf_counter()
+    result = pipeline.replay(df, memo=memo, run=run_generated_code)
+    return result, time.perf_counter() - started
+
+
+def compare(name: str, result, full, failures: list) -> None:
+    """The memoized replay must give what running every step gives"""
+    if result.failed or full.failed:
+        failures.append(f"{name}: a step failed ({[step.error for step in result.steps + full.steps if step.error]})")
+        return
+    if result.fingerprint.token != full.fingerprint.token or not result.frame.equals(full.frame):
+        failures.append(f"{name}: the data differs from a full recompute")
+    outputs = [step.output for step in result.steps], [step.output for step in full.steps]
+    if outputs[0] != outputs[1]:
+        failures.append(f"{name}: the printed output differs from a full recompute")
+    figures = [len(step.figures) for step in result.steps], [len(step.figures) for step in full.steps]
+    if figures[0] != figures[1]:
+        failures.append(f"{name}: figures {figures[0]} != {figures[1]}")
+
+
+def refresh(pipeline: Pipeline, df: pd.DataFrame, memo: StepMemo, failures: list) -> tuple:
+    first, first_s = replay(pipeline, df, memo)
+    if first.count("ran") != len(STEPS):
+        failures.append(f"first run: {first.count('ran')} of {len(STEPS)} steps ran")
+
+    updated = df.assign(comment=df["comment"].astype(object).where(df.index % 7 != 0, "updated"))
+    updated, _ = optimize_dtypes(updated)
+    result, replay_s = replay(pipeline, updated, memo)
+    full, full_s = replay(pipeline, updated)
+    ran = {step.step.number for step in result.steps if step.status == "ran"}
+    if ran != REFRESH_RUNS:
+        failures.append(f"refresh: steps {sorted(ran)} ran, expected {sorted(REFRESH_RUNS)}")
+    compare("refresh", result, full, failures)
+    return updated, full, {"first_s": round(first_s, 3), "replay_s": round(replay_s, 3),
+                           "full_recompute_s": round(full_s, 3), "speedup": round(full_s / replay_s, 2),
+                           "skipped": result.count("skipped"), "ran": result.count("ran")}
+
+
+def next_week(pipeline: Pipeline, rows: int, memo: StepMemo, failures: list) -> dict:
+    df, _ = optimize_dtypes(make_dataset(rows, seed=1))
+    result, replay_s = replay(pipeline, df, memo)
+    full, full_s = replay(pipeline, df)
+    skipped = {step.step.number for step in result.steps if step.status == "skipped"}
+    if skipped != NEXT_WEEK_SKIPS:
+        failures.append(f"next_week: steps {sorted(skipped)} skipped on new rows, expected {sorted(NEXT_WEEK_SKIPS)}")
+    compare("next_week", result, full, failures)
+    return {"replay_s": round(replay_s, 3), "full_recompute_s": round(full_s, 3)}
+
+
+def script(pipeline: Pipeline, df: pd.DataFrame, expected: pd.DataFrame, failures: list) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pipeline.py")
+        with open(path, "w") as f:
+            f.write(pipeline.to_script("orders.parquet"))
+        df.to_parquet(os.path.join(tmp, "orders.parquet"))
+        started = time.perf_counter()
+        run = subprocess.run([sys.executable, path, os.path.join(tmp, "orders.parquet"),
+                              os.path.join(tmp, "result.parquet")], capture_output=True, text=True, cwd=tmp)
+        seconds = time.perf_counter() - started
+        if run.returncode != 0:
+            failures.append(f"script: exited with {run.returncode}: {run.stderr[-500:]}")
+            return {}
+        got = pd.read_parquet(os.path.join(tmp, "result.parquet"))
+    # The app compacts dtypes after every step, the script does not
+    try:
+        pd.testing.assert_frame_equal(got.reset_index(drop=True), expected.reset_index(drop=True),
+                                      check_dtype=False, check_categorical=False)
+    except AssertionError as e:
+        failures.append(f"script: result differs: {str(e)[:300]}")
+    return {"seconds": round(seconds, 2), "rows": len(got), "columns": len(got.columns)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    failures = []
+    pipeline = Pipeline.from_codes([code for _, code in STEPS], [request for request, _ in STEPS])
+    memo = StepMemo()
+    df, _ = optimize_dtypes(make_dataset(args.rows))
+    results = {"rows": args.rows, "analysis": analysis(failures), "partial": partial(failures)}
+    updated, full, results["refresh"] = refresh(pipeline, df, memo, failures)
+    results["next_week"] = next_week(pipeline, args.rows, memo, failures)
+    results["script"] = script(pipeline, updated, full.frame, failures)
+    results["memo"] = memo.stats()
+    if any(name == "llm" or name.startswith("llm.") for name in sys.modules):
+        failures.append("the model client was imported during the replay")
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Time the background profile and the answers it gives without the LLM.
+
+Checks that match_intent routes a corpus of requests (and leaves the
+others to the LLM), that profile answers agree with pandas, and that a
+version changing one column only re-profiles that column. The shared
+Profiler must only cancel queued profiles of the session that submits a
+newer version, never another session's. On a frame with more numeric
+columns than the profile correlates, the correlation answer must say it
+is partial. Timings compare
+answering from the profile with running the equivalent generated code.
+
+Usage: python benchmarks/bench_profile.py [--rows 1000000]
+Exits with status 1 if a request is routed wrongly or an answer differs.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.execution import run_generated_code  # noqa: E402
+from utils.fingerprint import frame_fingerprint  # noqa: E402
+from utils.intents import answer_from_profile, match_intent  # noqa: E402
+from utils.profiling import CORRELATION_MAX_COLUMNS, Profiler, profile_frame  # noqa: E402
+
+ROUTES = {
+    "describe the data": ("describe", []),
+    "Can you summarize the dataset?": ("describe", []),
+    "show summary statistics": ("describe", []),
+    "missing values per column": ("missing", []),
+    "How many missing values are there in the dataset?": ("missing", []),
+    "which columns have null values": ("missing", []),
+    "show the correlation matrix": ("correlation", []),
+    "correlation heatmap of all numeric columns": ("correlation", []),
+    "correlation between price and quantity": ("pair_correlation", ["price", "quantity"]),
+    "distribution of price": ("distribution", ["price"]),
+    "plot a histogram of unit_cost": ("distribution", ["unit_cost"]),
+    "Unit cost distribution": ("distribution", ["unit_cost"]),
+    "most common region": ("top_values", ["region"]),
+    "value counts of the 'category' column": ("top_values", ["category"]),
+    "top 3 values of region": ("top_values", ["region", 3]),
+    "most common 20 quantity": ("top_values", ["quantity", 20]),
+    # Left to the LLM
+    "describe the data and drop rows with missing price": None,
+    "distribution of colour": None,
+    "plot price over time by region": None,
+    "what is the average price per region?": None,
+    "fill missing values with the median": None,
+}
+
+EQUIVALENT_CODE = {
+    "describe": "print(df.describe(include='all'))",
+    "missing": "print(df.isnull().sum())",
+    "correlation": "import plotly.express as px\nfig = px.imshow(df.select_dtypes(include='number').corr())",
+    "distribution": "import plotly.express as px\nfig = px.histogram(df, x='price')",
+    "top_values": "print(df['region'].value_counts().head(10))",
+}
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "price": rng.gamma(2.0, 20.0, size=rows),
+        "quantity": rng.integers(1, 50, size=rows),
+        "unit_cost": rng.normal(10, 2, size=rows),
+        "region": pd.Categorical(rng.choice(["north", "south", "east", "west"], size=rows)),
+        "category": rng.choice(["toys", "books", "garden", "food", "tools"], size=rows),
+        "date": pd.date_range("2024-01-01", periods=rows, freq="min"),
+    })
+    df.loc[rng.random(rows) < 0.05, "price"] = np.nan
+    df.loc[rng.random(rows) < 0.01, "category"] = None
+    return df
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(min(times), 4)
+
+
+def sessions(df: pd.DataFrame, failures: list) -> None:
+    """Two sessions queue versions behind a busy profiler; only the first one's older version is dropped"""
+    profiler = Profiler()
+    busy = threading.Event()
+    profiler._executor.submit(busy.wait)
+    head = df.head(1000)
+    first, other, newer = (head.assign(quantity=head["quantity"] + i) for i in range(3))
+    fingerprints = [frame_fingerprint(frame) for frame in (first, other, newer)]
+    try:
+        profiler.submit(first, fingerprints[0], owner="a")
+        profiler.submit(other, fingerprints[1], owner="b")
+        profiler.submit(newer, fingerprints[2], owner="a")
+    finally:
+        busy.set()
+    if profiler.get(fingerprints[1].token, wait=30) is None:
+        failures.append("sessions: a newer version of one session cancelled another session's profile")
+    if profiler.get(fingerprints[2].token, wait=30) is None:
+        failures.append("sessions: the newest version was not profiled")
+    if profiler.get(fingerprints[0].token) is not None:
+        failures.append("sessions: the replaced version of a session was still profiled")
+
+
+def wide_correlation(failures: list) -> None:
+    columns = CORRELATION_MAX_COLUMNS + 20
+    wide = pd.DataFrame(np.random.default_rng(0).normal(size=(500, columns)), columns=[f"x{i}" for i in range(columns)])
+    profile = profile_frame(wide)
+    answer = answer_from_profile("correlation", [], profile)
+    if answer is None or "partial" not in answer.text or f"of {columns} numeric columns" not in answer.text:
+        failures.append(f"wide correlation: answer does not say it is partial ({answer and answer.text[:80]!r})")
+    if answer_from_profile("pair_correlation", ["x0", f"x{columns - 1}"], profile) is not None:
+        failures.append("wide correlation: answered a pair with a column left out of the profile")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    failures = []
+    for request, expected in ROUTES.items():
+        matched = match_intent(request, df.columns)
+        if matched != expected:
+            failures.append(f"{request!r} routed to {matched}, expected {expected}")
+
+    sessions(df, failures)
+    wide_correlation(failures)
+
+    fingerprint = frame_fingerprint(df)
+    start = time.perf_counter()
+    profile = profile_frame(df, fingerprint)
+    cold_s = time.perf_counter() - start
+
+    changed = df.copy()
+    changed["unit_cost"] = changed["unit_cost"] * 1.1
+    changed_fingerprint = frame_fingerprint(changed)
+    start = time.perf_counter()
+    profile_frame(changed, changed_fingerprint)
+    incremental_s = time.perf_counter() - start
+
+    if profile.columns["price"].nulls != int(df["price"].isna().sum()):
+        failures.append("missing: price null count differs from pandas")
+    if not np.allclose(profile.correlation.to_numpy(), df[["price", "quantity", "unit_cost"]].corr().to_numpy()):
+        failures.append("correlation: matrix differs from DataFrame.corr")
+    if dict(profile.columns["region"].top) != df["region"].value_counts().to_dict():
+        failures.append("top_values: region counts differ from value_counts")
+    top = answer_from_profile("top_values", ["region", 3], profile)
+    if top is None or top.table["count"].to_dict() != df["region"].value_counts().head(3).to_dict():
+        failures.append("top_values: the top 3 regions differ from value_counts().head(3)")
+    if answer_from_profile("top_values", ["quantity", 20], profile) is not None:
+        failures.append("top_values: answered a top 20 from the 10 values the profile keeps")
+
+    answers = {}
+    for intent, code in EQUIVALENT_CODE.items():
+        columns = ["price"] if intent == "distribution" else ["region"] if intent == "top_values" else []
+        answers[intent] = {
+            "profile_ms": round(best_of(lambda: answer_from_profile(intent, columns, profile)) * 1000, 2),
+            "generated_code_ms": round(best_of(lambda: run_generated_code(code, df)) * 1000, 1),
+        }
+
+    print(json.dumps({
+        "rows": args.rows,
+        "profile_cold_s": round(cold_s, 3),
+        "profile_one_column_changed_s": round(incremental_s, 3),
+        "answers": answers,
+    }, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
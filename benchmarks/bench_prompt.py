@@ -0,0 +1,124 @@
+"""Compare prompt size and build time of the budgeted prompt with the full one.
+
+Builds a wide feature table with a few named business columns, asks
+requests that mention them and checks that fit_prompt_inputs describes
+the mentioned columns in the schema and stays within the budget. A small
+frame must produce exactly the full schema and preview. The full prompt is
+what was sent before: every column in df_schema_to_text and
+df_head_to_text plus the last 3 exchanges.
+
+Usage: python benchmarks/bench_prompt.py [--columns 2000] [--rows 10000] [--max-tokens 8000]
+Exits with status 1 if a mentioned column is missing or the budget is exceeded.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from llm.chain import AnalysisResponse, LLMChainManager, PROMPT_CONTEXT  # noqa: E402
+from llm.prompt import PromptBudget, count_tokens, fit_prompt_inputs  # noqa: E402
+from utils.data_utils import df_head_to_text, df_schema_to_text  # noqa: E402
+from utils.fingerprint import frame_fingerprint  # noqa: E402
+
+REQUESTS = {
+    "What is the average revenue per region?": {"revenue", "region"},
+    "Plot monthly signups using signup_date": {"signup_date"},
+    "How many customers churned?": {"churned"},
+    "Show the correlation between feature_1234 and feature_0042": {"feature_1234", "feature_0042"},
+    "Which plan tier has the most premium customers?": {"plan_tier"},
+}
+
+HISTORY = [
+    ("Show the first rows", AnalysisResponse(response_type="code", content="print(df.head())")),
+    ("What does feature_0007 measure?", AnalysisResponse(
+        response_type="explanation", content="feature_0007 is a numeric feature without documentation.")),
+    ("Drop rows with missing revenue", AnalysisResponse(
+        response_type="code", content="df = df.dropna(subset=['revenue'])")),
+    ("How many rows are left?", AnalysisResponse(response_type="explanation", content="9,950 rows remain.")),
+]
+
+
+def make_frame(columns: int, rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = {f"feature_{i:04d}": rng.normal(size=rows).astype(np.float32) for i in range(columns)}
+    data.update({
+        "customer_id": np.arange(rows),
+        "signup_date": pd.date_range("2023-01-01", periods=rows, freq="h"),
+        "region": pd.Categorical(rng.choice(["north", "south", "east", "west"], size=rows)),
+        "plan_tier": rng.choice(["basic", "standard", "premium"], size=rows),
+        "revenue": rng.gamma(2.0, 50.0, size=rows),
+        "churned": rng.random(rows) < 0.1,
+    })
+    return pd.DataFrame(data)
+
+
+def full_inputs(df: pd.DataFrame, request: str) -> dict:
+    return {
+        "data_preview": df_head_to_text(df),
+        "user_request": request,
+        "file_path": "features.parquet",
+        "data_schema": df_schema_to_text(df),
+        "conversation_history": LLMChainManager.format_conversation_history(HISTORY),
+    }
+
+
+def prompt_tokens(inputs: dict) -> int:
+    return count_tokens(LLMChainManager.static_prefix() + PROMPT_CONTEXT.format(**inputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--columns", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--max-tokens", type=int, default=8000)
+    args = parser.parse_args()
+
+    budget = PromptBudget(max_tokens=args.max_tokens)
+    failures = []
+
+    small = make_frame(10, 100)
+    inputs, _ = fit_prompt_inputs(small, "average revenue", HISTORY, "small.csv", budget=budget)
+    if inputs["data_schema"] != df_schema_to_text(small) or inputs["data_preview"] != df_head_to_text(small):
+        failures.append("small frame: schema or preview differs from the full text")
+
+    df = make_frame(args.columns, args.rows)
+    fingerprint = frame_fingerprint(df)
+    results = {"columns": len(df.columns), "max_tokens": args.max_tokens, "requests": []}
+    for request, expected in REQUESTS.items():
+        start = time.perf_counter()
+        full = full_inputs(df, request)
+        full_s = time.perf_counter() - start
+        inputs, report = fit_prompt_inputs(df, request, HISTORY, "features.parquet",
+                                           fingerprint=fingerprint, budget=budget)
+        tokens = prompt_tokens(inputs)
+        described = {line[2:].split(":")[0] for line in inputs["data_schema"].splitlines() if line.startswith("- ")}
+        if not expected <= described:
+            failures.append(f"{request!r}: {sorted(expected - described)} not in the schema")
+        if tokens > args.max_tokens:
+            failures.append(f"{request!r}: {tokens} tokens exceed the budget")
+        results["requests"].append({
+            "request": request,
+            "full_tokens": prompt_tokens(full),
+            "budgeted_tokens": tokens,
+            "schema_columns": report["schema_columns"],
+            "preview_columns": report["preview_columns"],
+            "exchanges": report["exchanges"],
+            "full_build_s": round(full_s, 4),
+            # The first request builds the column index; later ones reuse it
+            "budgeted_build_s": round(report["build_seconds"], 4),
+        })
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Check that frames of every dtype survive the trip to a sandbox worker and back.
+
+Frames travel as Arrow IPC in shared memory, or pickled when Arrow cannot
+restore them. Each frame below is sent to a worker with a snippet that
+adds a column; the result must equal running the snippet in-process.
+
+- roundtrip: extension dtypes (pd.cut intervals, intervals, periods,
+  sparse, nullable integers, Arrow strings, categories, time zones), a
+  MultiIndex and a compacted synthetic table; reports the format used
+  and the time of each run
+- fallback: a pd.cut frame is forced through Arrow, which the worker
+  cannot decode; the pool must send it again pickled
+- memory: in a pool limited to ``--memory-mb``, a snippet allocating
+  twice the limit fails with an out-of-memory error while a small one
+  runs; the worker's memory after its warm-up does not count
+
+Usage: python benchmarks/bench_sandbox.py [--rows 100000] [--memory-mb 256]
+Exits with status 1 if a frame comes back different, a run fails or the
+memory limit is not enforced.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import make_dataset  # noqa: E402
+from utils import sandbox  # noqa: E402
+from utils.dtypes import arrow_roundtrips, optimize_dtypes  # noqa: E402
+from utils.execution import run_generated_code  # noqa: E402
+
+pd.set_option("mode.copy_on_write", True)
+
+SNIPPET = "df['rows'] = len(df)\nprint(df.dtypes.astype(str).tolist())"
+
+
+def frames(rows: int) -> dict:
+    values = np.arange(rows)
+    return {
+        "cut": pd.DataFrame({"value": values, "bucket": pd.cut(values, 5)}),
+        "interval": pd.DataFrame({"span": pd.arrays.IntervalArray.from_breaks(np.arange(rows + 1))}),
+        "period": pd.DataFrame({"month": pd.period_range("2020-01", periods=rows, freq="M")}),
+        "sparse": pd.DataFrame({"flag": pd.arrays.SparseArray(np.zeros(rows))}),
+        "nullable": pd.DataFrame({"count": pd.array(np.where(values % 3 == 0, None, values), dtype="Int64"),
+                                  "label": pd.array(np.where(values % 2 == 0, None, "x"), dtype="string[pyarrow]")}),
+        "category_tz": pd.DataFrame({"region": pd.Categorical(np.array(["north", "south"])[values % 2]),
+                                     "at": pd.date_range("2024-01-01", periods=rows, freq="min", tz="UTC")}),
+        "multiindex": pd.DataFrame({"value": values},
+                                   index=pd.MultiIndex.from_arrays([values % 3, values], names=["group", "id"])),
+        "compacted": optimize_dtypes(make_dataset(rows))[0],
+    }
+
+
+def run(pool: sandbox.SandboxPool, name: str, df: pd.DataFrame, failures: list) -> dict:
+    expected, expected_results, _ = run_generated_code(SNIPPET, df.copy(deep=False))
+    started = time.perf_counter()
+    try:
+        got, results, _ = pool.run(SNIPPET, df)
+    except Exception as e:
+        failures.append(f"{name}: {e}")
+        return {}
+    seconds = time.perf_counter() - started
+    if not got.equals(expected) or list(got.dtypes) != list(expected.dtypes) or not got.index.equals(expected.index):
+        failures.append(f"{name}: the frame from the worker differs from an in-process run")
+    if results["output"] != expected_results["output"]:
+        failures.append(f"{name}: output {results['output']!r} != {expected_results['output']!r}")
+    return {"format": "arrow" if arrow_roundtrips(df) else "pickle", "seconds": round(seconds, 4)}
+
+
+def fallback(pool: sandbox.SandboxPool, df: pd.DataFrame, failures: list) -> dict:
+    check = sandbox.arrow_roundtrips
+    sandbox.arrow_roundtrips = lambda frame: True
+    try:
+        result = run(pool, "fallback", df, failures)
+    finally:
+        sandbox.arrow_roundtrips = check
+    return {**result, "format": "arrow, sent again pickled"} if result else result
+
+
+def memory(df: pd.DataFrame, memory_mb: int, failures: list) -> dict:
+    pool = sandbox.SandboxPool(workers=1, memory_mb=memory_mb)
+    try:
+        run(pool, "small", df, failures)
+        started = time.perf_counter()
+        try:
+            pool.run(f"import numpy as np\nblock = np.ones({2 * memory_mb} * 2 ** 20 // 8)", df)
+            failures.append(f"memory: allocating {2 * memory_mb} MB did not fail")
+        except sandbox.SandboxError as e:
+            failures.append(f"memory: the worker was killed instead of the allocation failing ({e})")
+        except Exception as e:
+            if "allocate" not in str(e) and "memory" not in str(e):
+                failures.append(f"memory: unexpected error {e}")
+        seconds = time.perf_counter() - started
+        run(pool, "after the failed allocation", df, failures)
+        baseline = pool._idle.queue[0].baseline_rss
+    finally:
+        pool.shutdown()
+    return {"limit_mb": memory_mb, "worker_baseline_mb": round(baseline / 2 ** 20, 1),
+            "failed_allocation_s": round(seconds, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--memory-mb", type=int, default=256)
+    args = parser.parse_args()
+
+    failures = []
+    pool = sandbox.SandboxPool(workers=1)
+    try:
+        cases = frames(args.rows)
+        results = {"roundtrip": {name: run(pool, name, df, failures) for name, df in cases.items()}}
+        results["fallback"] = fallback(pool, cases["cut"], failures)
+    finally:
+        pool.shutdown()
+    results["memory"] = memory(cases["compacted"], args.memory_mb, failures)
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Check the SessionManager memory budget, idle spilling and restore after a restart.
+
+- budget: ``--sessions`` sessions each load a ``--rows`` row frame under a
+  budget of about two frames; the sessions served most recently stay in
+  memory, the others are spilled and read back on their next request
+- idle: sessions not used for ``idle_seconds`` are spilled by the
+  background thread
+- restart: a new manager on the same directory restores the chat and
+  execution history, the current frame (memory-mapped) and the version id;
+  restoring is compared with parsing the original CSV again
+- pd_cut: a frame with an interval category column, which Arrow cannot
+  restore, is saved (pickled) and loaded back
+- permissions: the session root (also an existing, world-readable one) and
+  the session directories are only accessible to their owner (0700)
+
+Usage: python benchmarks/bench_sessions.py [--rows 1000000] [--sessions 6]
+Exits with status 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import make_dataset  # noqa: E402
+from utils.dtypes import optimize_dtypes  # noqa: E402
+from utils.fingerprint import frame_fingerprint  # noqa: E402
+from utils.ingest import read_dataset  # noqa: E402
+from utils.sessions import LocalSessionBackend, SessionManager, new_session_id  # noqa: E402
+
+pd.set_option("mode.copy_on_write", True)
+
+
+def state(session_id: str) -> dict:
+    return {
+        "chat_history": [(f"request of {session_id[:6]}", "answer")],
+        "execution_history": [{"code": "df['x'] = 1", "output": "", "data_changes": None, "plots_created": 0}],
+        "file_path": "orders.csv",
+        "load_report": None,
+        "memory_report": None,
+    }
+
+
+def load(manager: SessionManager, session_id: str, df: pd.DataFrame) -> None:
+    versions, _ = manager.open(session_id)
+    versions.commit(df, frame_fingerprint(df), "Loaded orders.csv")
+    manager.save(session_id, state(session_id))
+
+
+def budget(args, root: str, frames: list, failures: list) -> dict:
+    frame_bytes = int(frames[0].memory_usage(deep=True).sum())
+    manager = SessionManager(LocalSessionBackend(root), memory_budget_mb=max(2 * frame_bytes // 2 ** 20 + 1, 1),
+                             idle_seconds=3600, check_interval=3600)
+    ids = [new_session_id() for _ in frames]
+    peak = 0
+    for session_id, df in zip(ids, frames):
+        load(manager, session_id, df)
+        peak = max(peak, manager.memory_bytes())
+    manager.flush()
+    if peak > manager.memory_budget:
+        failures.append(f"budget: {peak:,} bytes in memory with a budget of {manager.memory_budget:,}")
+    spilled = [session_id for session_id in ids if not manager._sessions[session_id].versions.stats()["memory_bytes"]]
+    if ids[-1] in spilled or ids[0] not in spilled:
+        failures.append(f"budget: spilled {len(spilled)} sessions, newest spilled: {ids[-1] in spilled}")
+
+    # The oldest session's next request reads its frame back
+    started = time.perf_counter()
+    versions, _ = manager.open(ids[0])
+    reloaded = versions.current_frame()
+    reload_s = time.perf_counter() - started
+    if not reloaded.equals(frames[0]):
+        failures.append("budget: the frame read back differs from the one loaded")
+    if manager.memory_bytes() > manager.memory_budget:
+        failures.append("budget: over budget after reading a spilled session back")
+    stats = manager.stats()
+    manager.shutdown()
+    return {"frame_mb": round(frame_bytes / 2 ** 20, 1), "budget_mb": round(manager.memory_budget / 2 ** 20, 1),
+            "peak_mb": round(peak / 2 ** 20, 1), "spilled_sessions": len(spilled),
+            "reload_s": round(reload_s, 4), "evicted": stats["evicted"], "frame_saves": stats["frame_saves"]}
+
+
+def idle(root: str, df: pd.DataFrame, failures: list) -> dict:
+    manager = SessionManager(LocalSessionBackend(root), idle_seconds=0.2, check_interval=0.05)
+    session_id = new_session_id()
+    load(manager, session_id, df)
+    time.sleep(0.6)
+    stats = manager.stats()
+    if manager.memory_bytes() or stats["idle_spilled"] != 1:
+        failures.append(f"idle: session not spilled after idling ({stats})")
+    manager.shutdown()
+    return {"idle_spilled": stats["idle_spilled"]}
+
+
+def restart(root: str, df: pd.DataFrame, csv_path: str, failures: list) -> dict:
+    manager = SessionManager(LocalSessionBackend(root), check_interval=3600)
+    session_id = new_session_id()
+    load(manager, session_id, df.head(10))
+    versions, _ = manager.open(session_id)
+    versions.commit(df, frame_fingerprint(df), "add a column")
+    version_id = versions.current
+    manager.save(session_id, state(session_id))
+    manager.flush()
+    manager.shutdown()
+
+    started = time.perf_counter()
+    restarted = SessionManager(LocalSessionBackend(root), check_interval=3600)
+    versions, saved = restarted.open(session_id)
+    restored = versions.current_frame()
+    restore_s = time.perf_counter() - started
+    restarted.shutdown()
+
+    started = time.perf_counter()
+    parsed, _ = read_dataset(csv_path)
+    optimize_dtypes(parsed)
+    parse_s = time.perf_counter() - started
+
+    if saved.get("chat_history") != state(session_id)["chat_history"] or not saved.get("execution_history"):
+        failures.append(f"restart: history not restored ({saved})")
+    if restored is None or not restored.equals(df) or restored.attrs != df.attrs:
+        failures.append("restart: restored frame differs")
+    if versions.current != version_id:
+        failures.append(f"restart: version {versions.current}, expected {version_id}")
+    return {"restore_s": round(restore_s, 4), "csv_parse_s": round(parse_s, 4),
+            "data_bytes_on_disk": os.path.getsize(os.path.join(root, session_id, "data.arrow"))}
+
+
+def pd_cut(root: str, failures: list) -> dict:
+    backend = LocalSessionBackend(root)
+    session_id = new_session_id()
+    values = np.arange(1000)
+    df = pd.DataFrame({"value": values, "bucket": pd.cut(values, 5)})
+    try:
+        backend.save_frame(session_id, df)
+        restored = backend.load_frame(session_id)
+    except Exception as e:
+        failures.append(f"pd_cut: {type(e).__name__}: {e}")
+        return {}
+    if restored is None or not restored.equals(df) or list(restored.dtypes) != list(df.dtypes):
+        failures.append("pd_cut: restored frame differs")
+    return {"files": sorted(os.listdir(os.path.join(root, session_id)))}
+
+
+def permissions(root: str, failures: list) -> dict:
+    os.makedirs(root, mode=0o755)
+    backend = LocalSessionBackend(root)
+    session_id = new_session_id()
+    backend.save_state(session_id, state(session_id))
+    modes = {path: stat.S_IMODE(os.stat(path).st_mode) for path in (root, os.path.join(root, session_id))}
+    for path, mode in modes.items():
+        if mode != 0o700:
+            failures.append(f"permissions: {path} has mode {mode:o}, expected 700")
+    return {os.path.relpath(path, root): f"{mode:o}" for path, mode in modes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=6)
+    args = parser.parse_args()
+
+    df, _ = optimize_dtypes(make_dataset(args.rows))
+    frames = [df.assign(order_id=df["order_id"] + i) for i in range(args.sessions)]
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "orders.csv")
+        df.to_csv(csv_path, index=False)
+        results = {
+            "budget": budget(args, os.path.join(tmp, "budget"), frames, failures),
+            "idle": idle(os.path.join(tmp, "idle"), frames[0], failures),
+            "restart": restart(os.path.join(tmp, "restart"), df, csv_path, failures),
+            "pd_cut": pd_cut(os.path.join(tmp, "pd_cut"), failures),
+            "permissions": permissions(os.path.join(tmp, "permissions"), failures),
+        }
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
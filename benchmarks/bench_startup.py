@@ -0,0 +1,193 @@
+"""Profile the cold start of the Streamlit app and the latency of its first request.
+
+- imports: ``python -X importtime -c "import streamlit_app"`` in fresh
+  interpreters (best of ``--repeat``); reports the import time, the
+  packages that take longest and fails if a library that should load
+  lazily (LangChain, httpx, DuckDB, matplotlib, seaborn, ...) is imported
+  with the app
+- first_request: a fresh interpreter imports the app and then does what
+  the first "Analyze" needs: the LLM chain, the instruction prompt and
+  running a plotting snippet (in-process, SANDBOX_WORKERS=0). "cold" does
+  this right away, "warm" after the background Warmup finished, as when
+  the first visitor is still uploading a file. No model is called.
+
+--compare flags timings slower than a previous --output by more than
+--tolerance.
+
+Usage: python benchmarks/bench_startup.py [--repeat 3] [--max-import-seconds 3]
+           [--output startup.json] [--compare baseline.json]
+Exits with status 1 if a deferred library is imported with the app, the
+import takes longer than --max-import-seconds, the warm-up fails or does
+not shorten the first request, or a timing regressed against --compare.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Imported on first use or by the warm-up, never by "import streamlit_app"
+DEFERRED = (
+    "langchain", "langchain_core", "langchain_community", "langchain_google_genai", "langchain_openai",
+    "httpx", "duckdb", "matplotlib", "seaborn", "scipy", "sklearn", "plotly.express",
+)
+
+# What the model might answer to a first request for a plot
+FIRST_SNIPPET = (
+    "import plotly.express as px\n"
+    "import seaborn as sns\n"
+    "import matplotlib.pyplot as plt\n"
+    "fig = px.histogram(df, x='price')\n"
+    "ax = sns.countplot(data=df, x='region')\n"
+    "print(df['price'].mean())"
+)
+
+
+def child_env() -> dict:
+    env = dict(os.environ, PYTHONPATH=SRC, SANDBOX_WORKERS="0", MPLBACKEND="Agg",
+               LLM_PROVIDER="openai", OPENAI_API_KEY="not-used", METRICS_ENABLED="0")
+    env.pop("LLM_FALLBACK_PROVIDER", None)
+    return env
+
+
+def parse_importtime(stderr: str) -> dict:
+    """module -> (self seconds, cumulative seconds) from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return modules
+
+
+def imports(repeat: int, failures: list) -> dict:
+    best = None
+    for _ in range(repeat):
+        run = subprocess.run([sys.executable, "-X", "importtime", "-c", "import streamlit_app"],
+                             capture_output=True, text=True, env=child_env())
+        if run.returncode != 0:
+            failures.append(f"imports: import streamlit_app failed: {run.stderr[-500:]}")
+            return {}
+        modules = parse_importtime(run.stderr)
+        if best is None or modules["streamlit_app"][1] < best["streamlit_app"][1]:
+            best = modules
+
+    packages = {}
+    for name, (self_seconds, _) in best.items():
+        packages[name.split(".")[0]] = packages.get(name.split(".")[0], 0.0) + self_seconds
+    loaded = [name for name in DEFERRED if name in best]
+    if loaded:
+        failures.append(f"imports: {', '.join(loaded)} imported with the app")
+    return {
+        "import_s": round(best["streamlit_app"][1], 3),
+        "modules": len(best),
+        "top_packages": {name: round(seconds, 3)
+                         for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:10]},
+        "deferred_loaded": loaded,
+    }
+
+
+def child(mode: str) -> None:
+    """Run in a fresh interpreter: import the app, optionally warm up, then time a first request"""
+    started = time.perf_counter()
+    import streamlit_app  # noqa: F401
+    result = {"import_s": time.perf_counter() - started}
+
+    if mode == "warm":
+        from utils.warmup import Warmup
+        warmup = Warmup.start()
+        warmup.wait()
+        result["warmup"] = {name: round(seconds, 3) for name, seconds in warmup.seconds.items()}
+        result["warmup_errors"] = warmup.errors
+
+    import pandas as pd
+    df = pd.DataFrame({"price": [float(i % 97) for i in range(10_000)],
+                       "region": [("north", "south", "east", "west")[i % 4] for i in range(10_000)]})
+    started = time.perf_counter()
+    from llm.chain import LLMChainManager
+    from utils.sandbox import run_code
+    LLMChainManager.get_instance()
+    LLMChainManager.static_prefix()
+    _, execution_results, figures = run_code(FIRST_SNIPPET, df)
+    result["first_request_s"] = time.perf_counter() - started
+    result["figures"] = len(figures)
+    print(json.dumps(result))
+
+
+def first_request(mode: str, failures: list) -> dict:
+    run = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode],
+                         capture_output=True, text=True, env=child_env())
+    if run.returncode != 0:
+        failures.append(f"first_request {mode}: exited with {run.returncode}: {run.stderr[-500:]}")
+        return {}
+    result = json.loads(run.stdout.strip().splitlines()[-1])
+    if result["figures"] != 2:
+        failures.append(f"first_request {mode}: {result['figures']} figures")
+    if result.get("warmup_errors"):
+        failures.append(f"first_request {mode}: warm-up failed: {result['warmup_errors']}")
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def compare(results: dict, baseline_path: str, tolerance: float, min_seconds: float) -> list:
+    """Timings slower than the baseline by more than tolerance (and min_seconds)"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    timings = {
+        "import": (results["imports"].get("import_s"), baseline["imports"].get("import_s")),
+        "cold first request": (results["cold"].get("first_request_s"), baseline["cold"].get("first_request_s")),
+        "warm first request": (results["warm"].get("first_request_s"), baseline["warm"].get("first_request_s")),
+    }
+    regressions = []
+    for name, (seconds, before) in timings.items():
+        if seconds is None or before is None:
+            continue
+        if seconds > before * (1 + tolerance) and seconds - before > min_seconds:
+            regressions.append(f"{name}: {before:.3f}s -> {seconds:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-import-seconds", type=float, help="fail if importing the app takes longer")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="results JSON of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    parser.add_argument("--child", choices=("cold", "warm"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    failures = []
+    results = {"imports": imports(args.repeat, failures),
+               "cold": first_request("cold", failures),
+               "warm": first_request("warm", failures)}
+    import_s = results["imports"].get("import_s")
+    if args.max_import_seconds is not None and import_s is not None and import_s > args.max_import_seconds:
+        failures.append(f"imports: {import_s:.3f}s, more than {args.max_import_seconds}s")
+    cold, warm = results["cold"].get("first_request_s"), results["warm"].get("first_request_s")
+    if cold is not None and warm is not None:
+        results["first_request_saved_s"] = round(cold - warm, 3)
+        if warm >= cold:
+            failures.append(f"first_request: {warm:.3f}s after the warm-up, {cold:.3f}s without")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        failures += [f"regression {line}" for line in compare(results, args.compare, args.tolerance, args.min_seconds)]
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Measure the memory held by VersionStore and check that undo restores each version.
+
+Commits a chain of typical one-column operations, compares the memory the
+store keeps in RAM with per-step df.copy() snapshots, then walks back with
+undo (loading spilled versions from disk) and verifies every checked-out
+frame has the fingerprint it was committed with. A frame Arrow cannot
+restore (a pd.cut column) is spilled too and must come back from disk.
+
+Usage: python benchmarks/bench_versions.py [--rows 2000000] [--steps 20] [--budget-mb 256]
+Exits with status 1 if a restored version differs or cannot be loaded.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.fingerprint import frame_fingerprint  # noqa: E402
+from utils.versions import VersionStore  # noqa: E402
+
+pd.set_option("mode.copy_on_write", True)
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'value': rng.normal(size=rows),
+        'count': rng.integers(0, 1000, size=rows).astype(np.int32),
+        'region': pd.Categorical(rng.choice(['north', 'south', 'east', 'west'], size=rows)),
+        'time': pd.date_range('2024-01-01', periods=rows, freq='s'),
+        'price': rng.uniform(1, 100, size=rows),
+    })
+
+
+def step(df: pd.DataFrame, i: int) -> pd.DataFrame:
+    """One generated-code style operation: rewrite or add a single column"""
+    df = df.copy(deep=False)
+    if i % 3 == 0:
+        df['value'] = df['value'] * 1.01
+    elif i % 3 == 1:
+        df[f'ratio_{i}'] = df['price'] / (df['count'] + 1)
+    else:
+        df.loc[df.index[i], 'price'] = -1.0
+    return df
+
+
+def spill_cut(failures: list) -> str:
+    """Spill a frame with an interval category column and undo back to it"""
+    values = np.arange(1000)
+    df = pd.DataFrame({'value': values, 'bucket': pd.cut(values, 5)})
+    store = VersionStore(memory_budget_mb=1024, max_versions=4)
+    try:
+        store.commit(df, frame_fingerprint(df), label="cut")
+        changed = df.assign(value=df['value'] * 2)
+        store.commit(changed, frame_fingerprint(changed), label="double")
+        store.spill_all()
+        restored, _ = store.undo()
+    except Exception as e:
+        failures.append(f"pd.cut version: {type(e).__name__}: {e}")
+        return "failed"
+    finally:
+        store.close()
+    if not restored.equals(df) or list(restored.dtypes) != list(df.dtypes):
+        failures.append("pd.cut version: restored frame differs")
+    return "restored"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--budget-mb', type=int, default=256)
+    args = parser.parse_args()
+
+    store = VersionStore(memory_budget_mb=args.budget_mb, max_versions=args.steps + 1)
+    df = make_frame(args.rows)
+    tokens = {}
+    naive_bytes = 0
+    start = time.perf_counter()
+    for i in range(args.steps + 1):
+        if i:
+            df = step(df, i)
+        fingerprint = frame_fingerprint(df)
+        version_id, df = store.commit(df, fingerprint, label=f"step {i}")
+        tokens[version_id] = fingerprint.token
+        naive_bytes += int(df.memory_usage(deep=True).sum())
+    commit_s = time.perf_counter() - start
+
+    failures = []
+    undo_times = []
+    while store.can_undo:
+        start = time.perf_counter()
+        restored, fingerprint = store.undo()
+        undo_times.append(time.perf_counter() - start)
+        if frame_fingerprint(restored).token != tokens[store.current]:
+            failures.append(f"version {store.current}: restored frame differs")
+
+    stats = store.stats()
+    store.close()
+    cut = spill_cut(failures)
+    print(json.dumps({
+        'rows': args.rows,
+        'versions': stats['versions'],
+        'spilled': stats['spilled'],
+        'store_memory_mb': round(stats['memory_bytes'] / 2 ** 20, 1),
+        'copy_snapshots_mb': round(naive_bytes / 2 ** 20, 1),
+        'commit_s': round(commit_s, 3),
+        'undo_max_s': round(max(undo_times, default=0.0), 4),
+        'pd_cut_version': cut,
+    }, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
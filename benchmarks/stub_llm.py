@@ -0,0 +1,111 @@
+"""Local HTTP server standing in for the Gemini and OpenAI APIs in the benchmarks."""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Sequence, Union
+
+
+class StubLLMServer:
+    """Local HTTP server answering Gemini and OpenAI streaming requests offline.
+
+    Every request gets ``response`` (or ``response(body)`` when it is a
+    function of the JSON request body) as server-sent events in chunks of
+    ``chunk_size`` characters. ``latency`` (seconds, or a function of the
+    request number) delays the first chunk. ``errors`` lists the status
+    codes returned by the first requests, e.g. ``[429, 503]``; error
+    responses carry ``Retry-After: retry_after`` when it is set. Use as a
+    context manager; ``url`` is the base URL to give a provider.
+    """
+
+    def __init__(self, response: Union[str, Callable[[dict], str]] = '{"response_type": "explanation", "content": "ok"}',
+                 latency: Union[float, Callable[[int], float]] = 0.0, chunk_size: int = 16,
+                 chunk_delay: float = 0.0, errors: Sequence[int] = (), retry_after: Optional[float] = None):
+        self.response = response
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.errors = list(errors)
+        self.retry_after = retry_after
+        self.requests = 0
+        self.connections = 0
+        self.prompts = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubLLMServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _events(self, path: str, body: dict) -> list:
+        response = self.response(body) if callable(self.response) else self.response
+        pieces = [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)]
+        if path.endswith("/chat/completions"):
+            events = [{"choices": [{"delta": {"content": piece}}]} for piece in pieces]
+            return [json.dumps(event) for event in events] + ["[DONE]"]
+        return [json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]})
+                for piece in pieces]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                number = next(stub._counter)
+                with stub._lock:
+                    stub.requests += 1
+                    stub.prompts.append(body)
+                latency = stub.latency(number) if callable(stub.latency) else stub.latency
+                if number < len(stub.errors):
+                    payload = json.dumps({"error": {"code": stub.errors[number]}}).encode()
+                    self.send_response(stub.errors[number])
+                    if stub.retry_after is not None:
+                        self.send_header("Retry-After", str(stub.retry_after))
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                time.sleep(latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i, event in enumerate(stub._events(self.path, body)):
+                        if i and stub.chunk_delay:
+                            time.sleep(stub.chunk_delay)
+                        self._write_chunk(f"data: {event}\r\n\r\n".encode())
+                    self._write_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled, e.g. a hedged request that lost
+                    self.close_connection = True
+
+        return Handler
@@ -0,0 +1,96 @@
+"""Synthetic datasets for the benchmarks.
+
+make_dataset builds a frame with the columns the recorded responses in
+generated_snippets.json use (price, quantity, region, target, ...) plus
+integer, float, categorical, free-text, datetime and boolean columns, and
+pads it with generated columns to make it wide. write_dataset writes it in
+any format read_dataset supports that pandas can write.
+"""
+import importlib.util
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+NARROW_COLUMNS = 12
+EXCEL_MAX_CELLS = 2_000_000   # openpyxl writes ~100k cells/s; Excel itself stops at 1,048,576 rows
+
+_REGIONS = np.array(["north", "south", "east", "west"])
+_CATEGORIES = np.array(["toys", "books", "garden", "food", "tools", "sports", "music", "health"])
+_COMMENTS = np.array([
+    "arrived on time", "box was damaged", "would order again", "slow delivery",
+    "great value for money", "wrong size", "gift for a friend", "", "as described", "colour differs from photo",
+])
+
+
+def make_dataset(rows: int, columns: int = NARROW_COLUMNS, seed: int = 0) -> pd.DataFrame:
+    """Orders table with mixed dtypes and missing values, padded to ``columns`` columns"""
+    rng = np.random.default_rng(seed)
+    quantity = rng.integers(1, 50, size=rows).astype(np.float64)
+    quantity[rng.random(rows) < 0.02] = np.nan
+    price = rng.gamma(2.0, 20.0, size=rows)
+    price[rng.random(rows) < 0.05] = np.nan
+    category = rng.choice(_CATEGORIES, size=rows).astype(object)
+    category[rng.random(rows) < 0.01] = None
+    df = pd.DataFrame({
+        "order_id": np.arange(rows, dtype=np.int64),
+        "price": price,
+        "quantity": quantity,
+        "unit_cost": rng.normal(10, 2, size=rows).astype(np.float32),
+        "region": rng.choice(_REGIONS, size=rows),
+        "category": category,
+        "customer": pd.Series(rng.integers(0, max(rows // 4, 1), size=rows)).map("C{:07d}".format).to_numpy(),
+        "comment": rng.choice(_COMMENTS, size=rows),
+        "ordered_at": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, size=rows), unit="s"),
+        "returned": rng.random(rows) < 0.07,
+        "rating": rng.integers(1, 6, size=rows).astype(np.int8),
+        "target": rng.integers(0, 2, size=rows),
+    })
+    extra = {}
+    for i in range(max(columns - len(df.columns), 0)):
+        kind = i % 4
+        if kind == 0:
+            extra[f"f_{i:04d}"] = rng.normal(size=rows)
+        elif kind == 1:
+            extra[f"n_{i:04d}"] = rng.integers(0, 1000, size=rows)
+        elif kind == 2:
+            extra[f"c_{i:04d}"] = rng.choice(_CATEGORIES, size=rows)
+        else:
+            extra[f"b_{i:04d}"] = rng.random(rows) < 0.5
+    if extra:
+        df = pd.concat([df, pd.DataFrame(extra)], axis=1)
+    return df
+
+
+_WRITERS = {
+    "csv": lambda df, path: df.to_csv(path, index=False),
+    "xlsx": lambda df, path: df.to_excel(path, index=False),
+    "json": lambda df, path: df.to_json(path, orient="records", lines=True, date_format="iso"),
+    "parquet": lambda df, path: df.to_parquet(path, index=False),
+    "pickle": lambda df, path: df.to_pickle(path),
+    "feather": lambda df, path: df.to_feather(path),
+    "hdf5": lambda df, path: df.to_hdf(path, key="data", format="table"),
+}
+FORMATS = tuple(_WRITERS)
+_EXTENSIONS = {"hdf5": "h5", "pickle": "pkl"}
+
+# Writer dependency of each format beyond pandas and pyarrow
+_REQUIRES = {"xlsx": "openpyxl", "hdf5": "tables"}
+
+
+def file_name(fmt: str) -> str:
+    return f"data.{_EXTENSIONS.get(fmt, fmt)}"
+
+
+def skip_reason(fmt: str, df: pd.DataFrame) -> Optional[str]:
+    """Why df cannot be written as fmt here, or None"""
+    module = _REQUIRES.get(fmt)
+    if module and importlib.util.find_spec(module) is None:
+        return f"needs {module}"
+    if fmt == "xlsx" and df.size > EXCEL_MAX_CELLS:
+        return f"more than {EXCEL_MAX_CELLS:,} cells"
+    return None
+
+
+def write_dataset(df: pd.DataFrame, path: str, fmt: str) -> None:
+    _WRITERS[fmt](df, path)
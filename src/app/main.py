@@ -1,11 +1,6 @@
-import requests
-
-def is_valid_pypi_package(package_name):
-    url = f"https://pypi.org/pypi/{package_name}/json"
-    resp = requests.get(url)
-    return resp.status_code == 200
+from utils.packages import PackageResolver
 
 # Example:
 module = "sklearn"
-pip_package = module if is_valid_pypi_package(module) else "scikit-learn"
-print()
+pip_package = PackageResolver.get_resolver().resolve(module) or module
+print(pip_package)
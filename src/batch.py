@@ -0,0 +1,287 @@
+"""Run analysis requests from a JSONL file against a dataset without the UI.
+
+Each line of the requests file is a JSON object with a "request" string and
+an optional "id", or just a JSON string. Requests run in order against one
+DataFrame, as if typed one after another in the app, except that prompts
+carry no conversation history: every line should make sense on its own.
+
+Writes to the output directory:
+- results.jsonl: one record per request with the response, printed output,
+  data changes, figure files, error and timings
+- figures/: plotly figures as HTML, matplotlib figures as PNG
+- summary.json: totals and the LLM client counters
+- data.parquet: the final DataFrame, with --save-data
+
+Usage: python src/batch.py DATA_FILE REQUESTS_JSONL [--out DIR] [--concurrency 4]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+from llm.chain import LLMChainManager, parse_llm_response
+from llm.prompt import PromptBudget, fit_prompt_inputs
+from utils.dtypes import optimize_dtypes, optimize_enabled
+from utils.figures import FigureBudget
+from utils.fingerprint import describe_changes, diff_fingerprints, frame_fingerprint
+from utils.ingest import load_budget_from_env, read_dataset
+from utils.intents import answer_from_profile, match_intent
+from utils.packages import MissingPackageError
+from utils.profiling import DataProfile, Profiler
+from utils.sandbox import SandboxPool, run_code
+
+# Generated code gets a shallow copy of the data; copy-on-write keeps the
+# in-place edits of a request that fails halfway out of the current version
+pd.set_option("mode.copy_on_write", True)
+
+
+class BatchRequest(NamedTuple):
+    id: str
+    request: str
+
+
+class _Call(NamedTuple):
+    """LLM call in flight for one request, sent with the data at ``token``"""
+    token: str
+    future: Future
+    prompt_s: float
+
+
+def read_requests(path: str) -> list:
+    """BatchRequests from a JSONL file; ids default to the line number"""
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"request": item}
+            if not item.get("request"):
+                raise ValueError(f"{path}:{number}: missing 'request'")
+            requests.append(BatchRequest(str(item.get("id", number)), item["request"]))
+    return requests
+
+
+def _timed_run(inputs: dict) -> tuple[str, float]:
+    started = time.perf_counter()
+    raw = LLMChainManager.run(inputs)
+    return raw, time.perf_counter() - started
+
+
+class BatchRunner:
+    """Answers requests in order against one DataFrame, prefetching LLM responses.
+
+    Up to ``concurrency`` LLM calls run on a thread pool while generated code
+    executes on the calling thread, so model latency overlaps with code
+    execution. A prompt describes the data as it was when the prompt was
+    sent; when an earlier request changes the data, the prompts built from
+    the old version are sent again before their code runs. Common requests
+    are answered from the data profile, as in the app, unless
+    ``fast_answers`` is off.
+    """
+
+    def __init__(self, df: pd.DataFrame, out_dir: str, file_path: Optional[str] = None,
+                 concurrency: int = 4, figure_budget: Optional[FigureBudget] = None,
+                 prompt_budget: Optional[PromptBudget] = None, fast_answers: bool = True):
+        self.out_dir = out_dir
+        self.file_path = file_path
+        self.concurrency = max(int(concurrency), 1)
+        self.figure_budget = figure_budget or FigureBudget.from_env()
+        self.prompt_budget = prompt_budget or PromptBudget.from_env()
+        self.fast_answers = fast_answers
+        self.df = None
+        self.fingerprint = None
+        self.counters = {"llm_calls": 0, "stale_prompts": 0, "profile_answers": 0, "errors": 0}
+        self._set_frame(df)
+
+    def _set_frame(self, df: pd.DataFrame) -> None:
+        """Make df the current data, compacting its dtypes first when enabled"""
+        if optimize_enabled():
+            df, _ = optimize_dtypes(df)
+        fingerprint = frame_fingerprint(df)
+        if self.fingerprint is not None and fingerprint.token == self.fingerprint.token:
+            return
+        self.df, self.fingerprint = df, fingerprint
+        profiler = Profiler.get_profiler()
+        if profiler is not None:
+            profiler.submit(df, fingerprint, owner=id(self))
+
+    def _profile(self, wait: Optional[float] = 0.0) -> Optional[DataProfile]:
+        profiler = Profiler.get_profiler()
+        if profiler is None:
+            return None
+        return profiler.get(self.fingerprint.token, wait)
+
+    def _matches_intent(self, request: str) -> bool:
+        return self.fast_answers and Profiler.get_profiler() is not None and \
+            match_intent(request, self.df.columns) is not None
+
+    def _submit(self, request: str, pool: ThreadPoolExecutor) -> _Call:
+        started = time.perf_counter()
+        inputs, _ = fit_prompt_inputs(self.df, request, [], file_path=self.file_path,
+                                      fingerprint=self.fingerprint, budget=self.prompt_budget,
+                                      profile=self._profile())
+        self.counters["llm_calls"] += 1
+        return _Call(self.fingerprint.token, pool.submit(_timed_run, inputs), time.perf_counter() - started)
+
+    def _prefetch(self, requests: list, start: int, calls: dict, pool: ThreadPoolExecutor) -> None:
+        """Keep LLM calls in flight for the next ``concurrency`` requests, resending stale prompts"""
+        for index in range(start, min(start + self.concurrency, len(requests))):
+            call = calls.get(index)
+            if call is not None and call.token == self.fingerprint.token:
+                continue
+            if call is not None:
+                call.future.cancel()
+                self.counters["stale_prompts"] += 1
+            elif self._matches_intent(requests[index].request):
+                continue
+            calls[index] = self._submit(requests[index].request, pool)
+
+    def run(self, requests: list) -> dict:
+        """Answer every request, writing results.jsonl, figures/ and summary.json to out_dir"""
+        os.makedirs(os.path.join(self.out_dir, "figures"), exist_ok=True)
+        started = time.perf_counter()
+        # Workers import their warm modules while the first LLM calls are in flight
+        SandboxPool.get_pool()
+        records = []
+        calls = {}
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-llm")
+        try:
+            with open(os.path.join(self.out_dir, "results.jsonl"), "w", encoding="utf-8") as out:
+                for index, item in enumerate(requests):
+                    self._prefetch(requests, index, calls, pool)
+                    record = self._answer(item, calls.pop(index, None), pool)
+                    if record["error"]:
+                        self.counters["errors"] += 1
+                    out.write(json.dumps(record, default=str) + "\n")
+                    out.flush()
+                    records.append(record)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        timings = [record["timings"] for record in records]
+        summary = dict(
+            self.counters,
+            requests=len(records),
+            concurrency=self.concurrency,
+            wall_s=round(time.perf_counter() - started, 3),
+            llm_s=round(sum(t.get("llm_s", 0.0) for t in timings), 3),
+            wait_s=round(sum(t.get("wait_s", 0.0) for t in timings), 3),
+            execute_s=round(sum(t.get("execute_s", 0.0) for t in timings), 3),
+            client=LLMChainManager.get_client().stats(),
+            cache=LLMChainManager.get_cache().stats(),
+        )
+        with open(os.path.join(self.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+        return summary
+
+    def _answer(self, item: BatchRequest, call: Optional[_Call], pool: ThreadPoolExecutor) -> dict:
+        record = {"id": item.id, "request": item.request, "source": None, "response_type": None,
+                  "content": None, "output": "", "data_changes": None, "figures": [], "notices": [],
+                  "error": None, "timings": {}}
+        timings = record["timings"]
+
+        matched = match_intent(item.request, self.df.columns) if self._matches_intent(item.request) else None
+        if matched is not None:
+            started = time.perf_counter()
+            profile = self._profile(wait=None)
+            answer = answer_from_profile(*matched, profile) if profile is not None else None
+            if answer is not None:
+                if call is not None:
+                    call.future.cancel()
+                timings["answer_s"] = round(time.perf_counter() - started, 4)
+                record.update(source="profile", response_type="explanation", content=answer.as_text(),
+                              figures=self._save_figures(item.id, list(answer.figures)))
+                self.counters["profile_answers"] += 1
+                return record
+
+        if call is None or call.token != self.fingerprint.token:
+            call = self._submit(item.request, pool)
+        started = time.perf_counter()
+        try:
+            raw, llm_s = call.future.result()
+        except Exception as e:
+            record["error"] = f"LLM call failed: {e}"
+            return record
+        timings.update(prompt_s=round(call.prompt_s, 4), llm_s=round(llm_s, 4),
+                       wait_s=round(time.perf_counter() - started, 4))
+        response = parse_llm_response(raw)
+        record.update(source="llm", response_type=response.response_type, content=response.content)
+        if response.response_type != "code":
+            return record
+
+        before = self.fingerprint
+        started = time.perf_counter()
+        try:
+            modified_df, execution_results, figures = run_code(
+                response.content, self.df.copy(deep=False), notify=record["notices"].append,
+                figure_budget=self.figure_budget)
+        except MissingPackageError as e:
+            record["error"] = f"The code needs '{e.module}', which is not installed"
+        except Exception as e:
+            record["error"] = str(e)
+        else:
+            self._set_frame(modified_df)
+            record.update(output=execution_results["output"],
+                          data_changes=describe_changes(diff_fingerprints(before, self.fingerprint)),
+                          figures=self._save_figures(item.id, figures))
+        timings["execute_s"] = round(time.perf_counter() - started, 4)
+        return record
+
+    def _save_figures(self, request_id: str, figures: list) -> list:
+        """Write figures to out_dir/figures and return their paths relative to out_dir"""
+        stem = re.sub(r"[^\w.-]+", "_", request_id)
+        paths = []
+        for number, (kind, fig, _) in enumerate(figures, 1):
+            if kind == "plotly_json":
+                import plotly.io as pio
+                kind, fig = "plotly", pio.from_json(fig)
+            if kind == "plotly":
+                path = os.path.join("figures", f"{stem}_{number}.html")
+                fig.write_html(os.path.join(self.out_dir, path), include_plotlyjs="cdn")
+            elif kind == "matplotlib":
+                path = os.path.join("figures", f"{stem}_{number}.png")
+                fig.savefig(os.path.join(self.out_dir, path), format="png", bbox_inches="tight")
+                plt = sys.modules.get("matplotlib.pyplot")
+                if plt is not None:
+                    plt.close(fig)
+            elif kind == "png":
+                path = os.path.join("figures", f"{stem}_{number}.png")
+                with open(os.path.join(self.out_dir, path), "wb") as f:
+                    f.write(fig)
+            else:
+                continue
+            paths.append(path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="dataset file (CSV, Excel, JSON, Parquet, ...)")
+    parser.add_argument("requests", help="JSONL file of requests")
+    parser.add_argument("--out", default="batch_output", help="output directory (default: batch_output)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")),
+                        help="LLM calls in flight at once (default: BATCH_CONCURRENCY or 4)")
+    parser.add_argument("--no-fast-answers", action="store_true",
+                        help="send every request to the LLM instead of answering common ones from the profile")
+    parser.add_argument("--save-data", action="store_true", help="write the final DataFrame to data.parquet")
+    args = parser.parse_args()
+
+    df, _ = read_dataset(args.data, **load_budget_from_env())
+    runner = BatchRunner(df, args.out, file_path=os.path.basename(args.data), concurrency=args.concurrency,
+                         fast_answers=not args.no_fast_answers)
+    summary = runner.run(read_requests(args.requests))
+    if args.save_data:
+        runner.df.to_parquet(os.path.join(args.out, "data.parquet"))
+    print(json.dumps(summary, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def make_cache_key(model_name: str, inputs: dict) -> str:
+    """Build a content-addressed key from the model name and rendered prompt inputs"""
+    payload = json.dumps(
+        {"model": model_name, "inputs": {k: str(v) for k, v in inputs.items()}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache for raw LLM responses: in-memory LRU plus optional SQLite on disk.
+
+    The memory tier holds at most ``max_entries`` responses. The disk tier is
+    enabled when ``db_path`` is given; entries older than ``ttl_seconds`` are
+    ignored and purged, and the table is trimmed to ``max_disk_entries`` rows
+    (least recently used first).
+    """
+
+    def __init__(self, max_entries: int = 256, db_path: Optional[str] = None,
+                 ttl_seconds: Optional[float] = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Create a cache configured through LLM_CACHE_* environment variables"""
+        ttl = os.getenv("LLM_CACHE_TTL")
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "256")),
+            db_path=os.getenv("LLM_CACHE_PATH") or None,
+            ttl_seconds=float(ttl) if ttl else None,
+            max_disk_entries=int(os.getenv("LLM_CACHE_DISK_SIZE", "10000")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key`` or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        if self.db_path:
+            value = self._disk_get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._memory_put(key, value[0], value[1])
+                return value[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, value, now)
+        if self.db_path:
+            self._disk_set(key, value, now)
+
+    def _memory_put(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if self._expired(row[1]):
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                return row
+        except sqlite3.Error:
+            return None
+
+    def _disk_set(self, key: str, value: str, now: float) -> None:
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                if self.ttl_seconds is not None:
+                    conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+        except sqlite3.Error:
+            # The disk tier is best effort; the memory tier still holds the value
+            pass
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.misses = self.disk_hits = 0
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current memory tier size"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
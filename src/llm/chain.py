@@ -1,12 +1,14 @@
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_google_genai import GoogleGenerativeAI
-from langchain.chat_models import ChatOpenAI
-from langchain.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
-from typing import Union
+from functools import lru_cache
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Iterator, Optional, Union
 from dotenv import load_dotenv
+from llm.cache import ResponseCache, make_cache_key
+from llm.client import LLMClient
+from llm.providers import LangChainProvider, provider_from_env
+from llm.streaming import parse_response_text
+from utils import metrics
 import os
+import threading
 
 
 load_dotenv()
@@ -16,70 +18,221 @@ class AnalysisResponse(BaseModel):
     response_type: str = Field(description="Either 'code' or 'explanation'")
     content: str = Field(description="The actual code or explanation text")
 
+
+def parse_llm_response(raw_response: Any) -> AnalysisResponse:
+    """Parse LLM raw output into AnalysisResponse; fallback to explanation if parsing fails."""
+    if isinstance(raw_response, AnalysisResponse):
+        return raw_response
+    if isinstance(raw_response, dict):
+        return AnalysisResponse(**raw_response)
+
+    # Tolerates code fences, surrounding prose and output truncated mid-string
+    fields = parse_response_text(str(raw_response))
+    if fields is not None:
+        try:
+            return AnalysisResponse(response_type=fields["response_type"], content=fields["content"])
+        except ValidationError:
+            pass
+    # Fallback – treat as plain explanation
+    return AnalysisResponse(response_type="explanation", content=str(raw_response))
+
+
+@lru_cache(maxsize=None)
+def format_instructions() -> str:
+    """JSON format the model is asked to answer in; imports LangChain on first use"""
+    from langchain.output_parsers import PydanticOutputParser
+    return PydanticOutputParser(pydantic_object=AnalysisResponse).get_format_instructions()
+
+_ROLE = "You are a helpful data scientist working strictly with the user's uploaded dataset.\n"
+
+_POLICY = """
+Decision policy:
+- If the request asks a conceptual or descriptive question about the data (e.g., definitions, observations, interpretations) and does not require computation, return an explanation.
+- If the request requires computations, data transformations, statistics, or plots, return Python code.
+- If the request is ambiguous, ask a brief clarifying question in an explanation.
+
+Conversation Context:
+- Always consider the conversation history when interpreting the current request
+- If the user is clarifying a previous request, build upon that context
+- Don't treat each request as completely independent - maintain continuity
+- If a previous request was incomplete, use the current request to complete it
+- Look for pronouns and references (e.g., "it", "that column", "now") that refer to previous context
+- If user says "it's the 'price' column", understand they're answering your previous question
+"""
+
+# Identical for every request, so it comes first: providers that cache
+# prompt prefixes can reuse it and only the dataset context below varies
+PROMPT_INSTRUCTIONS = _ROLE + _POLICY + """
+Examples:
+- "Drop the target column" → Generate code (df = df.drop('target', axis=1))
+- "Which column should I drop?" → Generate explanation asking for column name
+- "It's the 'price' column" → Generate code to drop 'price' column (understanding the context)
+- "Now show me the correlation matrix" → Generate code for correlation (knowing 'price' was dropped)
+
+Code policy when generating code:
+- The DataFrame is already loaded as variable 'df' - DO NOT recreate it with pd.DataFrame() or pd.read_csv().
+- ABSOLUTELY NO FILE OPERATIONS: Never call pd.read_csv(), open(), Path(), to_csv(), savefig(), write_html(), or any filesystem/network I/O.
+- Keep the code concise, safe, and assign final results back to df if you modify the dataset.
+- For plots: create Plotly figures assigned to variables (e.g., fig, figs list) or use matplotlib/seaborn so Streamlit can render them.
+- DO NOT call fig.show(), plt.show(), plotly.offline.plot(), plotly.io.show(), pio.show(), or anything that opens a new tab/window.
+- For correlation/statistics: use df.select_dtypes(include='number') if you need numeric-only operations.
+- Always work with the existing 'df' variable, never create a new one.
+- All data must come from the in-memory 'df' variable.
+- For wide datasets the schema and preview list only the columns most relevant to the request; the other columns still exist in df.
+
+{format_instructions}
+"""
+
+# For datasets queried in place with DuckDB (see utils.lazy)
+PROMPT_SQL_INSTRUCTIONS = _ROLE + """
+The dataset is too large to load into memory. It is the DuckDB table 'data', queried in place; the preview shows its first rows.
+""" + _POLICY + """
+Examples:
+- "Average price per region" → Generate code (print(sql("SELECT region, avg(price) AS avg_price FROM data GROUP BY region ORDER BY region")))
+- "Histogram of price" → Generate code that counts rows per price bin in SQL (floor(price / 10) * 10 AS bin ... GROUP BY bin) and plots the counts with px.bar
+- "Add a revenue column" → Generate code that computes price * quantity in the queries that need it; the table cannot be changed
+
+Code policy when generating code:
+- There is no 'df' variable. Call sql(query) to run a DuckDB SQL query on the table 'data'; it returns the result as a pandas DataFrame.
+- Aggregate, filter and sample in SQL (GROUP BY, WHERE, LIMIT, approx_quantile, USING SAMPLE) so that results stay small; never select all rows.
+- For plots: aggregate or bin in SQL first (floor() for histograms, date_trunc() for time series), then plot the result with Plotly figures assigned to variables (e.g., fig, figs list) or with matplotlib/seaborn.
+- The table is read-only: compute derived columns inside the queries that use them.
+- ABSOLUTELY NO FILE OPERATIONS: Never read or write files in Python or SQL (no pd.read_csv(), open(), read_csv(), COPY, ATTACH) or do any network I/O.
+- DO NOT call fig.show(), plt.show(), plotly.offline.plot(), plotly.io.show(), pio.show(), or anything that opens a new tab/window.
+- Print the results you want to show.
+- For wide datasets the schema and preview list only the columns most relevant to the request; the other columns still exist in the table.
+
+{format_instructions}
+"""
+
+PROMPT_CONTEXT = """
+File name: {file_path}
+Data preview:\n\n{data_preview}\n\n
+Schema summary:\n{data_schema}\n\n
+Conversation history:\n{conversation_history}\n\n
+User request: {user_request}
+"""
+
+
 class LLMChainManager:
     _instance = None
-    _chain = None
-
-    def __init__(self):
-        if not os.getenv("GOOGLE_API_KEY"):
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-            
-        llm = GoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-
-
-        parser = PydanticOutputParser(pydantic_object=AnalysisResponse)
-
-        prompt = PromptTemplate(
-            template="""You are a helpful data scientist working strictly with the user's uploaded dataset.
-            File name: {file_path}
-            Data preview:\n\n{data_preview}\n\n
-            Schema summary:\n{data_schema}\n\n
-            Conversation history:\n{conversation_history}\n\n
-            User request: {user_request}\n\n
-            Decision policy:
-            - If the request asks a conceptual or descriptive question about the data (e.g., definitions, observations, interpretations) and does not require computation, return an explanation.
-            - If the request requires computations, data transformations, statistics, or plots, return Python code.
-            - If the request is ambiguous, ask a brief clarifying question in an explanation.
-            
-            Conversation Context:
-            - Always consider the conversation history when interpreting the current request
-            - If the user is clarifying a previous request, build upon that context
-            - Don't treat each request as completely independent - maintain continuity
-            - If a previous request was incomplete, use the current request to complete it
-            - Look for pronouns and references (e.g., "it", "that column", "now") that refer to previous context
-            - If user says "it's the 'price' column", understand they're answering your previous question
-            
-            Examples:
-            - "Drop the target column" → Generate code (df = df.drop('target', axis=1))
-            - "Which column should I drop?" → Generate explanation asking for column name
-            - "It's the 'price' column" → Generate code to drop 'price' column (understanding the context)
-            - "Now show me the correlation matrix" → Generate code for correlation (knowing 'price' was dropped)
-
-            Code policy when generating code:
-            - The DataFrame is already loaded as variable 'df' - DO NOT recreate it with pd.DataFrame() or pd.read_csv().
-            - ABSOLUTELY NO FILE OPERATIONS: Never call pd.read_csv(), open(), Path(), to_csv(), savefig(), write_html(), or any filesystem/network I/O.
-            - Keep the code concise, safe, and assign final results back to df if you modify the dataset.
-            - For plots: create Plotly figures assigned to variables (e.g., fig, figs list) or use matplotlib/seaborn so Streamlit can render them.
-            - DO NOT call fig.show(), plt.show(), plotly.offline.plot(), plotly.io.show(), pio.show(), or anything that opens a new tab/window.
-            - For correlation/statistics: use df.select_dtypes(include='number') if you need numeric-only operations.
-            - Always work with the existing 'df' variable, never create a new one.
-            - All data must come from the in-memory 'df' variable.
-
-            {format_instructions}
-            """,
-            input_variables=["data_preview", "user_request", "file_path", "data_schema", "conversation_history"],
-            partial_variables={"format_instructions": parser.get_format_instructions()}
-        )
-
-        self._chain = LLMChain(llm=llm, prompt=prompt)
+    _cache = None
+    # The warm-up thread may build the shared instance while a request asks for it
+    _lock = threading.Lock()
+
+    def __init__(self, llm=None, model_name: Optional[str] = None, fallback_llm=None):
+        """Providers come from LLM_PROVIDER (default gemini) and LLM_FALLBACK_PROVIDER unless LangChain models are given"""
+        if llm is None:
+            primary = provider_from_env(os.getenv("LLM_PROVIDER", "gemini"), model_name)
+            fallback = os.getenv("LLM_FALLBACK_PROVIDER")
+            secondary = provider_from_env(fallback) if fallback else None
+        else:
+            primary = LangChainProvider(llm, model_name)
+            secondary = None
+        if fallback_llm is not None:
+            secondary = LangChainProvider(fallback_llm)
+        self.model_name = primary.model_name
+        self._client = LLMClient.from_env(primary, secondary)
+
+        # LangChain takes about a second to import, so it is loaded with the
+        # first manager (see utils.warmup) rather than with this module
+        from langchain.prompts import PromptTemplate
+
+        # One template per engine: pandas code on an in-memory df, or SQL on a LazySource
+        self._prompts = {
+            engine: PromptTemplate(
+                template=instructions + PROMPT_CONTEXT,
+                input_variables=["data_preview", "user_request", "file_path", "data_schema", "conversation_history"],
+                partial_variables={"format_instructions": format_instructions()}
+            )
+            for engine, instructions in (("pandas", PROMPT_INSTRUCTIONS), ("duckdb", PROMPT_SQL_INSTRUCTIONS))
+        }
+
+    @classmethod
+    def configure(cls, llm=None, model_name: Optional[str] = None, fallback_llm=None) -> None:
+        """Replace the shared instance, e.g. with a fake LLM for offline use"""
+        with cls._lock:
+            if cls._instance is not None:
+                cls._instance._client.close()
+            cls._instance = cls(llm=llm, model_name=model_name, fallback_llm=fallback_llm)
+
+    @classmethod
+    def get_instance(cls) -> "LLMChainManager":
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def static_prefix(engine: str = "pandas") -> str:
+        """Instruction part of the prompt, the same for every request to an engine"""
+        instructions = PROMPT_SQL_INSTRUCTIONS if engine == "duckdb" else PROMPT_INSTRUCTIONS
+        return instructions.format(format_instructions=format_instructions())
+
+    def _format(self, inputs: dict) -> str:
+        """Prompt text for inputs; an "engine" input selects the template"""
+        variables = dict(inputs)
+        engine = variables.pop("engine", "pandas")
+        return self._prompts[engine].format(**variables)
+
     @classmethod
-    def get_chain(cls):
-        if cls._instance is None:
-            cls._instance = cls()
-        return cls._instance._chain
+    def get_client(cls) -> LLMClient:
+        return cls.get_instance()._client
+
+    @classmethod
+    def get_cache(cls) -> ResponseCache:
+        with cls._lock:
+            if cls._cache is None:
+                cls._cache = ResponseCache.from_env()
+            return cls._cache
+
+    @classmethod
+    def run(cls, inputs: dict) -> str:
+        """Run the prompt, serving repeated prompts from the response cache"""
+        instance = cls.get_instance()
+        cache = cls.get_cache()
+        key = make_cache_key(instance.model_name, inputs)
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.count("llm_cache_hits")
+            return cached
+        metrics.count("llm_cache_misses")
+        answered = []
+        raw = instance._client.complete(instance._format(inputs), answered.append)
+        if instance._answered_by_primary(answered):
+            cache.set(key, raw)
+        return raw
+
+    @classmethod
+    def stream(cls, inputs: dict) -> Iterator[str]:
+        """Yield the LLM output in chunks as it is generated.
+
+        Cached responses are yielded as a single chunk. The full text is
+        stored in the cache only if the stream runs to completion and the
+        primary model produced it.
+        """
+        instance = cls.get_instance()
+        cache = cls.get_cache()
+        key = make_cache_key(instance.model_name, inputs)
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.count("llm_cache_hits")
+            yield cached
+            return
+        metrics.count("llm_cache_misses")
+
+        prompt_text = instance._format(inputs)
+        parts = []
+        answered = []
+        for text in instance._client.stream(prompt_text, answered.append):
+            parts.append(text)
+            yield text
+        if instance._answered_by_primary(answered):
+            cache.set(key, "".join(parts))
+
+    def _answered_by_primary(self, answered: list) -> bool:
+        """Cache keys name the primary model; answers of the fallback or a hedge are not cached"""
+        return len(answered) == 1 and answered[0] is self._client.primary
 
     @staticmethod
     def format_conversation_history(chat_history, max_exchanges=3):
@@ -0,0 +1,365 @@
+import asyncio
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from llm.providers import ProviderError
+
+
+class TokenBucket:
+    """Rate limiter allowing ``rate`` calls per second in bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LatencyTracker:
+    """Recent time-to-first-chunk samples of one provider"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        """95th percentile, or None until ``min_samples`` calls have been seen"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class _Broadcast:
+    """Chunks of one in-flight call, replayed to every caller that asked for the same prompt"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.abandoned = False
+        self.subscribers = 0
+        self.task = None
+        self.provider = None    # the provider whose output is streamed
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def iterate(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                if position < len(self.chunks):
+                    position += 1
+                    yield self.chunks[position - 1]
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                # Every caller went away: stop the provider call
+                self.abandoned = True
+                self.task.cancel()
+
+
+async def _first_chunk(stream: AsyncIterator[str]) -> tuple[bool, Optional[str]]:
+    try:
+        return True, await stream.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+class LLMClient:
+    """Calls LLM providers from one background event loop shared by all sessions.
+
+    - One pooled httpx.AsyncClient keeps connections to the providers open.
+    - A token bucket per provider limits the request rate of the process.
+    - Retryable failures (429, 5xx, timeouts) are retried with full-jitter
+      exponential backoff, honouring Retry-After, until the first chunk
+      has arrived. When the primary still fails, the secondary is used.
+    - With a secondary provider and ``hedge`` enabled, a call whose first
+      chunk takes longer than the primary's p95 also starts on the
+      secondary; the first to produce a chunk is streamed and the other
+      is cancelled.
+    - Calls for a prompt that is already in flight share its output.
+    """
+
+    def __init__(self, primary, secondary=None, rate_per_minute: float = 60, burst: int = 10,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 20.0,
+                 timeout: float = 60.0, max_connections: int = 20, hedge: bool = True,
+                 hedge_min_samples: int = 20):
+        self.primary = primary
+        self.secondary = secondary
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.hedge = hedge
+        self._buckets = {}
+        self._latency = {}
+        for provider in (primary, secondary):
+            if provider is not None:
+                self._buckets[provider.name] = TokenBucket(rate_per_minute / 60, burst)
+                self._latency[provider.name] = LatencyTracker(min_samples=hedge_min_samples)
+        self._inflight = {}
+        self._loop = None
+        self._http = None
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "coalesced": 0, "retries": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0}
+
+    @classmethod
+    def from_env(cls, primary, secondary=None) -> "LLMClient":
+        """Client configured through LLM_* environment variables"""
+        return cls(
+            primary,
+            secondary,
+            rate_per_minute=float(os.getenv("LLM_RATE_LIMIT", "60")),
+            burst=int(os.getenv("LLM_RATE_BURST", "10")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            hedge=os.getenv("LLM_HEDGE", "1").lower() not in ("0", "false", "no", "off"),
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                # httpx connections belong to the loop that opened them
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _open(self) -> None:
+        import httpx
+
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+
+    def stream(self, prompt: str, answered_by: Optional[Callable] = None) -> Iterator[str]:
+        """Yield the response to prompt in chunks; usable from any thread.
+
+        Once the response is complete, ``answered_by`` is called with the
+        provider that produced it (the secondary after a
+        fallback or a won hedge).
+        """
+        loop = self._ensure_loop()
+        chunks = queue.Queue()
+        provider = []
+
+        async def pump():
+            broadcast = self._subscribe(prompt)
+            try:
+                async for chunk in broadcast.iterate():
+                    chunks.put((chunk, None))
+            except Exception as e:
+                chunks.put((None, e))
+            else:
+                provider.append(broadcast.provider)
+                chunks.put((None, None))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                chunk, error = chunks.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    if answered_by is not None and provider[0] is not None:
+                        answered_by(provider[0])
+                    return
+                yield chunk
+        finally:
+            future.cancel()
+
+    def complete(self, prompt: str, answered_by: Optional[Callable] = None) -> str:
+        """Full response to prompt; blocks the calling thread"""
+        return "".join(self.stream(prompt, answered_by))
+
+    async def acomplete(self, prompt: str) -> str:
+        """Full response to prompt, awaitable from any event loop"""
+        loop = self._ensure_loop()
+
+        async def collect():
+            return "".join([chunk async for chunk in self._subscribe(prompt).iterate()])
+
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(collect(), loop))
+
+    def stats(self) -> dict:
+        """Call counters and the current p95 time to first chunk of each provider"""
+        return dict(self.counters, p95={name: tracker.p95() for name, tracker in self._latency.items()})
+
+    def close(self) -> None:
+        """Cancel calls still running, close pooled connections and stop the background loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def _shutdown(self) -> None:
+        # In-flight calls, hedges and the pumps of coalesced callers; stopping
+        # the loop with them pending logs "Task was destroyed but it is pending!"
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.get_running_loop().shutdown_asyncgens()
+        await self._http.aclose()
+
+    def _subscribe(self, prompt: str) -> _Broadcast:
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        broadcast = self._inflight.get(key)
+        if broadcast is None or broadcast.abandoned:
+            broadcast = _Broadcast()
+            self._inflight[key] = broadcast
+            broadcast.task = asyncio.get_running_loop().create_task(self._produce(key, broadcast, prompt))
+            self.counters["calls"] += 1
+        else:
+            self.counters["coalesced"] += 1
+        return broadcast
+
+    async def _produce(self, key: str, broadcast: _Broadcast, prompt: str) -> None:
+        try:
+            async for chunk in self._hedged_stream(prompt, broadcast):
+                broadcast.push(chunk)
+        except Exception as e:
+            broadcast.finish(e)
+        else:
+            broadcast.finish()
+        finally:
+            if self._inflight.get(key) is broadcast:
+                del self._inflight[key]
+
+    async def _attempts(self, provider, prompt: str) -> AsyncIterator[str]:
+        """provider.stream with rate limiting and jittered retries until the first chunk arrives.
+
+        A call that fails or is cancelled (e.g. it lost a hedge) before its
+        first chunk records how long it ran as a lower bound, so slow calls
+        still count towards the p95.
+        """
+        call_started = time.monotonic()
+        first = True
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._buckets[provider.name].acquire()
+                started = time.monotonic()
+                try:
+                    async for chunk in provider.stream(self._http, prompt):
+                        if first:
+                            self._latency[provider.name].record(time.monotonic() - started)
+                            first = False
+                        yield chunk
+                    return
+                except ProviderError as e:
+                    if not first or not e.retryable or attempt == self.max_retries:
+                        raise
+                    self.counters["retries"] += 1
+                    delay = e.retry_after
+                    if delay is None:
+                        delay = random.uniform(0, self.backoff * 2 ** attempt)
+                    await asyncio.sleep(min(delay, self.max_backoff))
+        finally:
+            if first:
+                self._latency[provider.name].record(time.monotonic() - call_started)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.secondary is None or not self.hedge:
+            return None
+        return self._latency[self.primary.name].p95()
+
+    async def _hedged_stream(self, prompt: str, broadcast: Optional[_Broadcast] = None) -> AsyncIterator[str]:
+        primary = self._attempts(self.primary, prompt)
+        pending = {asyncio.ensure_future(_first_chunk(primary)): primary}
+        started_secondary = self.secondary is None
+        hedged = False
+        delay = self._hedge_delay()
+        error = None
+        winner = None
+        try:
+            while pending and winner is None:
+                timeout = delay if not started_secondary else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than the primary's p95: race the secondary
+                    self.counters["hedges"] += 1
+                    started_secondary = hedged = True
+                    secondary = self._attempts(self.secondary, prompt)
+                    pending[asyncio.ensure_future(_first_chunk(secondary))] = secondary
+                    continue
+                for task in done:
+                    stream = pending.pop(task)
+                    if task.exception() is None:
+                        winner = stream, task.result()
+                        break
+                    if not isinstance(task.exception(), ProviderError):
+                        raise task.exception()
+                    error = error or task.exception()
+                    if not started_secondary:
+                        self.counters["fallbacks"] += 1
+                        started_secondary = True
+                        secondary = self._attempts(self.secondary, prompt)
+                        pending[asyncio.ensure_future(_first_chunk(secondary))] = secondary
+            if winner is None:
+                raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for stream in pending.values():
+                await stream.aclose()
+
+        stream, (has_chunk, chunk) = winner
+        if hedged and stream is not primary:
+            self.counters["hedge_wins"] += 1
+        if broadcast is not None:
+            broadcast.provider = self.primary if stream is primary else self.secondary
+        try:
+            if has_chunk:
+                yield chunk
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            await stream.aclose()
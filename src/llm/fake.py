@@ -0,0 +1,49 @@
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+class FakeStreamingLLM(LLM):
+    """Offline LLM that replays recorded responses, optionally token by token.
+
+    Responses are returned in order and cycle once exhausted. ``chunk_size``
+    controls how many characters each streamed chunk carries and
+    ``chunk_delay`` simulates time between tokens.
+    """
+
+    responses: List[str]
+    chunk_size: int = 8
+    chunk_delay: float = 0.0
+    first_token_delay: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _next_response(self) -> str:
+        response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return response
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        if self.first_token_delay:
+            time.sleep(self.first_token_delay)
+        return self._next_response()
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        response = self._next_response()
+        if self.first_token_delay:
+            time.sleep(self.first_token_delay)
+        for i in range(0, len(response), self.chunk_size):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            chunk = GenerationChunk(text=response[i:i + self.chunk_size])
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,311 @@
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+from llm.chain import LLMChainManager
+from utils.data_utils import SCHEMA_HEADER, df_head_to_text, df_schema_lines
+from utils.fingerprint import FrameFingerprint
+from utils.profiling import DataProfile
+
+
+# Roughly one token per short word, per 3 digits and per symbol. Errs high
+# for English text compared with the Gemini and OpenAI tokenizers.
+_TOKEN_RE = re.compile(r"[^\W\d_]{1,6}|\d{1,3}|\S")
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens in text without a model-specific tokenizer"""
+    return len(_TOKEN_RE.findall(text))
+
+
+class PromptBudget(NamedTuple):
+    """Token limits for the dataset context sent with each request"""
+    max_tokens: int = 8000       # whole prompt, instructions and request included
+    history_share: float = 0.25  # of the tokens left for schema, preview and history
+    preview_share: float = 0.3   # of the tokens left after history
+    preview_rows: int = 3
+    max_exchanges: int = 10
+
+    @classmethod
+    def from_env(cls) -> "PromptBudget":
+        """Defaults configured by PROMPT_MAX_TOKENS and PROMPT_MAX_EXCHANGES"""
+        return cls(
+            max_tokens=int(os.getenv("PROMPT_MAX_TOKENS", "8000")),
+            max_exchanges=int(os.getenv("PROMPT_MAX_EXCHANGES", "10")),
+        )
+
+
+def _terms(text: str) -> list:
+    """Lowercase word and number terms; camelCase and snake_case are split, plural 's' dropped"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    terms = []
+    for term in re.findall(r"[a-z]+|\d+", text.lower()):
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+# Words in a request that hint at the kind of column it is about
+_DTYPE_HINTS = {
+    "numeric": {"average", "mean", "median", "sum", "total", "max", "min", "correlation", "distribution",
+                "histogram", "std", "variance", "outlier", "scatter", "regression"},
+    "datetime": {"date", "time", "day", "month", "year", "week", "trend", "over", "when", "season"},
+    "category": {"category", "group", "by", "each", "per", "count", "unique", "distinct", "bar", "pie"},
+}
+
+
+def _kind(series: pd.Series) -> str:
+    if is_datetime64_any_dtype(series.dtype):
+        return "datetime"
+    if is_numeric_dtype(series.dtype) and not is_bool_dtype(series.dtype):
+        return "numeric"
+    return "category"
+
+
+class ColumnIndex:
+    """Inverted index over column names and sample values for ranking columns by relevance.
+
+    Name terms weigh more than terms of sample values (categories and the
+    first distinct values of text columns), and both are weighted by
+    inverse column frequency so terms shared by most columns (``feature``
+    in ``feature_0001``...) barely count.
+    """
+
+    NAME_WEIGHT = 3.0
+    VALUE_WEIGHT = 1.0
+    PHRASE_BONUS = 10.0
+    HINT_BONUS = 0.5
+
+    def __init__(self, df: pd.DataFrame, sample_rows: int = 200, sample_values: int = 20):
+        self.size = len(df.columns)
+        self.names = [" ".join(_terms(col)) for col in df.columns]
+        self.kinds = []
+        self._name_postings = {}
+        self._value_postings = {}
+        head = df.head(sample_rows)
+        for position, col in enumerate(df.columns):
+            series = head.iloc[:, position]
+            self.kinds.append(_kind(series))
+            for term in set(_terms(col)):
+                self._name_postings.setdefault(term, []).append(position)
+            if self.kinds[-1] != "category":
+                continue
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values = series.cat.categories[:sample_values]
+            else:
+                values = series.dropna().astype(str).unique()[:sample_values]
+            value_terms = set()
+            for value in values:
+                value_terms.update(_terms(value))
+            for term in value_terms:
+                self._value_postings.setdefault(term, []).append(position)
+
+    def _idf(self, postings: list) -> float:
+        return math.log(1 + self.size / len(postings))
+
+    def scores(self, query: str, context: str = "") -> list:
+        """Relevance of each column to query; terms that only appear in context count half"""
+        scores = [0.0] * self.size
+        query_terms = set(_terms(query))
+        weighted = [(term, 1.0) for term in query_terms]
+        weighted += [(term, 0.5) for term in set(_terms(context)) - query_terms]
+        for term, weight in weighted:
+            postings = self._name_postings.get(term)
+            if postings:
+                score = weight * self.NAME_WEIGHT * self._idf(postings)
+                for position in postings:
+                    scores[position] += score
+            postings = self._value_postings.get(term)
+            if postings:
+                score = weight * self.VALUE_WEIGHT * self._idf(postings)
+                for position in postings:
+                    scores[position] += score
+
+        padded_query = f" {' '.join(_terms(query))} "
+        hinted = {kind for kind, words in _DTYPE_HINTS.items() if query_terms & words}
+        for position, name in enumerate(self.names):
+            if name and f" {name} " in padded_query:
+                scores[position] += self.PHRASE_BONUS
+            if self.kinds[position] in hinted:
+                scores[position] += self.HINT_BONUS
+        return scores
+
+    def rank(self, query: str, context: str = "") -> list:
+        """Column positions, most relevant first; ties keep the column order"""
+        scores = self.scores(query, context)
+        return sorted(range(self.size), key=lambda position: -scores[position])
+
+
+# ColumnIndex per FrameFingerprint.token; only the columns' content matters
+_indexes = OrderedDict()
+MAX_CACHED_INDEXES = 8
+
+
+def column_index(df: pd.DataFrame, fingerprint: Optional[FrameFingerprint] = None) -> ColumnIndex:
+    """ColumnIndex of df, reused while the frame's content is unchanged"""
+    if fingerprint is None:
+        return ColumnIndex(df)
+    index = _indexes.get(fingerprint.token)
+    if index is None:
+        index = ColumnIndex(df)
+        _indexes[fingerprint.token] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(fingerprint.token)
+    return index
+
+
+def fit_schema(df: pd.DataFrame, order: list, max_tokens: int,
+               fingerprint: Optional[FrameFingerprint] = None,
+               profile: Optional[DataProfile] = None,
+               lines: Optional[list] = None) -> tuple[str, int]:
+    """Schema text within max_tokens and the number of columns it describes.
+
+    Columns are taken in ``order``; those that do not fit are listed by
+    name while there is room, then counted. Described columns keep the
+    frame's column order. ``lines`` replaces the df_schema_lines of df,
+    e.g. with the LazySource.schema_lines of the file df was sampled from.
+    """
+    if lines is None:
+        lines = df_schema_lines(df, fingerprint, profile)
+    costs = [count_tokens(line) + 1 for line in lines]
+    used = count_tokens(SCHEMA_HEADER)
+    if used + sum(costs) <= max_tokens:
+        return "\n".join([SCHEMA_HEADER] + lines), len(lines)
+
+    used += 20  # room for the lines about omitted columns
+    described = []
+    for position in order:
+        if used + costs[position] > max_tokens:
+            break
+        used += costs[position]
+        described.append(position)
+    chosen = set(described)
+    rest = [position for position in order if position not in chosen]
+
+    named = []
+    for position in rest:
+        cost = count_tokens(str(df.columns[position])) + 1
+        if used + cost > max_tokens:
+            break
+        used += cost
+        named.append(str(df.columns[position]))
+
+    text = [SCHEMA_HEADER] + [lines[position] for position in sorted(described)]
+    if named:
+        text.append("Other columns (name only): " + ", ".join(named))
+    if len(rest) > len(named):
+        text.append(f"... {len(rest) - len(named)} more columns not listed")
+    return "\n".join(text), len(described)
+
+
+def fit_preview(df: pd.DataFrame, order: list, max_tokens: int, rows: int = 3) -> tuple[str, int]:
+    """First rows of the most relevant columns within max_tokens, and how many columns are shown"""
+    head = df.head(rows)
+    # Estimate each column from its values; rendering thousands of columns
+    # with to_string only to find they do not fit takes most of a second
+    used = count_tokens(" ".join(map(str, head.index))) + 10
+    cells = head.astype(str).to_numpy()
+    costs = [count_tokens(f"{col} {' '.join(cells[:, position])}") + rows
+             for position, col in enumerate(df.columns)]
+    if used + sum(costs) <= max_tokens:
+        text = df_head_to_text(df, rows)
+        if count_tokens(text) <= max_tokens:
+            return text, len(df.columns)
+
+    shown = []
+    for position in order:
+        if used + costs[position] > max_tokens:
+            break
+        used += costs[position]
+        shown.append(position)
+    while shown:
+        text = df_head_to_text(head.iloc[:, sorted(shown)], rows)
+        text += f"\n({len(shown)} of {len(df.columns)} columns shown)"
+        if count_tokens(text) <= max_tokens:
+            return text, len(shown)
+        shown = shown[:len(shown) * 3 // 4]
+    return f"(preview omitted: {len(df.columns)} columns)", 0
+
+
+def fit_history(chat_history: list, max_tokens: int, max_exchanges: int) -> tuple[str, int]:
+    """The most recent exchanges that fit in max_tokens, formatted for the prompt"""
+    for exchanges in range(min(max_exchanges, len(chat_history)), 0, -1):
+        text = LLMChainManager.format_conversation_history(chat_history, max_exchanges=exchanges)
+        if count_tokens(text) <= max_tokens:
+            return text, exchanges
+    return LLMChainManager.format_conversation_history([]), 0
+
+
+def fit_prompt_inputs(df: pd.DataFrame, user_request: str, chat_history: list,
+                      file_path: Optional[str] = None,
+                      fingerprint: Optional[FrameFingerprint] = None,
+                      budget: Optional[PromptBudget] = None,
+                      profile: Optional[DataProfile] = None,
+                      source=None) -> tuple[dict, dict]:
+    """Prompt variables for user_request with schema, preview and history fitted to the budget.
+
+    When everything fits, schema and preview are the full df_schema_to_text
+    and df_head_to_text output. Otherwise columns are ranked by relevance
+    to the request (and, at half weight, to recent questions) and the most
+    relevant ones are described first. A DataProfile of df adds value
+    ranges and frequent values to the schema lines.
+
+    With an analyzed LazySource, df is its sample: the schema describes the
+    whole file and the inputs select the SQL prompt.
+
+    Returns (inputs, report) where report has the estimated token count of
+    each part, how many columns and exchanges were included and the time
+    spent building the inputs.
+    """
+    started = time.perf_counter()
+    budget = budget or PromptBudget.from_env()
+    engine = "pandas" if source is None else "duckdb"
+    instructions = count_tokens(LLMChainManager.static_prefix(engine))
+    table = f"Table data: {source.rows:,} rows\n" if source is not None else ""
+    fixed = instructions + count_tokens(user_request) + count_tokens(str(file_path)) + count_tokens(table) + 30
+    available = max(budget.max_tokens - fixed, 0)
+
+    history, exchanges = fit_history(chat_history, int(available * budget.history_share), budget.max_exchanges)
+    available -= count_tokens(history)
+
+    recent_questions = " ".join(str(query) for query, _ in chat_history[-exchanges:]) if exchanges else ""
+    order = column_index(df, fingerprint).rank(user_request, recent_questions)
+    preview_budget = int(available * budget.preview_share)
+    schema, schema_columns = fit_schema(df, order, available - preview_budget, fingerprint, profile,
+                                        lines=source.schema_lines() if source is not None else None)
+    schema = table + schema
+    # The preview gets whatever the schema did not use
+    preview, preview_columns = fit_preview(df, order, available - count_tokens(schema), budget.preview_rows)
+
+    inputs = {
+        "data_preview": preview,
+        "user_request": user_request,
+        "file_path": file_path,
+        "data_schema": schema,
+        "conversation_history": history,
+    }
+    if source is not None:
+        inputs["engine"] = engine
+    report = {
+        "instructions_tokens": instructions,
+        "schema_tokens": count_tokens(schema),
+        "preview_tokens": count_tokens(preview),
+        "history_tokens": count_tokens(history),
+        "columns": len(df.columns),
+        "schema_columns": schema_columns,
+        "preview_columns": preview_columns,
+        "exchanges": exchanges,
+        "build_seconds": time.perf_counter() - started,
+    }
+    report["total_tokens"] = (instructions + report["schema_tokens"] + report["preview_tokens"]
+                              + report["history_tokens"] + count_tokens(user_request))
+    return inputs, report
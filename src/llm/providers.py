@@ -0,0 +1,145 @@
+import json
+import os
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+if TYPE_CHECKING:  # imported by LLMClient when it opens its connection pool
+    import httpx
+
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """A provider call failed; ``retryable`` errors (429, 5xx, timeouts) may be retried"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def _retry_after(response: "httpx.Response") -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+class HTTPProvider:
+    """Streams completions from a provider's server-sent-events endpoint.
+
+    Subclasses build the request and extract the text of each event; the
+    pooled httpx.AsyncClient is passed in by LLMClient.
+    """
+
+    name = "http"
+    default_base_url = ""
+    default_model = ""
+
+    def __init__(self, api_key: str, model_name: Optional[str] = None, base_url: Optional[str] = None):
+        self.api_key = api_key
+        self.model_name = model_name or self.default_model
+        self.base_url = (base_url or self.default_base_url).rstrip("/")
+
+    def request(self, prompt: str) -> tuple[str, dict, dict]:
+        """(url, headers, JSON body) of a streaming request for prompt"""
+        raise NotImplementedError
+
+    def parse(self, event: dict) -> str:
+        """Text carried by one decoded event"""
+        raise NotImplementedError
+
+    async def stream(self, http: "httpx.AsyncClient", prompt: str) -> AsyncIterator[str]:
+        import httpx
+
+        url, headers, body = self.request(prompt)
+        try:
+            async with http.stream("POST", url, headers=headers, json=body) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise ProviderError(
+                        f"{self.name} returned {response.status_code}: {response.text[:200]}",
+                        status=response.status_code,
+                        retryable=response.status_code in RETRYABLE_STATUS,
+                        retry_after=_retry_after(response),
+                    )
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        return
+                    text = self.parse(json.loads(data))
+                    if text:
+                        yield text
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            raise ProviderError(f"{self.name}: {type(e).__name__} {e}", retryable=True) from e
+
+
+class GeminiProvider(HTTPProvider):
+    name = "gemini"
+    default_base_url = "https://generativelanguage.googleapis.com"
+    default_model = "gemini-2.5-flash"
+
+    def request(self, prompt: str) -> tuple[str, dict, dict]:
+        url = f"{self.base_url}/v1beta/models/{self.model_name}:streamGenerateContent?alt=sse"
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        return url, {"x-goog-api-key": self.api_key}, body
+
+    def parse(self, event: dict) -> str:
+        candidates = event.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+
+class OpenAIProvider(HTTPProvider):
+    name = "openai"
+    default_base_url = "https://api.openai.com/v1"
+    default_model = "gpt-4o-mini"
+
+    def request(self, prompt: str) -> tuple[str, dict, dict]:
+        body = {"model": self.model_name, "stream": True,
+                "messages": [{"role": "user", "content": prompt}]}
+        return f"{self.base_url}/chat/completions", {"Authorization": f"Bearer {self.api_key}"}, body
+
+    def parse(self, event: dict) -> str:
+        choices = event.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or ""
+
+
+class LangChainProvider:
+    """Any LangChain LLM or chat model, e.g. FakeStreamingLLM for offline use"""
+
+    def __init__(self, llm, model_name: Optional[str] = None):
+        self.llm = llm
+        self.model_name = model_name or getattr(llm, "_llm_type", type(llm).__name__)
+        self.name = self.model_name
+
+    async def stream(self, http: "httpx.AsyncClient", prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(prompt):
+            # Chat models yield message chunks, plain LLMs yield strings
+            text = getattr(chunk, "content", chunk)
+            if text:
+                yield text
+
+
+PROVIDERS = {"gemini": (GeminiProvider, "GOOGLE_API_KEY"), "openai": (OpenAIProvider, "OPENAI_API_KEY")}
+
+
+def provider_from_env(name: str, model_name: Optional[str] = None) -> HTTPProvider:
+    """Provider configured by <KEY>_API_KEY, <NAME>_MODEL and <NAME>_BASE_URL"""
+    try:
+        cls, key_variable = PROVIDERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider {name!r}; expected one of {sorted(PROVIDERS)}")
+    api_key = os.getenv(key_variable)
+    if not api_key:
+        raise ValueError(f"{key_variable} not found in environment variables")
+    prefix = name.upper()
+    return cls(
+        api_key,
+        model_name=model_name or os.getenv(f"{prefix}_MODEL") or None,
+        base_url=os.getenv(f"{prefix}_BASE_URL") or None,
+    )
@@ -0,0 +1,108 @@
+import json
+import re
+from typing import Optional, Tuple
+
+
+_TYPE_RE = re.compile(r'"response_type"\s*:\s*"(code|explanation)"')
+_CONTENT_RE = re.compile(r'"content"\s*:\s*"')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """Return the first balanced {...} object in text, skipping braces inside strings"""
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _decode_partial_string(text: str, start: int) -> Tuple[str, bool]:
+    """Decode a JSON string body beginning at ``start``; returns (value, is_complete)"""
+    out = []
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if ch == '"':
+            return "".join(out), True
+        if ch != "\\":
+            out.append(ch)
+            i += 1
+            continue
+        # Escape sequence; stop at a truncated one and wait for more tokens
+        if i + 1 >= len(text):
+            break
+        esc = text[i + 1]
+        if esc == "u":
+            hex_digits = text[i + 2:i + 6]
+            if len(hex_digits) < 4:
+                break
+            try:
+                out.append(chr(int(hex_digits, 16)))
+            except ValueError:
+                out.append(hex_digits)
+            i += 6
+        else:
+            out.append(_ESCAPES.get(esc, esc))
+            i += 2
+    return "".join(out), False
+
+
+def extract_partial_response(text: str) -> Tuple[Optional[str], str, bool]:
+    """Read response_type and content from possibly incomplete LLM JSON output.
+
+    Returns (response_type or None, content decoded so far, content_complete).
+    """
+    type_match = _TYPE_RE.search(text)
+    response_type = type_match.group(1) if type_match else None
+    content_match = _CONTENT_RE.search(text)
+    if not content_match:
+        return response_type, "", False
+    content, complete = _decode_partial_string(text, content_match.end())
+    return response_type, content, complete
+
+
+def parse_response_text(text: str) -> Optional[dict]:
+    """Best-effort parse of a complete or truncated LLM reply into response fields.
+
+    Code fences and surrounding prose are skipped by locating the JSON object
+    directly, so fences inside the ``content`` string are left intact. Code
+    whose ``content`` string is cut off is returned as an explanation
+    showing it, so it is not executed.
+    """
+    candidate = extract_json_object(text)
+    if candidate is not None:
+        try:
+            data = json.loads(candidate, strict=False)
+            if isinstance(data, dict) and "response_type" in data and "content" in data:
+                return data
+        except ValueError:
+            pass
+    response_type, content, complete = extract_partial_response(text)
+    if not (response_type and content):
+        return None
+    if response_type == "code" and not complete:
+        # Code cut off mid-string may stop anywhere; it is shown, never run
+        return {"response_type": "explanation",
+                "content": f"The response was cut off before the code was complete, so it was not run:\n\n"
+                           f"```python\n{content}\n```"}
+    return {"response_type": response_type, "content": content}
@@ -1,80 +1,360 @@
 import streamlit as st
 import pandas as pd
 import os
-from llm.chain import LLMChainManager, AnalysisResponse
-from utils.data_utils import load_data, df_head_to_text, execute_code_safely
-from typing import Any
-from pydantic import ValidationError
+import time
+from llm.chain import LLMChainManager, AnalysisResponse, parse_llm_response
+from llm.streaming import extract_partial_response
+from llm.prompt import fit_prompt_inputs, PromptBudget
+from utils.data_utils import execute_code_safely, render_fast_answer, render_performance_panel, render_replay_report
+from utils.ingest import read_dataset, load_budget_from_env, file_size
+from utils.lazy import LazySource, out_of_core_format, spool_upload
+from utils.dtypes import optimize_dtypes, optimize_enabled, format_bytes
+from utils.rendering import render_dataframe
+from utils.figures import FigureBudget
+from utils.fingerprint import FrameFingerprint, frame_fingerprint, diff_fingerprints, describe_changes
+from utils.sessions import SessionManager, new_session_id, valid_session_id
+from utils.profiling import DataProfile, Profiler
+from utils.intents import FastAnswer, answer_from_profile, match_intent
+from utils.pipeline import Pipeline, StepMemo
+from utils.warmup import Warmup
+from utils import metrics
+from utils.metrics import SessionMetrics
+from typing import Optional
+
+# Versions share unchanged columns; copy-on-write keeps a write through one
+# frame from reaching the others
+pd.set_option("mode.copy_on_write", True)
+
+
+# Session state saved by the SessionManager, restored after a restart
+PERSISTED_KEYS = ("chat_history", "execution_history", "file_path", "load_report", "memory_report", "source")
+
+UPLOAD_TYPES = ['csv', 'xlsx', 'xls', 'json', 'parquet', 'pickle', 'feather', 'h5', 'hdf5']
+
+
+def current_session_id() -> str:
+    """Id of the server-side session, kept in the URL so that a reload or restart finds it again"""
+    session_id = st.query_params.get("session")
+    if not valid_session_id(session_id):
+        session_id = new_session_id()
+        st.query_params["session"] = session_id
+    return session_id
 
 
 def initialize_session_state():
-    """Initialize session state variables"""
-    if 'df' not in st.session_state:
-        st.session_state.df = None
-        st.session_state.chat_history = []
-        st.session_state.file_path = None
-        st.session_state.execution_history = []
+    """Initialize session state variables, restoring a saved session when the URL names one"""
+    manager = SessionManager.get_manager()
+    if 'versions' not in st.session_state:
+        st.session_state.session_id = current_session_id()
+        versions, saved = manager.open(st.session_state.session_id)
+        st.session_state.chat_history = saved.get("chat_history", [])
+        st.session_state.file_path = saved.get("file_path")
+        st.session_state.execution_history = saved.get("execution_history", [])
+        st.session_state.load_report = saved.get("load_report")
+        st.session_state.memory_report = saved.get("memory_report")
+        source = saved.get("source")
+        st.session_state.source = source if source is not None and os.path.exists(source.path) else None
+        st.session_state.df_version = 0
+        st.session_state.fingerprint = None
+        st.session_state.versions = versions
+        st.session_state.prompt_report = None
+        st.session_state.metrics = SessionMetrics()
+        st.session_state.step_memo = StepMemo.from_env()
+        st.session_state.replay_report = None
+    else:
+        manager.touch(st.session_state.session_id)
+
+
+def save_session():
+    """Hand the session to the SessionManager, which saves it in the background"""
+    SessionManager.get_manager().save(
+        st.session_state.session_id, {key: st.session_state[key] for key in PERSISTED_KEYS})
 
 
 def reset_session():
     """Reset all session state variables"""
-    st.session_state.df = None
+    manager = SessionManager.get_manager()
+    manager.discard(st.session_state.session_id)
+    if st.session_state.source is not None:
+        st.session_state.source.close(delete=True)
+        st.session_state.source = None
+    st.session_state.session_id = new_session_id()
+    st.query_params["session"] = st.session_state.session_id
     st.session_state.chat_history = []
     st.session_state.file_path = None
     st.session_state.execution_history = []
+    st.session_state.load_report = None
+    st.session_state.memory_report = None
+    st.session_state.df_version += 1
+    st.session_state.fingerprint = None
+    st.session_state.versions, _ = manager.open(st.session_state.session_id)
+    st.session_state.step_memo = StepMemo.from_env()
+    st.session_state.replay_report = None
     st.experimental_rerun()
 
 
-def _parse_llm_response(raw_response: Any) -> AnalysisResponse:
-    """Parse LLM raw output into AnalysisResponse; fallback to explanation if parsing fails."""
-    if isinstance(raw_response, AnalysisResponse):
-        return raw_response
-    if isinstance(raw_response, dict):
-        return AnalysisResponse(**raw_response)
+def server_file() -> Optional[str]:
+    """A file picked from DATA_DIR, for datasets too large to upload; None when DATA_DIR is not set"""
+    data_dir = os.getenv("DATA_DIR")
+    if not data_dir or not os.path.isdir(data_dir):
+        return None
+    names = sorted(name for name in os.listdir(data_dir) if os.path.isfile(os.path.join(data_dir, name)))
+    name = st.selectbox("Or open a file on the server", [""] + names, format_func=lambda name: name or "—")
+    return os.path.join(data_dir, name) if name else None
 
-    text = str(raw_response).strip()
 
-    # Strip optional code fences
-    if text.startswith("```") and text.endswith("```"):
-        text = text.strip("`")
-        # Remove leading language tag if present (e.g., json)
-        if text.startswith("json\n"):
-            text = text[len("json\n"):]
+def open_lazy_source(dataset, fmt: str) -> pd.DataFrame:
+    """Register a large file for in-place queries with DuckDB; returns its first rows as the session DataFrame"""
+    if isinstance(dataset, str):
+        source = LazySource.from_env(dataset, fmt)
+    else:
+        source = LazySource.from_env(spool_upload(dataset), fmt, owned=True)
+    with st.spinner("Counting rows and missing values..."):
+        source.analyze()
+        sample = source.sample()
+    # Queries open their own connection; this one would hold on to DuckDB's buffers
+    source.close()
+    st.session_state.source = source
+    st.session_state.load_report = {'format': fmt, 'engine': 'duckdb', 'rows': source.rows,
+                                    'columns': len(source.columns), 'file_bytes': source.file_bytes,
+                                    'truncated': False}
+    return sample
 
-    try:
-        # Pydantic v2
-        return AnalysisResponse.model_validate_json(text)  # type: ignore[attr-defined]
-    except (ValidationError, AttributeError):
-        try:
-            # Pydantic v1
-            return AnalysisResponse.parse_raw(text)  # type: ignore[attr-defined]
-        except Exception:
-            # Fallback – treat as plain explanation
-            return AnalysisResponse(response_type="explanation", content=str(raw_response))
+
+def session_df() -> Optional[pd.DataFrame]:
+    """The session DataFrame, read back from disk if the session was spilled; None before an upload"""
+    return st.session_state.versions.current_frame()
+
+
+def store_dataframe(df: pd.DataFrame, label: str = "", fingerprint: Optional[FrameFingerprint] = None) -> int:
+    """Keep df in the session as a new version, compacting its dtypes first when enabled.
+
+    Returns the id of the version now checked out; a df whose content equals
+    the current one does not add a version. A df passed with its fingerprint
+    is stored as it is.
+    """
+    with metrics.span("store", rows=len(df)):
+        if fingerprint is None:
+            if optimize_enabled():
+                df, st.session_state.memory_report = optimize_dtypes(df)
+            fingerprint = frame_fingerprint(df)
+        versions = st.session_state.versions
+        if versions.current is not None and fingerprint.token == current_fingerprint().token:
+            return versions.current
+        version_id, df = versions.commit(df, fingerprint, label)
+    st.session_state.df_version += 1
+    st.session_state.fingerprint = (st.session_state.df_version, fingerprint)
+    submit_profile(df)
+    return version_id
+
+
+def use_version(df: pd.DataFrame, fingerprint: FrameFingerprint):
+    """Make a version checked out of the VersionStore the session DataFrame"""
+    st.session_state.df_version += 1
+    st.session_state.fingerprint = (st.session_state.df_version, fingerprint)
+    submit_profile(df)
+
+
+def current_fingerprint() -> FrameFingerprint:
+    """Fingerprint of the session DataFrame, computed once per df_version"""
+    cached = st.session_state.fingerprint
+    if cached is None or cached[0] != st.session_state.df_version:
+        cached = (st.session_state.df_version,
+                  st.session_state.versions.current_fingerprint or frame_fingerprint(session_df()))
+        st.session_state.fingerprint = cached
+    return cached[1]
+
+
+def pipeline_panel():
+    """Export the operations that led to the current data as a script, or replay them on a new file"""
+    versions = st.session_state.versions
+    pipeline = Pipeline.from_history(st.session_state.execution_history, versions.lineage())
+    if not pipeline.steps:
+        return
+    with st.expander(f"🔁 Replay pipeline ({len(pipeline.steps)} steps)",
+                     expanded=st.session_state.replay_report is not None):
+        for step in pipeline.steps:
+            st.caption(f"{step.number}. {step.request or step.code.splitlines()[0]} — {step.describe()}")
+        st.download_button("⬇️ Export as Python script", pipeline.to_script(st.session_state.file_path),
+                           file_name="pipeline.py", mime="text/x-python")
+        replacement = st.file_uploader("Run the same operations on a new version of the data",
+                                       type=UPLOAD_TYPES, key="replay_upload")
+        if st.button("▶️ Replay", disabled=replacement is None):
+            replay_pipeline(pipeline, replacement)
+            st.experimental_rerun()
+        if st.session_state.replay_report is not None:
+            render_replay_report(st.session_state.replay_report)
+
+
+def replay_pipeline(pipeline: Pipeline, uploaded):
+    """Load uploaded and run the pipeline on it without calling the model.
+
+    Every step adds a version and an operation to the history, so the
+    result can be undone step by step. Steps whose input columns match an
+    earlier run are taken from the session's StepMemo.
+    """
+    history = []
+
+    def on_step(result, df, fingerprint):
+        version_id = store_dataframe(df, label=result.step.request or f"Replay step {result.step.number}",
+                                     fingerprint=fingerprint)
+        history.append({'code': result.step.code, 'request': result.step.request, 'output': result.output,
+                        'data_changes': result.data_changes, 'plots_created': result.plots_created,
+                        'version': version_id})
+
+    with metrics.trace("replay", st.session_state.metrics):
+        with metrics.span("read", bytes=file_size(uploaded), engine="pandas"):
+            loaded_df, st.session_state.load_report = read_dataset(uploaded, **load_budget_from_env())
+        store_dataframe(loaded_df, label=f"Loaded {uploaded.name}")
+        with st.spinner(f"Replaying {len(pipeline.steps)} operations..."):
+            st.session_state.replay_report = pipeline.replay(
+                session_df(), current_fingerprint(), memo=st.session_state.step_memo,
+                figure_budget=FigureBudget.from_env(), on_step=on_step)
+    st.session_state.file_path = uploaded.name
+    st.session_state.execution_history = history
+
+
+def submit_profile(df: pd.DataFrame):
+    """Start profiling the session DataFrame in the background"""
+    profiler = Profiler.get_profiler()
+    if profiler is not None:
+        profiler.submit(df, current_fingerprint(), owner=st.session_state.session_id)
+
+
+def current_profile(wait: float = 0.0) -> Optional[DataProfile]:
+    """Profile of the session DataFrame if it is ready within ``wait`` seconds"""
+    profiler = Profiler.get_profiler()
+    if profiler is None:
+        return None
+    return profiler.get(current_fingerprint().token, wait)
+
+
+def fast_answer(user_request: str, df: pd.DataFrame) -> Optional[FastAnswer]:
+    """Answer common requests (summary, missing values, correlations, distributions) from the profile.
+
+    Returns None to send the request to the LLM, also when the profile is
+    not ready within PROFILE_WAIT_SECONDS.
+    """
+    if st.session_state.source is not None:
+        # The profile would describe only the first rows of the file
+        return None
+    with metrics.span("fast_answer"):
+        matched = match_intent(user_request, df.columns)
+        if matched is None:
+            return None
+        profile = current_profile(wait=float(os.getenv("PROFILE_WAIT_SECONDS", "2")))
+        if profile is None:
+            return None
+        answer = answer_from_profile(*matched, profile)
+    if answer is not None:
+        metrics.count("profile_answers")
+    return answer
+
+
+def figure_settings() -> FigureBudget:
+    """Per-session plot downsampling controls, defaulting to the FIGURE_* variables"""
+    defaults = FigureBudget.from_env()
+    with st.expander("⚙️ Plot settings"):
+        enabled = st.checkbox("Downsample large plots", value=defaults.enabled, key="figure_downsample",
+                              help="Reduce line and scatter traces with many points before they are sent to the browser")
+        max_points = st.number_input("Max points per line", min_value=100, value=defaults.max_points,
+                                     step=1000, key="figure_max_points", disabled=not enabled)
+        max_markers = st.number_input("Max markers per scatter", min_value=1000, value=defaults.max_markers,
+                                      step=10000, key="figure_max_markers", disabled=not enabled)
+    return defaults._replace(enabled=enabled, max_points=int(max_points), max_markers=int(max_markers))
+
+
+def build_prompt_inputs(user_request: str, df: pd.DataFrame) -> dict:
+    """Collect the prompt variables for the current request within the PROMPT_MAX_TOKENS budget"""
+    with metrics.span("prompt"):
+        inputs, report = fit_prompt_inputs(
+            df,
+            user_request,
+            st.session_state.chat_history,
+            file_path=st.session_state.file_path,
+            fingerprint=current_fingerprint(),
+            budget=PromptBudget.from_env(),
+            profile=current_profile(),
+            source=st.session_state.source,
+        )
+        metrics.annotate(tokens=report["total_tokens"], columns=report["schema_columns"])
+    metrics.count("prompt_tokens", report["total_tokens"])
+    st.session_state.prompt_report = report
+    return inputs
 
 
 def process_user_request(user_request: str, df: pd.DataFrame):
     """Process user request and return LLM response"""
-    chain = LLMChainManager.get_chain()
-    data_preview = df_head_to_text(df)
-    # Lazy import to avoid circular
-    from utils.data_utils import df_schema_to_text
-    data_schema = df_schema_to_text(df)
-    
-    # Format conversation history for LLM context
-    conversation_history = LLMChainManager.format_conversation_history(st.session_state.chat_history)
-    
-    raw = chain.run({
-        "data_preview": data_preview,
-        "user_request": user_request,
-        "file_path": st.session_state.file_path,
-        "data_schema": data_schema,
-        "conversation_history": conversation_history,
-    })
-    return _parse_llm_response(raw)
+    answer = fast_answer(user_request, df)
+    if answer is not None:
+        return AnalysisResponse(response_type="explanation", content=answer.as_text())
+    inputs = build_prompt_inputs(user_request, df)
+    with metrics.span("llm"):
+        raw = LLMChainManager.run(inputs)
+    with metrics.span("parse"):
+        return parse_llm_response(raw)
+
+
+def stream_user_request(user_request: str, df: pd.DataFrame, refresh_interval: float = 0.05):
+    """Stream the LLM response into the page and return the parsed AnalysisResponse.
+
+    The code or answer view opens as soon as ``response_type`` has been
+    generated and its content is redrawn at most every ``refresh_interval``
+    seconds while tokens arrive.
+    """
+    inputs = build_prompt_inputs(user_request, df)
+    report = st.session_state.prompt_report
+    if report["schema_columns"] < report["columns"]:
+        st.caption(f"Prompt: ~{report['total_tokens']:,} tokens; the schema describes the "
+                   f"{report['schema_columns']:,} of {report['columns']:,} columns most relevant to the request")
+    status = st.empty()
+    header = st.empty()
+    body = st.empty()
+    status.caption("⏳ Waiting for the model...")
+
+    raw = ""
+    shown_type = None
+    last_draw = 0.0
+    with metrics.span("llm"):
+        started = time.monotonic()
+        for chunk in LLMChainManager.stream(inputs):
+            if not raw:
+                metrics.annotate(first_chunk_s=round(time.monotonic() - started, 4))
+            raw += chunk
+            response_type, content, _ = extract_partial_response(raw)
+            if response_type is None:
+                continue
+            if response_type != shown_type:
+                shown_type = response_type
+                status.empty()
+                header.subheader("💻 Generated Code" if response_type == "code" else "💡 Answer")
+            now = time.monotonic()
+            if now - last_draw >= refresh_interval:
+                last_draw = now
+                _draw_content(body, response_type, content)
+        metrics.annotate(chars=len(raw))
+
+    status.empty()
+    with metrics.span("parse"):
+        response = parse_llm_response(raw)
+    if response.response_type != shown_type:
+        header.subheader("💻 Generated Code" if response.response_type == "code" else "💡 Answer")
+    _draw_content(body, response.response_type, response.content)
+    return response
+
+
+def _draw_content(placeholder, response_type: str, content: str):
+    if response_type == "code":
+        placeholder.code(content, language='python')
+    else:
+        placeholder.markdown(content)
 
 
 def main():
+    # Build the LLM chain and start the execution workers in the background
+    # while the first visitor uploads a file; a no-op after the first run
+    Warmup.start()
+
     # Page configuration
     st.set_page_config(page_title="Data Science Academy Assistant", page_icon="🤖")
     st.title("Data Science Academy Assistant 🤖")
@@ -83,29 +363,73 @@ def main():
     initialize_session_state()
 
     # File upload section
-    uploaded = st.file_uploader("Upload your dataset", type=['csv', 'xlsx', 'xls', 'json', 'parquet', 'pickle', 'feather', 'h5', 'hdf5'])
+    uploaded = st.file_uploader("Upload your dataset", type=UPLOAD_TYPES)
 
-    if uploaded:
+    picked = server_file()
+    dataset = uploaded if uploaded else picked
+
+    # A restored session shows its data before anything is uploaded
+    if dataset or session_df() is not None:
         try:
             # Load data if new upload
-            if st.session_state.df is None:
-                st.session_state.df = load_data(uploaded)
+            if session_df() is None:
+                name = uploaded.name if uploaded else os.path.basename(picked)
+                with metrics.trace("load", st.session_state.metrics):
+                    fmt = out_of_core_format(dataset)
+                    with metrics.span("read", bytes=file_size(dataset), engine="duckdb" if fmt else "pandas"):
+                        if fmt is not None:
+                            # Too large to load: queried in place, only the first rows are kept
+                            loaded_df = open_lazy_source(dataset, fmt)
+                        else:
+                            progress_bar = st.progress(0.0, text="Loading data...")
+                            loaded_df, st.session_state.load_report = read_dataset(
+                                dataset,
+                                progress=lambda fraction, message: progress_bar.progress(fraction, text=message),
+                                **load_budget_from_env(),
+                            )
+                            progress_bar.empty()
+                        metrics.annotate(rows=st.session_state.load_report['rows'], columns=len(loaded_df.columns))
+                    store_dataframe(loaded_df, label=f"Loaded {name}")
                 st.session_state.chat_history = []
-                st.session_state.file_path = uploaded.name  # Store file path in session state
+                st.session_state.file_path = name  # Store file path in session state
                 # No file saving - everything stays in memory
             
-            df = st.session_state.df
+            df = session_df()
             
             # Display current data preview
             st.subheader("📊 Current Data Preview")
             st.write(f"File: {st.session_state.file_path}")
-            st.dataframe(df.head())
+            load_report = st.session_state.load_report
+            if st.session_state.source is not None:
+                st.info(f"🦆 Out-of-core mode: the {load_report['rows']:,} rows of this file are queried in place "
+                        f"with DuckDB. The preview shows the first {len(df):,}; the data cannot be changed.")
+            if load_report and load_report['truncated']:
+                st.warning(f"⚠️ Only the first {load_report['rows']:,} rows were loaded (LOAD_MAX_ROWS/LOAD_MAX_MB limit).")
+            memory_report = st.session_state.memory_report
+            if memory_report and memory_report['after_bytes'] < memory_report['before_bytes']:
+                st.caption(f"Memory: {format_bytes(memory_report['before_bytes'])} → "
+                           f"{format_bytes(memory_report['after_bytes'])} after dtype optimization")
+            # Pages are cached by content, so operations that leave the data
+            # unchanged (plots, summaries) keep them
+            with metrics.trace("preview", st.session_state.metrics), metrics.span("render"):
+                render_dataframe(df, current_fingerprint().token, key="data")
             
             # Display execution history
+            versions = st.session_state.versions
             if st.session_state.execution_history:
                 st.subheader("🔧 Previous Operations")
+                undo_col, redo_col = st.columns(2)
+                if undo_col.button("↩️ Undo", disabled=not versions.can_undo):
+                    use_version(*versions.undo())
+                    st.experimental_rerun()
+                if redo_col.button("↪️ Redo", disabled=not versions.can_redo):
+                    use_version(*versions.redo())
+                    st.experimental_rerun()
+                kept = set(versions.version_ids())
                 for i, result in enumerate(st.session_state.execution_history, 1):
-                    with st.expander(f"Operation {i}: {result['code'][:50]}..."):
+                    version_id = result.get('version')
+                    marker = " (current)" if version_id is not None and version_id == versions.current else ""
+                    with st.expander(f"Operation {i}: {result['code'][:50]}...{marker}"):
                         st.write(f"**Code:** {result['code']}")
                         if result['output']:
                             st.write(f"**Output:** {result['output']}")
@@ -113,6 +437,14 @@ def main():
                             st.write(f"**Data Changes:** {result['data_changes']}")
                         if result['plots_created'] > 0:
                             st.write(f"**Plots Created:** {result['plots_created']}")
+                        if version_id is not None and st.button(
+                                "⏪ Jump to this version", key=f"checkout_{i}",
+                                disabled=version_id not in kept or version_id == versions.current,
+                                help="Restore the data as it was after this operation"):
+                            use_version(*versions.checkout(version_id))
+                            st.experimental_rerun()
+                if st.session_state.source is None:
+                    pipeline_panel()
 
             # Display chat history
             if st.session_state.chat_history:
@@ -134,44 +466,64 @@ def main():
                 placeholder="e.g., 'What's the average value?', 'show correlation matrix'"
             )
 
+            figure_budget = figure_settings()
+
             # Process request
             if st.button("🔍 Analyze") and user_request:
-                with st.spinner("Processing request..."):
-                    try:
-                        # Get and process LLM response
-                        response = process_user_request(user_request, df)
+                st.session_state.replay_report = None
+                try:
+                    with metrics.trace("analyze", st.session_state.metrics):
+                        answer = fast_answer(user_request, df)
+                        if answer is not None:
+                            render_fast_answer(answer)
+                            response = AnalysisResponse(response_type="explanation", content=answer.as_text())
+                        else:
+                            # Stream LLM response; code or answer is rendered as it arrives
+                            response = stream_user_request(user_request, df)
 
                         # Update chat history
                         st.session_state.chat_history.append((user_request, response))
 
                         # Handle response based on type
                         if response.response_type == "code":
-                            st.subheader("💻 Generated Code")
-                            st.code(response.content, language='python')
-                            # Execute code and get results
-                            modified_df, execution_results = execute_code_safely(response, df)
-                            st.session_state.df = modified_df
-                            
+                            before = current_fingerprint()
+                            with st.spinner("Running code..."):
+                                # Execute code and get results; the shallow copy keeps
+                                # in-place edits from reaching the stored version
+                                modified_df, execution_results = execute_code_safely(
+                                    response, df.copy(deep=False), figure_budget, source=st.session_state.source)
+                            version_id = store_dataframe(modified_df, label=user_request)
+                        
                             # Store execution results for LLM context
                             if execution_results:
+                                execution_results['request'] = user_request
+                                if st.session_state.source is None:
+                                    # A replay on data with the same columns skips this step
+                                    st.session_state.step_memo.record(
+                                        execution_results['code'], before, session_df(), current_fingerprint(),
+                                        execution_results['output'], execution_results['plots_created'])
+                                # Exact columns and row ranges instead of the structural summary
+                                execution_results['data_changes'] = describe_changes(
+                                    diff_fingerprints(before, current_fingerprint()))
+                                execution_results['version'] = version_id
                                 st.session_state.execution_history.append(execution_results)
-                        else:
-                            # Display explanation
-                            st.subheader("💡 Answer")
-                            st.write(response.content)
-
-                    except Exception as e:
-                        st.error("❌ Error")
-                        st.exception(e)
-                    
+
+                except Exception as e:
+                    st.error("❌ Error")
+                    st.exception(e)
+
+            render_performance_panel(st.session_state.metrics)
+
         except Exception as e:
             st.error("❌ Data Loading Error")
             st.exception(e)
 
     # Reset session button
-    if st.session_state.df is not None:
+    if session_df() is not None:
         if st.button("🔄 Reset Session"):
             reset_session()
 
+    save_session()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,205 @@
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from types import CodeType
+from typing import NamedTuple, Optional
+
+
+# Attribute calls that open windows or write files; removed when used as statements
+BLOCKED_METHODS = {
+    'show', 'savefig', 'write_html', 'write_image', 'write_json',
+    'to_csv', 'to_excel', 'to_parquet', 'to_feather', 'to_pickle', 'to_hdf',
+    'to_json', 'to_html', 'to_sql', 'to_stata', 'to_latex', 'to_markdown', 'to_xml',
+}
+# Fully qualified calls removed when used as statements
+BLOCKED_FUNCTIONS = {
+    'plotly.offline.plot', 'plotly.offline.iplot', 'plotly.io.show', 'pio.show',
+    'pyo.plot', 'pyo.iplot', 'py.plot', 'py.iplot', 'open',
+}
+# Calls whose result is a Plotly or matplotlib figure (or axes/grid holding one)
+FIGURE_FACTORIES = ('px.', 'plotly.express.', 'go.Figure', 'plotly.graph_objects.Figure',
+                    'make_subplots', 'plt.figure', 'plt.subplots', 'plt.gca', 'plt.gcf',
+                    'sns.', 'seaborn.', 'ff.')
+FIGURE_METHODS = {'plot', 'hist', 'boxplot', 'scatter', 'bar', 'barh', 'line', 'area', 'pie', 'kde', 'heatmap'}
+
+
+class PreparedCode(NamedTuple):
+    """Generated code split into hoisted imports and a compiled body"""
+    source: str
+    imports: Optional[CodeType]
+    body: CodeType
+    import_modules: tuple
+    figure_names: tuple
+    removed_calls: tuple
+
+
+def call_name(func: ast.AST) -> str:
+    """Dotted name of a call target, e.g. 'plotly.io.show'; '' if not a plain name chain"""
+    parts = []
+    while isinstance(func, ast.Attribute):
+        parts.append(func.attr)
+        func = func.value
+    if isinstance(func, ast.Name):
+        parts.append(func.id)
+        return '.'.join(reversed(parts))
+    return ''
+
+
+def _blocked(call: ast.AST) -> Optional[str]:
+    if not isinstance(call, ast.Call):
+        return None
+    name = call_name(call.func)
+    if name in BLOCKED_FUNCTIONS:
+        return name
+    if isinstance(call.func, ast.Attribute) and call.func.attr in BLOCKED_METHODS:
+        if call.func.attr.startswith('to_') and not (call.args or call.keywords):
+            # to_json()/to_html() with no path only build a string
+            return None
+        return name or call.func.attr
+    return None
+
+
+class _Cleaner(ast.NodeTransformer):
+    """Removes show/plot/file-I/O statements and hoists top-level imports"""
+
+    def __init__(self):
+        self.imports = []
+        self.removed = []
+        self.depth = 0
+
+    def visit_Import(self, node):
+        if self.depth == 0:
+            self.imports.append(node)
+            return None
+        return node
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Expr(self, node):
+        name = _blocked(node.value)
+        if name:
+            self.removed.append(name)
+            return None
+        return node
+
+    def visit_With(self, node):
+        for item in node.items:
+            name = _blocked(item.context_expr)
+            if name == 'open':
+                self.removed.append(name)
+                return None
+        return self._visit_block(node)
+
+    def _visit_block(self, node):
+        had_finalbody = bool(getattr(node, 'finalbody', None))
+        self.depth += 1
+        try:
+            self.generic_visit(node)
+        finally:
+            self.depth -= 1
+        # Keep blocks syntactically valid when every statement was removed
+        if not node.body:
+            node.body = [ast.Pass()]
+        if had_finalbody and not node.finalbody:
+            node.finalbody = [ast.Pass()]
+        return node
+
+    visit_If = visit_For = visit_AsyncFor = visit_While = visit_Try = visit_TryStar = _visit_block
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_AsyncWith = _visit_block
+    visit_ExceptHandler = visit_match_case = _visit_block
+
+
+def _is_figure_call(value: ast.AST) -> bool:
+    if not isinstance(value, ast.Call):
+        return False
+    name = call_name(value.func)
+    if name and any(name == f or name.startswith(f) for f in FIGURE_FACTORIES):
+        return True
+    # df.plot(...), df['x'].hist(...), df.plot.scatter(...)
+    return isinstance(value.func, ast.Attribute) and (
+        value.func.attr in FIGURE_METHODS or call_name(value.func).split('.')[-2:-1] == ['plot'])
+
+
+def find_figure_names(tree: ast.AST) -> tuple:
+    """Names assigned the result of a figure-producing call, in source order"""
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and _is_figure_call(node.value):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                elements = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+                names.extend(e.id for e in elements if isinstance(e, ast.Name))
+    return tuple(dict.fromkeys(names))
+
+
+def _imported_modules(imports: list) -> tuple:
+    modules = []
+    for node in imports:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif node.module and not node.level:
+            modules.append(node.module)
+    return tuple(dict.fromkeys(modules))
+
+
+def strip_code_fences(content: str) -> str:
+    return content.replace('```python', '').replace('```', '').strip()
+
+
+def _prepare(source: str) -> PreparedCode:
+    tree = ast.parse(source, filename='<generated>')
+    cleaner = _Cleaner()
+    tree = cleaner.visit(tree)
+    ast.fix_missing_locations(tree)
+
+    imports = None
+    if cleaner.imports:
+        imports = compile(ast.Module(body=cleaner.imports, type_ignores=[]), '<generated>', 'exec')
+    body = compile(tree, '<generated>', 'exec')
+    return PreparedCode(
+        source=source,
+        imports=imports,
+        body=body,
+        import_modules=_imported_modules(cleaner.imports),
+        figure_names=find_figure_names(tree),
+        removed_calls=tuple(cleaner.removed),
+    )
+
+
+class CodeCache:
+    """LRU cache of PreparedCode keyed by the SHA-256 of the source"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source: str) -> PreparedCode:
+        key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prepared
+            self.misses += 1
+        prepared = _prepare(source)
+        with self._lock:
+            self._entries[key] = prepared
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prepared
+
+
+_cache = CodeCache()
+
+
+def prepare_code(content: str) -> PreparedCode:
+    """Parse, clean and compile generated code in one pass; cached by source hash.
+
+    Raises SyntaxError for code that does not parse.
+    """
+    return _cache.get(strip_code_fences(content))
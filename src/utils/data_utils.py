@@ -1,52 +1,31 @@
 import pandas as pd
 import sys
-import re
-import subprocess
-from io import StringIO
-import importlib
-import requests
 import streamlit as st
-from typing import Union, Any
+from collections import OrderedDict
+from typing import Union, Any, Optional
 from pydantic import BaseModel
-
-
-def is_valid_pypi_package(package_name: str) -> bool:
-    """Check if a package exists on PyPI"""
-    url = f"https://pypi.org/pypi/{package_name}/json"
-    resp = requests.get(url)
-    return resp.status_code == 200
-
-
-def load_data(file_path: Union[str, Any]) -> pd.DataFrame:
+from utils.ingest import read_dataset, ProgressCallback
+from utils.dtypes import format_bytes, logical_dtypes
+from utils.figures import FigureBudget
+from utils.fingerprint import FrameFingerprint
+from utils.intents import FastAnswer
+from utils.profiling import ColumnProfile, DataProfile
+from utils.sandbox import run_code, run_lazy
+from utils.packages import MissingPackageError, PackageResolver
+from utils.pipeline import ReplayResult
+from utils.rendering import render_first_page
+from utils import metrics
+from utils.metrics import SessionMetrics
+
+
+def load_data(file_path: Union[str, Any], max_rows: Optional[int] = None,
+              max_bytes: Optional[int] = None,
+              progress: Optional[ProgressCallback] = None) -> pd.DataFrame:
     """Load data from various file formats (CSV, Excel, JSON, etc.)"""
     try:
-        if hasattr(file_path, 'name'):
-            file_extension = file_path.name.lower().split('.')[-1]
-        else:
-            file_extension = str(file_path).lower().split('.')[-1]
-
-        if file_extension == 'csv':
-            return pd.read_csv(file_path)
-        elif file_extension in ['xlsx', 'xls']:
-            return pd.read_excel(file_path)
-        elif file_extension == 'json':
-            return pd.read_json(file_path)
-        elif file_extension == 'parquet':
-            return pd.read_parquet(file_path)
-        elif file_extension == 'pickle':
-            return pd.read_pickle(file_path)
-        elif file_extension == 'feather':
-            return pd.read_feather(file_path)
-        elif file_extension in ['h5', 'hdf5']:
-            return pd.read_hdf(file_path)
-        else:
-            try:
-                return pd.read_csv(file_path)
-            except Exception:
-                try:
-                    return pd.read_excel(file_path)
-                except Exception:
-                    raise ValueError(f"Unsupported file format: {file_extension}. Supported formats: CSV, Excel (xlsx/xls), JSON, Parquet, Pickle, Feather, HDF5")
+        with metrics.span("read"):
+            df, _ = read_dataset(file_path, max_rows=max_rows, max_bytes=max_bytes, progress=progress)
+        return df
     except Exception as e:
         raise Exception(f"Error loading file: {str(e)}")
 
@@ -56,194 +35,239 @@ def df_head_to_text(df: pd.DataFrame, rows: int = 3) -> str:
     return df.head(rows).to_string()
 
 
-def df_schema_to_text(df: pd.DataFrame) -> str:
-    """Summarize dataframe columns and dtypes for LLM context."""
-    lines = ["Columns (name: dtype, non_null_count):"]
-    non_null_counts = df.notnull().sum()
-    for col in df.columns:
-        lines.append(f"- {col}: {df.dtypes[col]}, {int(non_null_counts[col])} non-null")
-    return "\n".join(lines)
-
-
-def execute_code_safely(response: BaseModel, df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+# Non-null counts keyed by FrameFingerprint.column_token
+_non_null_counts = OrderedDict()
+MAX_CACHED_COUNTS = 4096
+
+
+def _non_null_count(df: pd.DataFrame, col, fingerprint: FrameFingerprint) -> int:
+    token = fingerprint.column_token(col)
+    count = _non_null_counts.get(token)
+    if count is None:
+        count = int(df[col].notna().sum())
+        _non_null_counts[token] = count
+        while len(_non_null_counts) > MAX_CACHED_COUNTS:
+            _non_null_counts.popitem(last=False)
+    else:
+        _non_null_counts.move_to_end(token)
+    return count
+
+
+def _profile_details(column: ColumnProfile) -> str:
+    """Range or most frequent values of a profiled column, for the schema line"""
+    stats = column.stats
+    if "mean" in stats:
+        return f", range {stats['min']:.4g} to {stats['max']:.4g}, mean {stats['mean']:.4g}"
+    if stats:
+        return f", {stats['min']} to {stats['max']}"
+    if column.top:
+        examples = ", ".join(str(value)[:20] for value, _ in column.top[:3])
+        return f", {column.unique:,} unique, most frequent: {examples}"
+    return ""
+
+
+def df_schema_lines(df: pd.DataFrame, fingerprint: Optional[FrameFingerprint] = None,
+                    profile: Optional[DataProfile] = None) -> list:
+    """One "- name: dtype, N non-null" line per column, in column order.
+
+    With a fingerprint of df, non-null counts are only recomputed for
+    columns whose content changed. With a DataProfile of df, lines also
+    give the range of numeric columns and the most frequent values of
+    the others.
+    """
+    if profile is not None and not df.columns.has_duplicates:
+        return [f"- {col}: {column.dtype}, {column.non_null} non-null{_profile_details(column)}"
+                for col, column in profile.columns.items()]
+    if fingerprint is None or df.columns.has_duplicates:
+        non_null_counts = df.notnull().sum().tolist()
+    else:
+        non_null_counts = [_non_null_count(df, col, fingerprint) for col in df.columns]
+    # Report dtypes as loaded, not the compact storage chosen by optimize_dtypes
+    return [f"- {col}: {dtype}, {int(count)} non-null"
+            for col, dtype, count in zip(df.columns, logical_dtypes(df), non_null_counts)]
+
+
+SCHEMA_HEADER = "Columns (name: dtype, non_null_count):"
+
+
+def df_schema_to_text(df: pd.DataFrame, fingerprint: Optional[FrameFingerprint] = None,
+                      profile: Optional[DataProfile] = None) -> str:
+    """Summarize dataframe columns and dtypes for LLM context"""
+    return "\n".join([SCHEMA_HEADER] + df_schema_lines(df, fingerprint, profile))
+
+
+def render_figures(figures: list) -> None:
+    """Display figures returned by run_generated_code or the sandbox pool"""
+    if not figures:
+        return
+    st.subheader("📈 Plots")
+    for kind, fig, note in figures:
+        if metrics.active():
+            metrics.count("bytes_rendered", _figure_bytes(kind, fig))
+        try:
+            if kind == "plotly":
+                st.plotly_chart(fig, use_container_width=True)
+            elif kind == "plotly_json":
+                import plotly.io as pio
+                st.plotly_chart(pio.from_json(fig), use_container_width=True)
+            elif kind == "matplotlib":
+                st.pyplot(fig, clear_figure=False)
+                # Release the figure so pyplot does not show it again next run
+                plt = sys.modules.get('matplotlib.pyplot')
+                if plt is not None:
+                    plt.close(fig)
+            elif kind == "png":
+                st.image(fig, use_column_width=True)
+            else:
+                continue
+            if note:
+                st.caption(f"⚡ Reduced for display: {note}")
+        except Exception:
+            pass
+
+
+def _figure_bytes(kind: str, fig) -> int:
+    """Size of the payload a figure is sent to the browser as (plotly JSON or an image)"""
+    if kind == "plotly":
+        return len(fig.to_json())
+    if kind in ("plotly_json", "png"):
+        return len(fig)
+    return 0
+
+
+def render_fast_answer(answer: FastAnswer) -> None:
+    """Display an answer computed from the data profile"""
+    with metrics.span("render"):
+        st.subheader("💡 Answer")
+        st.markdown(answer.text)
+        if answer.table is not None:
+            st.dataframe(answer.table, use_container_width=True)
+        render_figures(list(answer.figures))
+        st.caption("⚡ Answered from the cached data profile without calling the model")
+
+
+def report_missing_package(module: str) -> None:
+    """Tell the user about a missing import and start a background install if possible"""
+    resolver = PackageResolver.get_resolver()
+    distribution = resolver.resolve(module)
+    if distribution is None:
+        st.error(f"📦 The code needs '{module}', which is not installed and has no known package.")
+        return
+    status = resolver.install_status(distribution)
+    if status == "installed" or resolver.is_importable(module):
+        st.warning(f"📦 {distribution} was installed for '{module}' but could not be imported. Please try again.")
+    elif status == "installing":
+        st.info(f"📦 {distribution} is still being installed. Run the request again in a moment.")
+    elif resolver.can_install(distribution):
+        resolver.install_async(distribution)
+        st.info(f"📦 Installing {distribution} in the background. Run the request again once it finishes.")
+    else:
+        st.error(f"📦 The code needs '{module}' ({distribution}), which is not installed and not in the local wheelhouse.")
+
+
+def execute_code_safely(response: BaseModel, df: pd.DataFrame,
+                        figure_budget: Optional[FigureBudget] = None,
+                        source=None) -> tuple[pd.DataFrame, dict]:
     """
     Execute generated code or display explanation based on response type with auto-package installation
+
+    With a LazySource the code queries the file through sql() and df, the
+    source's sample, is returned unchanged.
     """
     if response.response_type == "explanation":
-        st.subheader("💡 Answer")
-        st.write(response.content)
+        with metrics.span("render"):
+            st.subheader("💡 Answer")
+            st.write(response.content)
         return df, {}
 
     if response.response_type == "code":
-        code = response.content.replace('```python', '').replace('```', '').strip()
-
-        exec_globals = {
-            'pd': pd,
-            'df': df,
-            'print': print,
-            'importlib': importlib
-        }
-
-        # Handle imports with auto-installation
-        if 'import' in code:
-            import_lines = [line for line in code.split('\n') if 'import' in line]
-            if import_lines:
-                import_code = '\n'.join(import_lines)
-                try:
-                    exec(import_code, exec_globals)
-                except ImportError as e:
-                    match = re.search(r"No module named '([^']+)'", str(e))
-                    if match:
-                        missing_module = match.group(1).split('.')[0]
-
-                        # Map to valid PyPI package if needed
-                        pip_package = missing_module
-                        if not is_valid_pypi_package(pip_package):
-                            alias_map = {
-                                "sklearn": "scikit-learn",
-                                "cv2": "opencv-python",
-                                "PIL": "Pillow"
-                            }
-                            pip_package = alias_map.get(missing_module, missing_module)
-
-                        st.info(f"📦 Installing missing package: {pip_package}")
-                        try:
-                            subprocess.check_call([sys.executable, "-m", "pip", "install", pip_package])
-                            exec(import_code, exec_globals)
-                        except subprocess.CalledProcessError as e:
-                            raise Exception(f"Failed to install {pip_package}: {str(e)}")
-                    else:
-                        raise
-
-                # Remove import lines from main code
-                code = '\n'.join(line for line in code.split('\n') if 'import' not in line)
-
-        # Strip show() calls to prevent external windows
-        code = re.sub(r'(?m)^\s*.*\.show\s*\([^)]*\)\s*;?\s*$', '', code)
-        code = re.sub(r'(?m)^\s*plotly\.(?:offline|io)\.(?:plot|show)\s*\([^)]*\)\s*;?\s*$', '', code)
-        code = re.sub(r'(?m)^\s*pio\.show\s*\([^)]*\)\s*;?\s*$', '', code)
-        code = re.sub(r'(?m)^\s*.*write_html\s*\([^)]*auto_open\s*=\s*True[^)]*\)\s*;?\s*$', '', code)
-
-        output = StringIO()
-        old_stdout = sys.stdout
-        sys.stdout = output
-
         try:
-            exec(code, exec_globals)
+            if source is not None:
+                with metrics.span("exec", rows=source.rows, engine="duckdb"):
+                    execution_results, figures = run_lazy(response.content, source, notify=st.info,
+                                                          figure_budget=figure_budget)
+                modified_df = df
+            else:
+                with metrics.span("exec", rows=len(df)):
+                    modified_df, execution_results, figures = run_code(response.content, df, notify=st.info,
+                                                                       figure_budget=figure_budget)
+        except MissingPackageError as e:
+            report_missing_package(e.module)
+            return df, {}
+        metrics.count("rows_processed", len(df) if source is None else source.rows)
+
+        with metrics.span("render", figures=len(figures)):
+            if execution_results['output']:
+                st.subheader("📋 Code Output")
+                st.text(execution_results['output'])
 
-            printed_output = output.getvalue()
-            sys.stdout = old_stdout
+            render_figures(figures)
 
-            if printed_output.strip():
-                st.subheader("📋 Code Output")
-                st.text(printed_output)
-
-            displayed_any_plot = False
-            plotly_figs = []
-            fig_nums = []
-
-            for value in list(exec_globals.values()):
-                try:
-                    if hasattr(value, 'to_plotly_json'):
-                        plotly_figs.append(value)
-                    elif isinstance(value, (list, tuple)):
-                        for item in value:
-                            if hasattr(item, 'to_plotly_json'):
-                                plotly_figs.append(item)
-                except Exception:
-                    pass
-
-            # Deduplicate
-            seen_ids = set()
-            unique_plotly_figs = []
-            for f in plotly_figs:
-                if id(f) not in seen_ids:
-                    unique_plotly_figs.append(f)
-                    seen_ids.add(id(f))
-
-            if unique_plotly_figs:
-                st.subheader("📈 Plots")
-                for f in unique_plotly_figs:
-                    try:
-                        st.plotly_chart(f, use_container_width=True)
-                        displayed_any_plot = True
-                    except Exception:
-                        pass
-
-            plt = exec_globals.get('plt')
-            if plt is not None:
-                try:
-                    fig_nums = plt.get_fignums()
-                except Exception:
-                    fig_nums = []
-                if fig_nums:
-                    if not displayed_any_plot:
-                        st.subheader("📈 Plots")
-                    for num in fig_nums:
-                        try:
-                            fig_obj = plt.figure(num)
-                            st.pyplot(fig_obj, clear_figure=False)
-                            displayed_any_plot = True
-                        except Exception:
-                            pass
-
-            if 'ax' in exec_globals:
-                ax = exec_globals.get('ax')
-                try:
-                    fig_obj = getattr(ax, 'figure', None)
-                    if fig_obj is not None:
-                        if not displayed_any_plot:
-                            st.subheader("📈 Plots")
-                        st.pyplot(fig_obj, clear_figure=False)
-                        displayed_any_plot = True
-                except Exception:
-                    pass
-
-            modified_df = exec_globals.get('df', df)
-            st.subheader("📊 Current Data State")
-            st.dataframe(modified_df)
-
-            plots_created = len(unique_plotly_figs) + len(fig_nums) + (1 if 'ax' in exec_globals else 0)
-
-            # Detect data changes
-            data_changes = []
-            if df.shape != modified_df.shape:
-                data_changes.append(f"Shape changed from {df.shape} to {modified_df.shape}")
-
-            original_cols = set(df.columns)
-            new_cols = set(modified_df.columns)
-            if original_cols != new_cols:
-                added = new_cols - original_cols
-                removed = original_cols - new_cols
-                if added:
-                    data_changes.append(f"Added columns: {list(added)}")
-                if removed:
-                    data_changes.append(f"Removed columns: {list(removed)}")
-
-            type_changes = []
-            for col in df.columns.intersection(modified_df.columns):
-                if df[col].dtype != modified_df[col].dtype:
-                    type_changes.append(f"{col}: {df[col].dtype} → {modified_df[col].dtype}")
-
-            if type_changes:
-                data_changes.append(f"Type changes: {', '.join(type_changes)}")
-
-            if len(df) != len(modified_df):
-                data_changes.append(f"Row count changed from {len(df)} to {len(modified_df)}")
-
-            execution_results = {
-                'code': code,
-                'output': printed_output.strip(),
-                'data_changes': '; '.join(data_changes) if data_changes else "No structural changes detected",
-                'plots_created': plots_created
-            }
-
-            return modified_df, execution_results
-
-        except Exception as e:
-            sys.stdout = old_stdout
-            raise Exception(f"Error executing code: {str(e)}")
-        finally:
-            sys.stdout = old_stdout
+            if source is None:
+                st.subheader("📊 Current Data State")
+                render_first_page(modified_df)
+
+        return modified_df, execution_results
 
     return df, {}
+
+
+def render_performance_panel(session: SessionMetrics) -> None:
+    """Collapsible breakdown of where the time of the last request went, plus session totals"""
+    if not metrics.ENABLED or not session.traces:
+        return
+    with st.expander("⏱️ Performance"):
+        requests = [trace for trace in session.traces if trace.name != "preview"]
+        if requests:
+            last = requests[-1]
+            st.caption(f"Last {last.name}: {last.seconds:.2f}s" + (f" (failed: {last.error})" if last.error else ""))
+            st.dataframe(pd.DataFrame([
+                {"stage": record.name, "start (ms)": round(record.offset * 1000, 1),
+                 "time (ms)": round(record.seconds * 1000, 1),
+                 "share": f"{record.seconds / last.seconds:.0%}" if last.seconds else "",
+                 "details": ", ".join(f"{key}={value}" for key, value in record.attrs.items())}
+                for record in sorted(last.spans, key=lambda record: record.offset)
+            ]), use_container_width=True, hide_index=True)
+
+        counters = session.counters
+        hits, misses = counters.get("llm_cache_hits", 0), counters.get("llm_cache_misses", 0)
+        llm = session.stages.get("llm", [0, 0.0, 0.0])
+        columns = st.columns(4)
+        columns[0].metric("LLM calls", f"{llm[0]:,}",
+                          help=f"{hits:,} of {hits + misses:,} answered from the response cache")
+        columns[1].metric("Mean LLM time", f"{llm[1] / llm[0]:.2f}s" if llm[0] else "–")
+        columns[2].metric("Prompt tokens", f"{int(counters.get('prompt_tokens', 0)):,}")
+        columns[3].metric("Rows processed", f"{int(counters.get('rows_processed', 0)):,}")
+        st.caption(f"Rendered {format_bytes(int(counters.get('bytes_rendered', 0)))}; "
+                   f"{int(counters.get('profile_answers', 0)):,} answers from the data profile")
+        st.dataframe(pd.DataFrame([
+            {"stage": name, "calls": calls, "total (s)": round(total, 3),
+             "mean (ms)": round(total / calls * 1000, 1), "max (ms)": round(longest * 1000, 1)}
+            for name, (calls, total, longest) in sorted(session.stages.items(), key=lambda item: -item[1][1])
+        ]), use_container_width=True, hide_index=True)
+
+
+def render_replay_report(report: ReplayResult) -> None:
+    """Results of replaying the recorded operations on new data, one expander per step"""
+    ran, skipped = report.count("ran"), report.count("skipped")
+    seconds = sum(result.seconds for result in report.steps)
+    summary = f"Replayed {ran + skipped} operations in {seconds:.2f}s without calling the model"
+    if skipped:
+        summary += f"; {skipped} reused from earlier runs because the columns they read were unchanged"
+    if report.failed:
+        failed = report.steps[-1]
+        st.error(f"❌ Step {failed.step.number} failed: {failed.error}. "
+                 f"The data is kept as it was after step {failed.step.number - 1}.")
+    else:
+        st.success(f"✅ {summary}")
+    icons = {"ran": "▶️", "skipped": "♻️", "failed": "❌"}
+    for result in report.steps:
+        label = result.step.request or result.step.code.splitlines()[0]
+        with st.expander(f"{icons[result.status]} Step {result.step.number}: {label[:60]} ({result.seconds:.2f}s)"):
+            st.code(result.step.code, language='python')
+            st.caption(result.step.describe())
+            if result.output:
+                st.text(result.output)
+            if result.data_changes:
+                st.write(f"**Data Changes:** {result.data_changes}")
+            render_figures(result.figures)
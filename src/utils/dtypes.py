@@ -0,0 +1,205 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (
+    infer_dtype,
+    is_object_dtype,
+)
+
+try:
+    import pyarrow as pa
+    ARROW_STRINGS = True
+except ImportError:  # pragma: no cover
+    pa = None
+    ARROW_STRINGS = False
+
+
+LOGICAL_DTYPES_ATTR = "logical_dtypes"
+
+
+class LogicalDtypes(dict):
+    """Maps optimized columns to (physical dtype, dtype pandas originally inferred).
+
+    Kept in ``df.attrs`` so it follows the frame through pandas operations.
+    pandas deep-copies attrs on every derived object, so copies share this
+    (never mutated) mapping instead of duplicating it.
+    """
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __copy__(self):
+        return self
+
+
+def logical_dtype(df: pd.DataFrame, col) -> str:
+    """Dtype of a column as pandas would have inferred it, ignoring storage optimizations"""
+    dtype = str(df.dtypes[col])
+    recorded = df.attrs.get(LOGICAL_DTYPES_ATTR, {}).get(col)
+    if recorded is not None and recorded[0] == dtype:
+        return recorded[1]
+    return dtype
+
+
+def logical_dtypes(df: pd.DataFrame) -> list:
+    """logical_dtype of every column in column order, reading df.dtypes once"""
+    recorded = df.attrs.get(LOGICAL_DTYPES_ATTR, {})
+    dtypes = []
+    for col, dtype in zip(df.columns, map(str, df.dtypes)):
+        entry = recorded.get(col)
+        dtypes.append(entry[1] if entry is not None and entry[0] == dtype else dtype)
+    return dtypes
+
+
+def restore_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """df with the dtypes pandas originally inferred for the columns optimize_dtypes converted.
+
+    The compact dtypes are for storage only: int32 arithmetic overflows
+    where int64 would not, and category or Arrow string columns reject
+    values code writes into object columns (fillna('Unknown'), .loc
+    assignments). Generated code therefore runs on the restored frame.
+    Missing values of restored object columns are NaN, as pandas readers
+    give them.
+    """
+    recorded = df.attrs.get(LOGICAL_DTYPES_ATTR)
+    if not recorded or not df.columns.is_unique:
+        return df
+    # df.dtypes builds a Series; read it once, not per column
+    dtypes = dict(zip(df.columns, map(str, df.dtypes)))
+    conversions = {col: logical for col, (physical, logical) in recorded.items()
+                   if dtypes.get(col) == physical}
+    if not conversions:
+        return df
+    restored = df.astype(conversions, copy=False)
+    for col, dtype in conversions.items():
+        if dtype == 'object':
+            series = restored[col]
+            if series.isna().any():
+                restored[col] = series.where(series.notna(), np.nan)
+    return restored
+
+
+def _downcast_integer(series: pd.Series, min_itemsize: int):
+    low, high = series.min(), series.max()
+    for itemsize in (1, 2, 4):
+        if itemsize < min_itemsize:
+            continue
+        info = np.iinfo(f"int{itemsize * 8}")
+        if info.min <= low and high <= info.max:
+            return np.dtype(f"int{itemsize * 8}") if itemsize < series.dtype.itemsize else None
+    return None
+
+
+def _downcast_float(series: pd.Series):
+    downcast = series.astype(np.float32)
+    # Only lossless downcasts keep the values the generated code sees
+    if np.array_equal(downcast.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+        return np.dtype(np.float32)
+    return None
+
+
+def _object_dtype(series: pd.Series, max_category_ratio: float, arrow_strings: bool):
+    kind = infer_dtype(series, skipna=True)
+    if kind == 'boolean':
+        return 'boolean'
+    if kind == 'integer':
+        return 'Int64'
+    if kind != 'string':
+        return None
+    if series.nunique(dropna=True) <= max_category_ratio * len(series):
+        return 'category'
+    if arrow_strings:
+        return 'string[pyarrow]'
+    return None
+
+
+def optimize_dtypes(df: pd.DataFrame, min_int_bits: int = 32, downcast_floats: bool = False,
+                    max_category_ratio: float = 0.5, arrow_strings: bool = ARROW_STRINGS, min_rows: int = 1000) -> tuple[pd.DataFrame, dict]:
+    """
+    Shrink a DataFrame's memory footprint without changing its values.
+
+    - integers are downcast, but not below ``min_int_bits``
+    - floats become float32 only when ``downcast_floats`` is set and the
+      conversion is lossless
+    - string columns become ``category`` when at most ``max_category_ratio``
+      of the values are distinct, else Arrow-backed strings
+    - object columns of bools/ints with missing values become nullable dtypes
+
+    Sparse dtypes are deliberately not used: Arrow (and so st.dataframe)
+    cannot serialize them and pandas miscounts their non-null values.
+
+    The original dtypes are recorded so ``df_schema_to_text`` keeps reporting
+    them, and restore_dtypes converts back to them before generated code
+    runs. Returns the optimized frame and a report with the before/after
+    ``memory_usage(deep=True)`` totals.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    report = {'before_bytes': before, 'after_bytes': before, 'columns': {}}
+    if len(df) < min_rows or not df.columns.is_unique:
+        return df, report
+
+    conversions = {}
+    for col, dtype in zip(df.columns, df.dtypes):
+        series = df[col]
+        target = None
+        if dtype.kind == 'i':
+            target = _downcast_integer(series, min_int_bits // 8)
+        elif downcast_floats and dtype == np.float64:
+            target = _downcast_float(series)
+        elif is_object_dtype(dtype):
+            target = _object_dtype(series, max_category_ratio, arrow_strings)
+        if target is not None:
+            conversions[col] = target
+
+    if not conversions:
+        return df, report
+
+    logical = dict(zip(df.columns, logical_dtypes(df)))
+    optimized = df.astype(conversions, copy=False)
+    physical = dict(zip(optimized.columns, map(str, optimized.dtypes)))
+    optimized.attrs[LOGICAL_DTYPES_ATTR] = LogicalDtypes(
+        (col, (physical[col], logical[col])) for col in optimized.columns if physical[col] != logical[col]
+    )
+
+    after = int(optimized.memory_usage(deep=True).sum())
+    if after >= before:
+        return df, report
+    report['after_bytes'] = after
+    report['columns'] = {col: (logical[col], physical[col]) for col in conversions}
+    return optimized, report
+
+
+def arrow_roundtrips(df: pd.DataFrame, rows: int = 2) -> bool:
+    """Whether df converts to Arrow and back with the same dtypes, columns and index.
+
+    Some frames convert to Arrow but cannot be read back, e.g. a pd.cut
+    column (categories of intervals) fails with "Ran out of field
+    metadata". The failures come from the schema, not the values, so the
+    first ``rows`` rows are enough to find them.
+    """
+    if pa is None:
+        return False
+    head = df.iloc[:rows]
+    try:
+        back = pa.Table.from_pandas(head).to_pandas()
+    except Exception:
+        return False
+    # Compared as dtypes, not names: Arrow-backed strings come back as
+    # Python-backed ones, though both print as "string"
+    return (list(back.dtypes) == list(head.dtypes)
+            and back.columns.equals(head.columns) and back.index.equals(head.index))
+
+
+def optimize_enabled() -> bool:
+    """The optimizer runs unless DF_OPTIMIZE_DTYPES is set to 0/false"""
+    return os.getenv("DF_OPTIMIZE_DTYPES", "1").lower() not in ("0", "false", "no")
+
+
+def format_bytes(num_bytes: float) -> str:
+    """Human readable size, e.g. '12.3 MB'"""
+    for unit in ("B", "KB", "MB"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
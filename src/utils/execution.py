@@ -0,0 +1,209 @@
+import importlib
+import sys
+from io import StringIO
+from typing import Callable, Optional
+
+import pandas as pd
+
+from utils.code_transform import prepare_code
+from utils.dtypes import logical_dtypes, restore_dtypes
+from utils.figures import FigureBudget, reduce_figures
+from utils.packages import MissingPackageError
+
+
+def collect_figures(exec_globals: dict, figure_names: tuple = ()) -> tuple[list, int]:
+    """Find Plotly and matplotlib figures left in the execution namespace.
+
+    ``figure_names`` are variables the code assigned from figure-producing
+    calls (see code_transform.find_figure_names); axes and grids among them
+    contribute their parent figure. Returns (figures, plots_created) where
+    figures is a list of ("plotly" | "matplotlib", figure) pairs in display
+    order.
+    """
+    plotly_figs = []
+    for value in list(exec_globals.values()):
+        try:
+            if hasattr(value, 'to_plotly_json'):
+                plotly_figs.append(value)
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    if hasattr(item, 'to_plotly_json'):
+                        plotly_figs.append(item)
+        except Exception:
+            pass
+
+    figures = []
+    seen_ids = set()
+    for f in plotly_figs:
+        if id(f) not in seen_ids:
+            figures.append(("plotly", f))
+            seen_ids.add(id(f))
+    plotly_count = len(figures)
+
+    fig_nums = []
+    plt = exec_globals.get('plt')
+    if plt is not None:
+        try:
+            fig_nums = plt.get_fignums()
+        except Exception:
+            fig_nums = []
+        for num in fig_nums:
+            try:
+                fig_obj = plt.figure(num)
+                if id(fig_obj) not in seen_ids:
+                    figures.append(("matplotlib", fig_obj))
+                    seen_ids.add(id(fig_obj))
+            except Exception:
+                pass
+
+    for name in ('ax',) + tuple(figure_names):
+        value = exec_globals.get(name)
+        if value is None or hasattr(value, 'to_plotly_json'):
+            continue
+        fig_obj = value if hasattr(value, 'savefig') else getattr(value, 'figure', None)
+        if fig_obj is not None and hasattr(fig_obj, 'savefig') and id(fig_obj) not in seen_ids:
+            figures.append(("matplotlib", fig_obj))
+            seen_ids.add(id(fig_obj))
+
+    plots_created = plotly_count + len(fig_nums) + (1 if 'ax' in exec_globals else 0)
+    return figures, plots_created
+
+
+def describe_data_changes(df: pd.DataFrame, modified_df: pd.DataFrame) -> str:
+    """Summarize structural differences between two versions of the data"""
+    data_changes = []
+    if df.shape != modified_df.shape:
+        data_changes.append(f"Shape changed from {df.shape} to {modified_df.shape}")
+
+    original_cols = set(df.columns)
+    new_cols = set(modified_df.columns)
+    if original_cols != new_cols:
+        added = new_cols - original_cols
+        removed = original_cols - new_cols
+        if added:
+            data_changes.append(f"Added columns: {list(added)}")
+        if removed:
+            data_changes.append(f"Removed columns: {list(removed)}")
+
+    type_changes = []
+    old_dtypes = dict(zip(df.columns, logical_dtypes(df)))
+    new_dtypes = dict(zip(modified_df.columns, logical_dtypes(modified_df)))
+    for col in df.columns.intersection(modified_df.columns):
+        old_dtype, new_dtype = old_dtypes[col], new_dtypes[col]
+        if old_dtype != new_dtype:
+            type_changes.append(f"{col}: {old_dtype} → {new_dtype}")
+
+    if type_changes:
+        data_changes.append(f"Type changes: {', '.join(type_changes)}")
+
+    if len(df) != len(modified_df):
+        data_changes.append(f"Row count changed from {len(df)} to {len(modified_df)}")
+
+    return '; '.join(data_changes) if data_changes else "No structural changes detected"
+
+
+def _execute(code: str, exec_globals: dict):
+    """Run generated code in exec_globals; returns (prepared code, printed output)"""
+    try:
+        # Parsed, cleaned (imports hoisted, show/file I/O calls removed) and
+        # compiled once per distinct source, so replays skip straight to exec
+        prepared = prepare_code(code)
+    except SyntaxError as e:
+        raise Exception(f"Error executing code: {str(e)}")
+
+    # Run imports first so missing packages are reported before any work is done
+    if prepared.imports is not None:
+        try:
+            exec(prepared.imports, exec_globals)
+        except ModuleNotFoundError as e:
+            if e.name:
+                raise MissingPackageError(e.name)
+            raise
+
+    output = StringIO()
+    old_stdout = sys.stdout
+    sys.stdout = output
+
+    try:
+        exec(prepared.body, exec_globals)
+    except ModuleNotFoundError as e:
+        if e.name:
+            raise MissingPackageError(e.name)
+        raise Exception(f"Error executing code: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Error executing code: {str(e)}")
+    finally:
+        sys.stdout = old_stdout
+    return prepared, output.getvalue()
+
+
+def run_generated_code(code: str, df: pd.DataFrame,
+                       notify: Optional[Callable[[str], None]] = None,
+                       figure_budget: Optional[FigureBudget] = None) -> tuple[pd.DataFrame, dict, list]:
+    """
+    Execute generated code against df without touching the UI.
+
+    Returns (modified_df, execution_results, figures) where figures are
+    (kind, figure, note) triples already reduced to ``figure_budget`` (see
+    figures.reduce_figures). ``notify`` receives user-facing status
+    messages. Imports of packages that are not installed raise
+    MissingPackageError instead of installing anything here.
+    """
+    # Compact storage dtypes (int32, category, Arrow strings) behave
+    # differently from the int64/object columns the prompt describes
+    df = restore_dtypes(df)
+    exec_globals = {
+        'pd': pd,
+        'df': df,
+        'print': print,
+        'importlib': importlib
+    }
+    prepared, printed_output = _execute(code, exec_globals)
+    figures, plots_created = collect_figures(exec_globals, prepared.figure_names)
+    figures = reduce_figures(figures, figure_budget)
+    modified_df = exec_globals.get('df', df)
+
+    execution_results = {
+        'code': prepared.source,
+        'output': printed_output.strip(),
+        'data_changes': describe_data_changes(df, modified_df),
+        'plots_created': plots_created
+    }
+    return modified_df, execution_results, figures
+
+
+def run_lazy_code(code: str, source,
+                  notify: Optional[Callable[[str], None]] = None,
+                  figure_budget: Optional[FigureBudget] = None) -> tuple[dict, list]:
+    """
+    Execute generated code that queries a LazySource instead of a DataFrame.
+
+    The code gets ``sql(query)``, which returns the result of a DuckDB query
+    over the view ``data`` as a pandas DataFrame, and no ``df``; the data
+    itself is read-only. Returns (execution_results, figures) as
+    run_generated_code does, without the frame.
+    """
+    def sql(query: str) -> pd.DataFrame:
+        result, truncated = source.query(query)
+        if truncated and notify is not None:
+            notify(f"A query returned more than {source.max_result_rows:,} rows; only the first were kept")
+        return result
+
+    exec_globals = {
+        'pd': pd,
+        'sql': sql,
+        'print': print,
+        'importlib': importlib
+    }
+    try:
+        prepared, printed_output = _execute(code, exec_globals)
+    finally:
+        source.close()
+    figures, plots_created = collect_figures(exec_globals, prepared.figure_names)
+    execution_results = {
+        'code': prepared.source,
+        'output': printed_output.strip(),
+        'data_changes': None,
+        'plots_created': plots_created
+    }
+    return execution_results, reduce_figures(figures, figure_budget)
@@ -0,0 +1,235 @@
+import os
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+class FigureBudget(NamedTuple):
+    """Point limits applied to generated figures before they reach the browser"""
+    enabled: bool = True
+    max_points: int = 5000       # line traces are downsampled to this many points
+    max_markers: int = 100_000   # marker-only traces above this are binned
+    bins: int = 300              # grid cells per axis for binned markers
+    webgl_points: int = 1000     # Plotly scatter traces above this use WebGL
+
+    @classmethod
+    def from_env(cls) -> "FigureBudget":
+        """Defaults configured by FIGURE_DOWNSAMPLE, FIGURE_MAX_POINTS and FIGURE_MAX_MARKERS"""
+        return cls(
+            enabled=os.getenv("FIGURE_DOWNSAMPLE", "1").lower() not in ("0", "false", "no", "off"),
+            max_points=int(os.getenv("FIGURE_MAX_POINTS", "5000")),
+            max_markers=int(os.getenv("FIGURE_MAX_MARKERS", "100000")),
+        )
+
+
+def _as_float(values, n: int) -> Optional[np.ndarray]:
+    """Numeric view of axis values (datetimes as int64), or None for categories"""
+    if values is None:
+        return np.arange(n, dtype=float)
+    arr = np.asarray(values)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype("datetime64[ns]").astype(np.int64).astype(float)
+    if np.issubdtype(arr.dtype, np.number) or arr.dtype == bool:
+        return arr.astype(float)
+    try:
+        return arr.astype(float)
+    except (TypeError, ValueError):
+        return None
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Indices of the minimum and maximum of y in each of n_buckets equal buckets"""
+    n = len(y)
+    size = -(-n // n_buckets)
+    rows = -(-n // size)
+    low = np.full(rows * size, np.inf)
+    high = np.full(rows * size, -np.inf)
+    finite = np.isfinite(y)
+    low[:n] = np.where(finite, y, np.inf)
+    high[:n] = np.where(finite, y, -np.inf)
+    offsets = np.arange(rows) * size
+    picked = np.concatenate([
+        low.reshape(rows, size).argmin(axis=1) + offsets,
+        high.reshape(rows, size).argmax(axis=1) + offsets,
+        [0, n - 1],
+    ])
+    return np.unique(np.minimum(picked, n - 1))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the line's shape"""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    y = np.where(np.isfinite(y), y, 0.0)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+        following = slice(stop, edges[i + 2] if i + 2 < len(edges) else n)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - next_x) * (y[start:stop] - ay) - (ax - x[start:stop]) * (next_y - ay))
+        previous = start + int(area.argmax())
+        picked[i + 1] = previous
+    return picked
+
+
+def downsample_line(x: Optional[np.ndarray], y: Optional[np.ndarray], n_out: int) -> np.ndarray:
+    """Indices to keep for a line trace: min-max pre-selection, then LTTB.
+
+    Non-numeric x or y (None) are treated as positions.
+    """
+    n = len(y if y is not None else x)
+    x = np.arange(n, dtype=float) if x is None else x
+    y = np.arange(n, dtype=float) if y is None else y
+    if n > 8 * n_out:
+        # Min-max keeps the extremes LTTB would pick and cuts its work to O(n_out)
+        candidates = minmax_indices(y, 2 * n_out)
+        return candidates[lttb_indices(x[candidates], y[candidates], n_out)]
+    return lttb_indices(x, y, n_out)
+
+
+def bin_indices(x: np.ndarray, y: np.ndarray, bins: int) -> np.ndarray:
+    """One representative point (the first) per occupied cell of a bins×bins grid"""
+    finite = np.isfinite(x) & np.isfinite(y)
+    positions = np.flatnonzero(finite)
+    cells = []
+    for values in (x[finite], y[finite]):
+        low, high = values.min(), values.max()
+        scale = bins / (high - low) if high > low else 0.0
+        cells.append(np.minimum(((values - low) * scale).astype(np.int64), bins - 1))
+    _, first = np.unique(cells[0] * bins + cells[1], return_index=True)
+    return np.sort(positions[first])
+
+
+def _take(props: dict, idx: np.ndarray, n: int) -> dict:
+    """Slice every per-point array (x, y, text, marker.color, customdata...) in trace props"""
+    taken = {}
+    for key, value in props.items():
+        if isinstance(value, dict):
+            taken[key] = _take(value, idx, n)
+        elif isinstance(value, (list, tuple, np.ndarray)) and len(value) == n and key != "colorscale":
+            taken[key] = np.asarray(value)[idx]
+        else:
+            taken[key] = value
+    return taken
+
+
+def _reduce_plotly(fig, budget: FigureBudget):
+    import plotly.graph_objects as go
+
+    if fig.frames:
+        return fig, []
+    notes = []
+    traces = []
+    changed = False
+    for number, trace in enumerate(fig.data, 1):
+        if trace.type not in ("scatter", "scattergl") or (trace.x is None and trace.y is None):
+            traces.append(trace)
+            continue
+        n = len(trace.y if trace.y is not None else trace.x)
+        name = trace.name or f"trace {number}"
+        # Plotly draws lines only (no markers) by default above 20 points
+        mode = trace.mode or ("lines" if n > 20 else "lines+markers")
+        note = None
+        if "lines" in mode and n > budget.max_points:
+            idx = downsample_line(_as_float(trace.x, n), _as_float(trace.y, n), budget.max_points)
+            note = f"{name}: {n:,} → {len(idx):,} points (LTTB)"
+        elif "lines" not in mode and n > budget.max_markers:
+            x, y = _as_float(trace.x, n), _as_float(trace.y, n)
+            if x is not None and y is not None:
+                idx = bin_indices(x, y, budget.bins)
+                note = f"{name}: {n:,} → {len(idx):,} markers (one per cell of a {budget.bins}×{budget.bins} grid)"
+            else:
+                idx = np.sort(np.random.default_rng(0).choice(n, budget.max_markers, replace=False))
+                note = f"{name}: {n:,} → {len(idx):,} markers (random sample)"
+        elif trace.type == "scattergl" or n <= budget.webgl_points:
+            traces.append(trace)
+            continue
+
+        props = trace.to_plotly_json()
+        props.pop("type", None)
+        if note is not None:
+            props = _take(props, idx, n)
+            if trace.x is None:
+                props["x"] = (trace.x0 or 0) + idx * (trace.dx or 1)
+        webgl = trace.type == "scattergl" or n > budget.webgl_points
+        traces.append((go.Scattergl if webgl else go.Scatter)(props, skip_invalid=True))
+        notes.append(note or f"{name}: {n:,} points drawn with WebGL")
+        changed = True
+    if not changed:
+        return fig, notes
+    return go.Figure(data=traces, layout=fig.layout), notes
+
+
+def _artist_name(artist, default: str) -> str:
+    label = artist.get_label()
+    # Unlabelled artists get internal names such as '_child0'
+    return label if label and not label.startswith("_") else default
+
+
+def _reduce_matplotlib(fig, budget: FigureBudget) -> list:
+    from matplotlib.collections import PathCollection
+
+    notes = []
+    for ax in fig.axes:
+        # Agg already simplifies long line paths, so only marker-only lines
+        # (plt.plot(x, y, '.')) and scatter collections are reduced
+        for line in ax.get_lines():
+            x_values = np.asarray(line.get_xdata(orig=True))
+            y_values = np.asarray(line.get_ydata(orig=True))
+            n = len(y_values)
+            if n <= budget.max_markers or line.get_linestyle() not in ("None", "", " "):
+                continue
+            x, y = _as_float(x_values, n), _as_float(y_values, n)
+            if x is None or y is None:
+                continue
+            idx = bin_indices(x, y, budget.bins)
+            line.set_data(x_values[idx], y_values[idx])
+            notes.append(f"{_artist_name(line, 'markers')}: {n:,} → {len(idx):,} markers "
+                         f"(one per cell of a {budget.bins}×{budget.bins} grid)")
+        for collection in ax.collections:
+            if not isinstance(collection, PathCollection):
+                continue
+            offsets = np.asarray(collection.get_offsets())
+            n = len(offsets)
+            if n <= budget.max_markers:
+                continue
+            idx = bin_indices(offsets[:, 0].astype(float), offsets[:, 1].astype(float), budget.bins)
+            collection.set_offsets(offsets[idx])
+            for getter, setter in (("get_array", "set_array"), ("get_sizes", "set_sizes"),
+                                   ("get_facecolors", "set_facecolors"), ("get_edgecolors", "set_edgecolors")):
+                values = getattr(collection, getter)()
+                if values is not None and len(values) == n:
+                    getattr(collection, setter)(np.asarray(values)[idx])
+            notes.append(f"{_artist_name(collection, 'scatter')}: {n:,} → {len(idx):,} markers "
+                         f"(one per cell of a {budget.bins}×{budget.bins} grid)")
+    return notes
+
+
+def reduce_figures(figures: list, budget: Optional[FigureBudget] = None) -> list:
+    """Downsample heavy traces in figures from collect_figures.
+
+    Plotly line traces are reduced with min-max + LTTB, huge marker traces
+    (Plotly or matplotlib) keep one point per grid cell, and large Plotly
+    scatters switch to ``scattergl``. Returns (kind, figure, note) triples; ``note`` says what
+    was reduced and is empty for untouched figures.
+    """
+    budget = budget or FigureBudget.from_env()
+    reduced = []
+    for kind, fig in figures:
+        notes = []
+        if budget.enabled:
+            try:
+                if kind == "plotly":
+                    fig, notes = _reduce_plotly(fig, budget)
+                elif kind == "matplotlib":
+                    notes = _reduce_matplotlib(fig, budget)
+            except Exception:
+                # A figure we cannot reduce is still shown as generated
+                notes = []
+        reduced.append((kind, fig, "; ".join(notes)))
+    return reduced
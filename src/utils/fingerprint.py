@@ -0,0 +1,228 @@
+import hashlib
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_array, hash_pandas_object
+
+from utils.dtypes import logical_dtypes
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - Arrow-backed columns are hashed by pandas
+    pa = None
+
+
+CHUNK_ROWS = 1 << 16
+
+
+class FrameFingerprint(NamedTuple):
+    """Content hashes of a DataFrame, one 8-byte digest per CHUNK_ROWS rows per column"""
+    rows: int
+    chunk_rows: int
+    index: tuple
+    columns: dict   # column -> tuple of chunk digests
+    dtypes: dict    # column -> logical dtype
+
+    def column_token(self, col) -> str:
+        """Hex digest of one column's dtype and content; equal tokens mean equal columns"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self.dtypes[col]}:{self.rows}".encode())
+        for digest in self.columns[col]:
+            h.update(digest)
+        return h.hexdigest()
+
+    @property
+    def token(self) -> str:
+        """Hex digest of the whole frame: index, column names, dtypes and content"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(b"".join(self.index))
+        for col in self.columns:
+            h.update(repr(col).encode())
+            h.update(self.column_token(col).encode())
+        return h.hexdigest()
+
+
+class FrameDiff(NamedTuple):
+    """What changed between two fingerprints; row ranges are [start, stop) at chunk granularity"""
+    shape_before: tuple
+    shape_after: tuple
+    added: list
+    removed: list
+    type_changes: dict   # column -> (old dtype, new dtype)
+    changed: dict        # column -> list of (start, stop) row ranges
+    index_changed: list
+
+    @property
+    def changed_columns(self) -> list:
+        """Columns whose content differs, including added ones"""
+        return self.added + list(self.changed)
+
+
+def _digest(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+def _fixed_width(values: np.ndarray) -> np.ndarray:
+    """Normalize numpy values so storage-only downcasts hash like the original"""
+    kind = values.dtype.kind
+    if kind in "biu":
+        return values.astype(np.int64, copy=False)
+    if kind == "f":
+        return values.astype(np.float64, copy=False)
+    if kind in "mM":
+        return values.view(np.int64)
+    return values
+
+
+def _arrow_string_chunks(array, rows: int, chunk_rows: int) -> tuple:
+    """Chunk digests straight from an Arrow string array's offsets, data and validity buffers"""
+    validity, offsets_buffer, data = array.buffers()
+    offset_type = np.int64 if pa.types.is_large_string(array.type) else np.int32
+    offsets = np.frombuffer(offsets_buffer, dtype=offset_type)[array.offset:array.offset + rows + 1]
+    valid = np.ones(rows, dtype=bool) if validity is None else array.is_valid().to_numpy(zero_copy_only=False)
+    data = memoryview(data) if data is not None else memoryview(b"")
+    digests = []
+    for start in range(0, rows, chunk_rows):
+        stop = min(start + chunk_rows, rows)
+        low, high = offsets[start], offsets[stop]
+        h = hashlib.blake2b(digest_size=8)
+        h.update((offsets[start:stop + 1] - low).tobytes())
+        h.update(data[low:high])
+        h.update(valid[start:stop].tobytes())
+        digests.append(h.digest())
+    return tuple(digests)
+
+
+def _arrow_string_array(series: pd.Series):
+    if pa is None or not isinstance(series.dtype, pd.StringDtype) or series.dtype.storage == "python":
+        return None
+    chunked = getattr(series.array, "_pa_array", None)
+    if chunked is None:
+        return None
+    return chunked.combine_chunks() if chunked.num_chunks != 1 else chunked.chunk(0)
+
+
+def _chunk_digests(values, rows: int, chunk_rows: int) -> tuple:
+    """Chunk digests of a Series or Index"""
+    if isinstance(values, pd.RangeIndex):
+        return (_digest(f"range:{values.start}:{values.stop}:{values.step}".encode()),)
+    if isinstance(values, pd.Series):
+        array = _arrow_string_array(values)
+        if array is not None:
+            return _arrow_string_chunks(array, rows, chunk_rows)
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biufcmM":
+        row_values = _fixed_width(values.to_numpy())
+    elif isinstance(values.dtype, pd.CategoricalDtype):
+        # Hash each category once; rows hash like the uncategorized values,
+        # so optimize_dtypes does not change the fingerprint
+        codes = values.cat.codes.to_numpy() if isinstance(values, pd.Series) else values.codes
+        category_hashes = np.append(hash_array(values.dtype.categories.to_numpy(), categorize=False),
+                                    np.iinfo(np.uint64).max)
+        row_values = category_hashes[codes]
+    else:
+        # Objects, nullable and tz-aware dtypes: per-row hashes
+        row_values = hash_pandas_object(values, index=False).to_numpy()
+    row_values = np.ascontiguousarray(row_values)
+    return tuple(_digest(row_values[start:start + chunk_rows]) for start in range(0, rows, chunk_rows))
+
+
+def frame_fingerprint(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> FrameFingerprint:
+    """Hash df column by column in chunks of ``chunk_rows`` rows.
+
+    Numeric, datetime and Arrow string columns are hashed from their
+    buffers; other dtypes go through pd.util.hash_pandas_object.
+    """
+    rows = len(df)
+    columns = {}
+    dtypes = {}
+    logical = logical_dtypes(df) if not df.columns.has_duplicates else list(map(str, df.dtypes))
+    for position, col in enumerate(df.columns):
+        columns[col] = _chunk_digests(df.iloc[:, position], rows, chunk_rows)
+        dtypes[col] = logical[position]
+    return FrameFingerprint(
+        rows=rows,
+        chunk_rows=chunk_rows,
+        index=_chunk_digests(df.index, rows, chunk_rows),
+        columns=columns,
+        dtypes=dtypes,
+    )
+
+
+def _changed_ranges(before: tuple, after: tuple, chunk_rows: int, rows: int) -> list:
+    """Merged [start, stop) row ranges of the chunks that differ"""
+    ranges = []
+    for i in range(max(len(before), len(after))):
+        if i < len(before) and i < len(after) and before[i] == after[i]:
+            continue
+        start, stop = i * chunk_rows, min((i + 1) * chunk_rows, rows)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], stop)
+        else:
+            ranges.append((start, stop))
+    return ranges
+
+
+def diff_fingerprints(before: FrameFingerprint, after: FrameFingerprint) -> FrameDiff:
+    """Compare two fingerprints column by column and chunk by chunk"""
+    rows = max(before.rows, after.rows)
+    chunk_rows = after.chunk_rows
+    comparable = before.chunk_rows == after.chunk_rows
+    changed = {}
+    type_changes = {}
+    for col, digests in after.columns.items():
+        if col not in before.columns:
+            continue
+        if before.dtypes[col] != after.dtypes[col]:
+            type_changes[col] = (before.dtypes[col], after.dtypes[col])
+        if not comparable:
+            changed[col] = [(0, rows)]
+            continue
+        ranges = _changed_ranges(before.columns[col], digests, chunk_rows, rows)
+        if ranges:
+            changed[col] = ranges
+    if before.index == after.index:
+        index_changed = []
+    elif comparable and len(before.index) > 1 and len(after.index) > 1:
+        index_changed = _changed_ranges(before.index, after.index, chunk_rows, rows)
+    else:
+        # A RangeIndex has a single digest for all rows
+        index_changed = [(0, rows)]
+    return FrameDiff(
+        shape_before=(before.rows, len(before.columns)),
+        shape_after=(after.rows, len(after.columns)),
+        added=[col for col in after.columns if col not in before.columns],
+        removed=[col for col in before.columns if col not in after.columns],
+        type_changes=type_changes,
+        changed=changed,
+        index_changed=index_changed,
+    )
+
+
+def _format_ranges(ranges: list, rows: int) -> str:
+    if ranges == [(0, rows)]:
+        return "all rows"
+    return ", ".join(f"rows {start:,}–{stop - 1:,}" for start, stop in ranges)
+
+
+def describe_changes(diff: FrameDiff) -> str:
+    """Summarize a FrameDiff in the style of execution.describe_data_changes"""
+    data_changes = []
+    if diff.shape_before != diff.shape_after:
+        data_changes.append(f"Shape changed from {diff.shape_before} to {diff.shape_after}")
+    if diff.added:
+        data_changes.append(f"Added columns: {diff.added}")
+    if diff.removed:
+        data_changes.append(f"Removed columns: {diff.removed}")
+    if diff.type_changes:
+        data_changes.append("Type changes: " + ", ".join(
+            f"{col}: {old} → {new}" for col, (old, new) in diff.type_changes.items()))
+    if diff.shape_before[0] != diff.shape_after[0]:
+        data_changes.append(f"Row count changed from {diff.shape_before[0]} to {diff.shape_after[0]}")
+    rows = max(diff.shape_before[0], diff.shape_after[0])
+    if diff.changed:
+        data_changes.append("Changed values: " + ", ".join(
+            f"{col} ({_format_ranges(ranges, rows)})" for col, ranges in diff.changed.items()))
+    if diff.index_changed:
+        data_changes.append(f"Index changed ({_format_ranges(diff.index_changed, rows)})")
+    return '; '.join(data_changes) if data_changes else "No changes detected"
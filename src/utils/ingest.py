@@ -0,0 +1,381 @@
+import os
+from typing import Any, Callable, Optional, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pandas engines are used instead
+    pa = None
+
+
+ProgressCallback = Callable[[float, str], None]
+
+SUPPORTED_FORMATS = "CSV, Excel (xlsx/xls), JSON, Parquet, Pickle, Feather/Arrow IPC, HDF5"
+
+_EXTENSION_FORMATS = {
+    'csv': 'csv', 'tsv': 'csv', 'txt': 'csv',
+    'xlsx': 'excel', 'xls': 'excel',
+    'json': 'json', 'jsonl': 'json', 'ndjson': 'json',
+    'parquet': 'parquet', 'pq': 'parquet',
+    'pickle': 'pickle', 'pkl': 'pickle',
+    'feather': 'feather', 'arrow': 'feather', 'ipc': 'feather',
+    'h5': 'hdf5', 'hdf5': 'hdf5',
+}
+
+CSV_BLOCK_SIZE = 16 << 20
+HEAD_SIZE = 64 << 10
+
+
+def _read_head(source: Any, size: int = HEAD_SIZE) -> bytes:
+    """Read the first bytes of a path or file-like object without consuming it"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    position = source.tell()
+    try:
+        return source.read(size)
+    finally:
+        source.seek(position)
+
+
+def _extension(source: Any) -> str:
+    name = source.name if hasattr(source, 'name') else str(source)
+    return name.lower().rsplit('.', 1)[-1] if '.' in name else ''
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Detect the file format from its leading bytes; None if it cannot be told"""
+    if head.startswith(b'PAR1'):
+        return 'parquet'
+    if head.startswith(b'ARROW1') or head.startswith(b'FEA1'):
+        return 'feather'
+    if head.startswith(b'\xff\xff\xff\xff'):
+        return 'arrow_stream'
+    if head.startswith(b'\x89HDF\r\n\x1a\n'):
+        return 'hdf5'
+    if head.startswith(b'PK\x03\x04') or head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return 'excel'
+    if len(head) > 1 and head[0] == 0x80 and 2 <= head[1] <= 5:
+        return 'pickle'
+
+    text = head.lstrip(b'\xef\xbb\xbf').lstrip()
+    if not text:
+        return None
+    if text[:1] in (b'{', b'['):
+        return 'json'
+    if b'\x00' in head:
+        return None
+    return 'csv'
+
+
+def detect_format(source: Any) -> Optional[str]:
+    """Format of a path or upload as read_dataset detects it; None if unsupported"""
+    return sniff_format(_read_head(source)) or _EXTENSION_FORMATS.get(_extension(source))
+
+
+def _is_json_lines(head: bytes) -> bool:
+    """True for newline-delimited JSON (one object per line)"""
+    lines = [line.strip() for line in head.lstrip(b'\xef\xbb\xbf').splitlines() if line.strip()]
+    if len(lines) < 2:
+        return False
+    return lines[0].startswith(b'{') and lines[0].endswith(b'}') and lines[1].startswith(b'{')
+
+
+def file_size(source: Any) -> Optional[int]:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if hasattr(source, 'size'):
+        return source.size
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer().nbytes
+    return None
+
+
+def _arrow_source(source: Any):
+    """Open a path as a memory map, or wrap in-memory uploads without copying"""
+    if isinstance(source, (str, os.PathLike)):
+        return pa.memory_map(str(source), 'r')
+    if hasattr(source, 'getbuffer'):
+        return pa.BufferReader(pa.py_buffer(source.getbuffer()))
+    source.seek(0)
+    return pa.BufferReader(source.read())
+
+
+class _Budget:
+    """Tracks rows/bytes read against optional limits and reports progress"""
+
+    def __init__(self, max_rows: Optional[int], max_bytes: Optional[int],
+                 progress: Optional[ProgressCallback]):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.progress = progress
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False
+
+    def take(self, batch):
+        """Return the part of ``batch`` that fits in the budget"""
+        if self.max_rows is not None and self.rows + batch.num_rows > self.max_rows:
+            batch = batch.slice(0, max(self.max_rows - self.rows, 0))
+            self.truncated = True
+        if self.max_bytes is not None and self.bytes + batch.nbytes > self.max_bytes and self.rows:
+            self.truncated = True
+            return None
+        self.rows += batch.num_rows
+        self.bytes += batch.nbytes
+        return batch
+
+    @property
+    def exhausted(self) -> bool:
+        return self.truncated or (self.max_rows is not None and self.rows >= self.max_rows)
+
+    def report(self, fraction: float, message: str) -> None:
+        if self.progress is not None:
+            self.progress(min(max(fraction, 0.0), 1.0), message)
+
+
+def _collect_batches(batches, schema, budget: _Budget, fraction: Callable[[], float], label: str):
+    kept = []
+    for batch in batches:
+        batch = budget.take(batch)
+        if batch is not None and batch.num_rows:
+            kept.append(batch)
+        budget.report(fraction(), f"Reading {label}: {budget.rows:,} rows")
+        if budget.exhausted:
+            break
+    return pa.Table.from_batches(kept, schema=schema)
+
+
+def _csv_delimiter(head: bytes, extension: str) -> str:
+    """Field delimiter of a delimited text file: tab for .tsv, else sniffed from the header line.
+
+    Comma wins unless another common delimiter appears more often on the
+    first line, so quoted commas in a header do not flip a plain CSV.
+    """
+    if extension == 'tsv':
+        return '\t'
+    first_line = head.lstrip(b'\xef\xbb\xbf').split(b'\n', 1)[0]
+    counts = {delimiter: first_line.count(delimiter.encode()) for delimiter in (',', '\t', ';', '|')}
+    best = max(counts, key=counts.get)
+    return best if counts[best] > counts[','] else ','
+
+
+def _csv_convert_options(source: Any, parse_options):
+    """Arrow CSV conversion options that keep pandas' read_csv semantics.
+
+    Empty strings and the usual NA markers become nulls, and columns Arrow
+    would infer as dates/timestamps stay strings like they do in pandas. The
+    schema is probed from the first block only.
+    """
+    probe = pa_csv.open_csv(_arrow_source(source), read_options=pa_csv.ReadOptions(block_size=1 << 20),
+                            parse_options=parse_options)
+    column_types = {
+        field.name: pa.string()
+        for field in probe.schema
+        if pa.types.is_temporal(field.type)
+    }
+    return pa_csv.ConvertOptions(strings_can_be_null=True, column_types=column_types)
+
+
+def _read_csv_arrow(source: Any, budget: _Budget, size: Optional[int], delimiter: str):
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter)
+    convert_options = _csv_convert_options(source, parse_options)
+    if budget.max_rows is None and budget.max_bytes is None and (budget.progress is None or size):
+        # Nothing to stop early for: parse all blocks in parallel, progress is only coarse
+        budget.report(0.05, f"Parsing {size / (1 << 20):,.1f} MB of CSV" if size else "Parsing CSV")
+        table = pa_csv.read_csv(_arrow_source(source), read_options=read_options,
+                                parse_options=parse_options, convert_options=convert_options)
+        budget.rows = table.num_rows
+        budget.report(0.9, f"Reading CSV: {budget.rows:,} rows")
+        return table
+
+    # Limits, or an upload of unknown size: stream blocks so reading can stop and report as it goes
+    raw = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    try:
+        raw.seek(0)
+        reader = pa_csv.open_csv(pa.PythonFile(raw, mode='r'), read_options=read_options,
+                                 parse_options=parse_options, convert_options=convert_options)
+        fraction = (lambda: raw.tell() / size) if size else (lambda: 0.0)
+        return _collect_batches(reader, reader.schema, budget, fraction, 'CSV')
+    finally:
+        if raw is not source:
+            raw.close()
+
+
+def _read_parquet_arrow(source: Any, budget: _Budget):
+    parquet_file = pq.ParquetFile(_arrow_source(source))
+    if budget.max_rows is None and budget.max_bytes is None:
+        budget.report(0.0, "Reading Parquet")
+        return parquet_file.read(use_threads=True)
+    total = max(parquet_file.metadata.num_rows, 1)
+    batches = parquet_file.iter_batches(batch_size=64 * 1024, use_threads=True)
+    return _collect_batches(batches, parquet_file.schema_arrow, budget,
+                            lambda: budget.rows / total, 'Parquet')
+
+
+def _read_ipc_arrow(source: Any, budget: _Budget, stream: bool):
+    if stream:
+        reader = pa.ipc.open_stream(_arrow_source(source))
+        return _collect_batches(reader, reader.schema, budget, lambda: 0.0, 'Arrow stream')
+    # Memory-mapped: buffers are only paged in when pandas touches them
+    table = pa_feather.read_table(_arrow_source(source), memory_map=True)
+    batches = table.to_batches()
+    return _collect_batches(batches, table.schema, budget,
+                            lambda: budget.rows / max(table.num_rows, 1), 'Arrow')
+
+
+def _read_json_arrow(source: Any, budget: _Budget):
+    table = pa_json.read_json(_arrow_source(source),
+                              read_options=pa_json.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE))
+    return _collect_batches(table.to_batches(), table.schema, budget, lambda: 1.0, 'JSON')
+
+
+def _to_pandas(table) -> pd.DataFrame:
+    # self_destruct frees Arrow buffers column by column to keep peak RAM low
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _apply_budget(df: pd.DataFrame, budget: _Budget) -> pd.DataFrame:
+    if budget.max_rows is not None and len(df) > budget.max_rows:
+        budget.truncated = True
+        df = df.head(budget.max_rows)
+    if budget.max_bytes is not None and len(df):
+        # Readers without a streaming mode load everything; keep the rows that fit
+        nbytes = int(df.memory_usage(deep=True).sum())
+        while nbytes > budget.max_bytes and len(df) > 1:
+            # Rows differ in size (strings), so rescale until the head fits
+            budget.truncated = True
+            df = df.head(max(min(int(len(df) * budget.max_bytes / nbytes), len(df) - 1), 1))
+            nbytes = int(df.memory_usage(deep=True).sum())
+    budget.rows = len(df)
+    return df
+
+
+def _read_csv_pandas(source: Any, budget: _Budget, size: Optional[int], delimiter: str) -> pd.DataFrame:
+    if budget.max_rows is None and budget.max_bytes is None and budget.progress is None:
+        return pd.read_csv(source, sep=delimiter)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    chunks = []
+    rows = 0
+    nbytes = 0
+    for chunk in pd.read_csv(source, sep=delimiter, chunksize=100_000):
+        if budget.max_rows is not None and rows + len(chunk) > budget.max_rows:
+            chunk = chunk.head(budget.max_rows - rows)
+            budget.truncated = True
+        if budget.max_bytes is not None:
+            chunk_bytes = int(chunk.memory_usage(deep=True).sum())
+            if chunks and nbytes + chunk_bytes > budget.max_bytes:
+                budget.truncated = True
+                break
+            nbytes += chunk_bytes
+        chunks.append(chunk)
+        rows += len(chunk)
+        position = source.tell() if hasattr(source, 'tell') else 0
+        budget.report(position / size if size else 0.0, f"Reading CSV: {rows:,} rows")
+        if budget.truncated:
+            break
+    budget.rows = rows
+    budget.bytes = nbytes
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.read_csv(source, sep=delimiter, nrows=0)
+
+
+def load_budget_from_env() -> dict:
+    """Row/byte read limits from LOAD_MAX_ROWS and LOAD_MAX_MB (unset means unlimited)"""
+    max_rows = os.getenv("LOAD_MAX_ROWS")
+    max_mb = os.getenv("LOAD_MAX_MB")
+    return {
+        'max_rows': int(max_rows) if max_rows else None,
+        'max_bytes': int(float(max_mb) * (1 << 20)) if max_mb else None,
+    }
+
+
+def read_dataset(file_path: Union[str, Any], max_rows: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 progress: Optional[ProgressCallback] = None) -> tuple[pd.DataFrame, dict]:
+    """
+    Load a dataset and return it with a report of how it was read.
+
+    The format is sniffed from the leading bytes and only falls back to the
+    file extension when the content is ambiguous. Arrow readers are used when
+    pyarrow is installed: multithreaded CSV/JSON parsing and memory-mapped
+    Parquet/Feather/Arrow IPC. ``max_rows`` and ``max_bytes`` cap how much is
+    kept on every path; readers that cannot stop early load the file and then
+    drop the rows over the limit. ``progress`` receives (fraction, message)
+    updates; a CSV of known size is parsed in one multithreaded pass, so its
+    progress is reported coarsely. Tab-separated files (``.tsv``, or a header
+    with more tabs than commas) are split on tabs.
+    """
+    head = _read_head(file_path)
+    fmt = sniff_format(head) or _EXTENSION_FORMATS.get(_extension(file_path))
+    if fmt is None:
+        raise ValueError(f"Unsupported file format: {_extension(file_path)}. Supported formats: {SUPPORTED_FORMATS}")
+
+    size = file_size(file_path)
+    delimiter = _csv_delimiter(head, _extension(file_path)) if fmt == 'csv' else ','
+    budget = _Budget(max_rows, max_bytes, progress)
+    engine = 'pyarrow' if pa is not None else 'pandas'
+    budget.report(0.0, f"Reading {fmt}")
+
+    if hasattr(file_path, 'seek'):
+        file_path.seek(0)
+
+    arrow_format = fmt in ('csv', 'parquet', 'feather', 'arrow_stream') or (fmt == 'json' and _is_json_lines(head))
+    if engine == 'pyarrow' and arrow_format:
+        try:
+            if fmt == 'csv':
+                table = _read_csv_arrow(file_path, budget, size, delimiter)
+            elif fmt == 'parquet':
+                table = _read_parquet_arrow(file_path, budget)
+            elif fmt == 'json':
+                table = _read_json_arrow(file_path, budget)
+            else:
+                table = _read_ipc_arrow(file_path, budget, stream=fmt == 'arrow_stream')
+            budget.report(0.95, "Converting to DataFrame")
+            df = _to_pandas(table)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            # Inputs Arrow rejects (ragged CSV rows, mixed JSON types) still load via pandas
+            if fmt not in ('csv', 'json'):
+                raise
+            engine = 'pandas'
+            budget = _Budget(max_rows, max_bytes, progress)
+            if hasattr(file_path, 'seek'):
+                file_path.seek(0)
+            df = None
+    else:
+        engine = 'pandas'
+        df = None
+
+    if df is None:
+        if fmt == 'csv':
+            df = _read_csv_pandas(file_path, budget, size, delimiter)
+        elif fmt == 'json':
+            df = pd.read_json(file_path, lines=_is_json_lines(head))
+        elif fmt == 'excel':
+            df = pd.read_excel(file_path, nrows=max_rows)
+        elif fmt == 'parquet':
+            df = pd.read_parquet(file_path)
+        elif fmt == 'pickle':
+            df = pd.read_pickle(file_path)
+        elif fmt in ('feather', 'arrow_stream'):
+            df = pd.read_feather(file_path)
+        elif fmt == 'hdf5':
+            df = pd.read_hdf(file_path)
+        df = _apply_budget(df, budget)
+
+    budget.report(1.0, f"Loaded {len(df):,} rows")
+    report = {
+        'format': fmt,
+        'engine': engine,
+        'rows': len(df),
+        'columns': len(df.columns),
+        'file_bytes': size,
+        'truncated': budget.truncated,
+    }
+    return df, report
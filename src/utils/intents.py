@@ -0,0 +1,206 @@
+import re
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.profiling import DataProfile
+
+
+class FastAnswer(NamedTuple):
+    """Answer to a common request computed from a DataProfile instead of generated code"""
+    intent: str
+    text: str
+    table: Optional[pd.DataFrame] = None
+    figures: tuple = ()   # (kind, figure, note) triples for render_figures
+
+    def as_text(self) -> str:
+        """Text and table together, as kept in the conversation history"""
+        if self.table is None:
+            return self.text
+        return f"{self.text}\n\n{self.table.to_string()}"
+
+
+_FILLER = re.compile(
+    r"^(?:(?:please|can you|could you|would you|show me|show|give me|display|print|plot|draw|visuali[sz]e|"
+    r"what is|what are|what's|whats|get|compute|calculate|list|tell me|i want|i'd like|the|a|an)\s+)+"
+)
+_DATA = r"(?:the )?(?:data|dataset|data set|dataframe|df|table|file)"
+_COLUMNS = rf"(?:all )?(?:the )?(?:numeric |numerical )?(?:columns|features|variables|{_DATA})"
+
+_PATTERNS = [
+    ("describe", rf"(?:describe|summari[sz]e|overview(?: of)?|summary(?: of)?|profile)(?: {_DATA})?"),
+    ("describe", rf"(?:summary |descriptive |basic )?(?:statistics|stats)(?: (?:of|for) {_DATA})?"),
+    ("describe", rf"{_DATA} (?:summary|overview|description|statistics|stats|profile)"),
+    ("missing", rf"(?:number of |count of |counts of |how many )?(?:missing|null|nan|na|empty)"
+                rf"(?: values?| cells?| entries)?(?: counts?)?(?: are there)?"
+                rf"(?: (?:per|by|in each|for each|in every|in) (?:column|feature|{_DATA}))?"),
+    ("missing", r"which columns (?:have|contain) (?:missing|null|nan|empty) values?"),
+    ("correlation", rf"(?:correlation|corr)(?: matrix| heatmap| heat map| table)?(?: (?:of|for|between) {_COLUMNS})?"),
+    ("correlation", r"correlations"),
+    ("pair_correlation", r"(?:correlation|corr) (?:between|of) (?P<a>.+?) (?:and|with|vs|versus) (?P<b>.+)"),
+    ("distribution", r"(?:distribution|histogram|hist)(?: of| for)? (?P<col>.+)"),
+    ("distribution", r"(?P<col>.+?) (?:distribution|histogram)"),
+    ("top_values", r"(?:top|most (?:common|frequent)) (?:(?P<count>\d+) )?(?:values? )?(?:of |in |for )?(?P<col>.+)"),
+    ("top_values", r"(?:value counts|unique values|frequencies)(?: of| for| in)? (?P<col>.+)"),
+    ("top_values", r"(?P<col>.+?) value counts"),
+]
+_PATTERNS = [(intent, re.compile(pattern)) for intent, pattern in _PATTERNS]
+
+
+def _normalize(request: str) -> str:
+    text = re.sub(r"\s+", " ", request.lower()).strip()
+    text = re.sub(r"[?.!]+$", "", text).strip()
+    text = re.sub(r"\s+(?:please|for me)$", "", text)
+    return _FILLER.sub("", text)
+
+
+def _key(name) -> str:
+    return re.sub(r"[\s_\-]+", " ", str(name).lower()).strip()
+
+
+def resolve_column(text: str, columns) -> Optional[object]:
+    """Column named by text ignoring case, quotes and _/-/space differences, or None"""
+    text = text.strip().strip("'\"`")
+    text = re.sub(r"^(?:the |column |feature )+", "", text)
+    text = re.sub(r" (?:column|feature|variable)$", "", text).strip("'\"`")
+    matches = [col for col in columns if _key(col) == _key(text)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def match_intent(request: str, columns) -> Optional[tuple[str, list]]:
+    """(intent, arguments) when request is a whole-request match for a common question, else None.
+
+    The arguments are the columns named, followed by the count of a "top N"
+    request. Only full matches count, so "describe the data and drop nulls"
+    still goes to the LLM.
+    """
+    text = _normalize(request)
+    for intent, pattern in _PATTERNS:
+        match = pattern.fullmatch(text)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        count = groups.pop("count", None)
+        resolved = [resolve_column(name, columns) for name in groups.values() if name is not None]
+        if any(col is None for col in resolved):
+            continue
+        return intent, resolved + ([int(count)] if count is not None else [])
+    return None
+
+
+def _fmt(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.4g}"
+    if isinstance(value, (int, np.integer)):
+        return f"{value:,}"
+    return str(value)
+
+
+def _describe(profile: DataProfile) -> FastAnswer:
+    rows = []
+    for col, column in profile.columns.items():
+        rows.append({
+            "column": col,
+            "dtype": column.dtype,
+            "non-null": column.non_null,
+            "unique": column.unique,
+            "mean": column.stats.get("mean"),
+            "std": column.stats.get("std"),
+            "min": column.stats.get("min"),
+            "median": column.stats.get("50%"),
+            "max": column.stats.get("max"),
+            "top": column.top[0][0] if column.top else None,
+        })
+    table = pd.DataFrame(rows).set_index("column")
+    numeric = sum(1 for column in profile.columns.values() if "mean" in column.stats)
+    text = (f"The dataset has {profile.rows:,} rows and {len(profile.columns)} columns "
+            f"({numeric} numeric).")
+    return FastAnswer("describe", text, table)
+
+
+def _missing(profile: DataProfile) -> FastAnswer:
+    missing = {col: column.nulls for col, column in profile.columns.items() if column.nulls}
+    if not missing:
+        return FastAnswer("missing", f"There are no missing values in the {len(profile.columns)} columns.")
+    table = pd.DataFrame({"missing": pd.Series(missing)})
+    table["percent"] = (table["missing"] / max(profile.rows, 1) * 100).round(2)
+    table = table.sort_values("missing", ascending=False)
+    text = (f"{len(missing)} of {len(profile.columns)} columns have missing values, "
+            f"{int(table['missing'].sum()):,} missing cells in total.")
+    return FastAnswer("missing", text, table)
+
+
+def _correlation(profile: DataProfile) -> Optional[FastAnswer]:
+    corr = profile.correlation
+    if corr is None:
+        return None
+    pairs = corr.where(np.triu(np.ones(corr.shape, dtype=bool), k=1)).stack()
+    strongest = pairs.reindex(pairs.abs().sort_values(ascending=False).index).head(5)
+    lines = [f"- {a} / {b}: {value:.3f}" for (a, b), value in strongest.items()]
+    title = "Correlation matrix"
+    if profile.numeric_columns > len(corr.columns):
+        # The profile correlates only the first CORRELATION_MAX_COLUMNS numeric columns
+        scope = f"the first {len(corr.columns)} of {profile.numeric_columns} numeric columns (partial)"
+        title += f" of the first {len(corr.columns)} of {profile.numeric_columns} numeric columns"
+    else:
+        scope = f"{len(corr.columns)} numeric columns"
+    text = f"Pearson correlation of {scope}. Strongest pairs:\n" + "\n".join(lines)
+    import plotly.express as px
+    fig = px.imshow(corr, zmin=-1, zmax=1, color_continuous_scale="RdBu_r", title=title)
+    return FastAnswer("correlation", text, corr.round(3), (("plotly", fig, None),))
+
+
+def _pair_correlation(profile: DataProfile, a, b) -> Optional[FastAnswer]:
+    corr = profile.correlation
+    if corr is None or a not in corr.columns or b not in corr.columns:
+        return None
+    return FastAnswer("pair_correlation", f"The Pearson correlation between {a} and {b} is {corr.loc[a, b]:.3f}.")
+
+
+def _top_values(profile: DataProfile, col, count: Optional[int] = None) -> Optional[FastAnswer]:
+    column = profile.columns[col]
+    if not column.top or count == 0:
+        return None
+    if count is not None and count > len(column.top) and column.unique > len(column.top):
+        # The profile keeps only the TOP_K most frequent values
+        return None
+    top = column.top[:count]
+    table = pd.DataFrame(top, columns=[col, "count"]).set_index(col)
+    table["percent"] = (table["count"] / max(profile.rows, 1) * 100).round(2)
+    text = f"{col} has {column.unique:,} distinct values; the {len(top)} most frequent are shown."
+    return FastAnswer("top_values", text, table)
+
+
+def _distribution(profile: DataProfile, col) -> Optional[FastAnswer]:
+    column = profile.columns[col]
+    if column.histogram is None:
+        # Categories and text: the value counts are the distribution
+        return _top_values(profile, col)
+    counts, edges = column.histogram
+    stats = column.stats
+    text = (f"{col}: mean {_fmt(stats['mean'])}, median {_fmt(stats['50%'])}, std {_fmt(stats['std'])}, "
+            f"range {_fmt(stats['min'])} to {_fmt(stats['max'])}; {column.nulls:,} missing.")
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Bar(x=[(lo + hi) / 2 for lo, hi in zip(edges, edges[1:])], y=counts,
+                           width=[hi - lo for lo, hi in zip(edges, edges[1:])]))
+    fig.update_layout(title=f"Distribution of {col}", xaxis_title=str(col), yaxis_title="count", bargap=0)
+    table = pd.DataFrame({"value": stats}).T
+    return FastAnswer("distribution", text, table, (("plotly", fig, None),))
+
+
+def answer_from_profile(intent: str, columns: list, profile: DataProfile) -> Optional[FastAnswer]:
+    """Answer a matched intent from the profile, or None if the profile cannot answer it"""
+    if intent == "describe":
+        return _describe(profile)
+    if intent == "missing":
+        return _missing(profile)
+    if intent == "correlation":
+        return _correlation(profile)
+    if intent == "pair_correlation":
+        return _pair_correlation(profile, *columns)
+    if intent == "distribution":
+        return _distribution(profile, columns[0])
+    if intent == "top_values":
+        return _top_values(profile, *columns)
+    return None
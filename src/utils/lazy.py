@@ -0,0 +1,199 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+import pandas as pd
+
+from utils.ingest import file_size, detect_format
+
+# DuckDB is imported by the first connection; sessions that never query a
+# file in place do not load it
+HAS_DUCKDB = importlib.util.find_spec("duckdb") is not None
+
+
+# Formats DuckDB scans in place, with the table function that reads each
+_READERS = {"csv": "read_csv_auto", "parquet": "read_parquet", "json": "read_json_auto"}
+
+TABLE = "data"
+SAMPLE_ROWS = 1000
+
+
+def _literal(text: str) -> str:
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _out_of_core_dir() -> str:
+    return os.getenv("OUT_OF_CORE_DIR") or os.path.join(tempfile.gettempdir(), "dsa-out-of-core")
+
+
+class LazySource:
+    """A data file queried in place with DuckDB instead of being loaded into pandas.
+
+    The file is the view ``data``. Queries stream over it, spilling to
+    ``temp_dir`` beyond ``memory_limit_mb``, and only their results (at
+    most ``max_result_rows`` rows) become pandas DataFrames. The connection
+    can read this file and nothing else: other file access, extensions and
+    configuration changes are disabled. Instances pickle without their
+    connection, so a sandbox worker opens its own.
+    """
+
+    def __init__(self, path: str, fmt: str, memory_limit_mb: int = 1024, max_result_rows: int = 100_000,
+                 temp_dir: Optional[str] = None, threads: Optional[int] = None, owned: bool = False):
+        if fmt not in _READERS:
+            raise ValueError(f"{fmt} files cannot be queried in place")
+        self.path = os.path.abspath(path)
+        self.fmt = fmt
+        self.memory_limit_mb = memory_limit_mb
+        self.max_result_rows = max_result_rows
+        self.temp_dir = temp_dir or os.path.join(_out_of_core_dir(), "spill")
+        self.threads = threads
+        self.owned = owned      # a spooled copy of an upload, deleted by close(delete=True)
+        self.rows = None        # set by analyze()
+        self.columns = None     # [(name, DuckDB type, non-null count)], set by analyze()
+        self._con = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, path: str, fmt: str, owned: bool = False) -> "LazySource":
+        threads = os.getenv("OUT_OF_CORE_THREADS")
+        return cls(
+            path, fmt,
+            memory_limit_mb=int(os.getenv("OUT_OF_CORE_MEMORY_MB", "1024")),
+            max_result_rows=int(os.getenv("OUT_OF_CORE_MAX_ROWS", "100000")),
+            threads=int(threads) if threads else None,
+            owned=owned,
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_con"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def file_bytes(self) -> int:
+        return os.path.getsize(self.path)
+
+    def _connection(self):
+        if self._con is None:
+            if not HAS_DUCKDB:
+                raise ImportError("duckdb is not installed")
+            import duckdb
+            os.makedirs(self.temp_dir, exist_ok=True)
+            con = duckdb.connect()
+            con.execute(f"SET memory_limit={_literal(f'{self.memory_limit_mb}MB')}")
+            con.execute(f"SET temp_directory={_literal(self.temp_dir)}")
+            con.execute("SET enable_progress_bar=false")
+            if self.threads:
+                con.execute(f"SET threads={int(self.threads)}")
+            con.execute(f"CREATE VIEW {TABLE} AS SELECT * FROM {_READERS[self.fmt]}({_literal(self.path)})")
+            # Generated SQL reads this file only and cannot undo these settings
+            con.execute(f"SET allowed_paths=[{_literal(self.path)}]")
+            con.execute(f"SET allowed_directories=[{_literal(self.temp_dir)}]")
+            con.execute("SET enable_external_access=false")
+            con.execute("SET autoinstall_known_extensions=false")
+            con.execute("SET autoload_known_extensions=false")
+            con.execute("SET lock_configuration=true")
+            self._con = con
+        return self._con
+
+    def query(self, sql: str) -> tuple[pd.DataFrame, bool]:
+        """Result of sql as a DataFrame of at most max_result_rows rows, and whether it was cut"""
+        with self._lock:
+            relation = self._connection().sql(sql)
+            if relation is None:
+                return pd.DataFrame(), False
+            df = relation.limit(self.max_result_rows + 1).df()
+        if len(df) > self.max_result_rows:
+            return df.head(self.max_result_rows), True
+        return df, False
+
+    def analyze(self) -> None:
+        """Count the rows and the non-null values of each column in one pass over the file"""
+        described, _ = self.query(f"DESCRIBE {TABLE}")
+        names = described["column_name"].tolist()
+        counts = ", ".join(f"count({_identifier(name)})" for name in names)
+        row, _ = self.query(f"SELECT count(*){', ' + counts if counts else ''} FROM {TABLE}")
+        values = [int(value) for value in row.iloc[0]]
+        self.rows = values[0]
+        self.columns = list(zip(names, described["column_type"].tolist(), values[1:]))
+
+    def sample(self, rows: int = SAMPLE_ROWS) -> pd.DataFrame:
+        """The first rows of the file, for the preview and the prompt"""
+        df, _ = self.query(f"SELECT * FROM {TABLE} LIMIT {int(rows)}")
+        return df
+
+    def schema_lines(self) -> list:
+        """One "- name: type, N non-null" line per column, as df_schema_lines gives for a DataFrame"""
+        return [f"- {name}: {dtype}, {non_null} non-null" for name, dtype, non_null in self.columns]
+
+    def close(self, delete: bool = False) -> None:
+        """Close the connection; with delete, also remove the file if it is a spooled upload"""
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+        if delete and self.owned:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def out_of_core_format(source: Any) -> Optional[str]:
+    """Format to query source in place with, or None to load it into pandas.
+
+    OUT_OF_CORE=auto (the default) queries CSV, Parquet and JSON files of at
+    least OUT_OF_CORE_MIN_MB in place when duckdb is installed; ``on`` does
+    so for every such file and ``off`` never does.
+    """
+    mode = os.getenv("OUT_OF_CORE", "auto").lower()
+    if not HAS_DUCKDB or mode in ("0", "off", "false", "no"):
+        return None
+    fmt = detect_format(source)
+    if fmt not in _READERS:
+        return None
+    if mode in ("1", "on", "true", "yes"):
+        return fmt
+    size = file_size(source)
+    return fmt if size is not None and size >= float(os.getenv("OUT_OF_CORE_MIN_MB", "1024")) * 2 ** 20 else None
+
+
+def spool_upload(uploaded: Any, max_age: Optional[float] = None) -> str:
+    """Copy an upload into OUT_OF_CORE_DIR for DuckDB to scan and return the path.
+
+    Spooled files older than ``max_age`` seconds (default SESSION_TTL_HOURS),
+    left by sessions that were never reset, are removed first.
+    """
+    directory = os.path.join(_out_of_core_dir(), "uploads")
+    os.makedirs(directory, exist_ok=True)
+    if max_age is None:
+        max_age = float(os.getenv("SESSION_TTL_HOURS", "72")) * 3600
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        try:
+            if os.path.getmtime(os.path.join(directory, name)) < cutoff:
+                os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+    extension = os.path.splitext(getattr(uploaded, "name", ""))[1]
+    path = os.path.join(directory, uuid.uuid4().hex + extension)
+    uploaded.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(uploaded, f, 16 << 20)
+    uploaded.seek(0)
+    return path
@@ -0,0 +1,286 @@
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Optional
+
+
+ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NOOP = nullcontext()
+_current = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class SpanRecord(NamedTuple):
+    name: str
+    offset: float     # seconds from the start of the trace
+    seconds: float
+    attrs: dict
+
+
+class Trace:
+    """Spans and counters of one request, e.g. an upload or an Analyze click"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.spans = []
+        self.counters = {}
+        self.error = None
+        self._open = []
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "started")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.trace._open.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        self.trace._open.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.spans.append(SpanRecord(self.name, self.started - self.trace.started,
+                                           ended - self.started, self.attrs))
+        return False
+
+
+class _TraceContext:
+    __slots__ = ("trace", "session", "token")
+
+    def __init__(self, name: str, session: Optional["SessionMetrics"]):
+        self.trace = Trace(name)
+        self.session = session
+
+    def __enter__(self) -> Trace:
+        self.token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        trace = self.trace
+        trace.seconds = time.perf_counter() - trace.started
+        if exc_type is not None:
+            trace.error = exc_type.__name__
+        if self.session is not None:
+            self.session.add(trace)
+        MetricsRegistry.get_registry().record(trace)
+        return False
+
+
+def trace(name: str, session: Optional["SessionMetrics"] = None):
+    """Collect the spans and counters recorded inside the block into a Trace.
+
+    The finished trace is added to ``session`` and to the process-wide
+    registry. A no-op when METRICS_ENABLED=0.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _TraceContext(name, session)
+
+
+def span(name: str, **attrs):
+    """Time the block as stage ``name`` of the current trace; a no-op outside a trace"""
+    if not ENABLED:
+        return _NOOP
+    current = _current.get()
+    if current is None:
+        return _NOOP
+    return _Span(current, name, attrs)
+
+
+def annotate(**attrs) -> None:
+    """Add attributes to the innermost open span"""
+    if not ENABLED:
+        return
+    current = _current.get()
+    if current is not None and current._open:
+        current._open[-1].attrs.update(attrs)
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add value to a counter of the current trace"""
+    if not ENABLED:
+        return
+    current = _current.get()
+    if current is not None:
+        current.count(name, value)
+
+
+def active() -> bool:
+    """Whether a trace is being recorded, for measurements that cost something to take"""
+    return ENABLED and _current.get() is not None
+
+
+class SessionMetrics:
+    """Per-session totals of every stage and counter, plus the most recent traces"""
+
+    def __init__(self, max_traces: int = 20):
+        self.traces = deque(maxlen=max_traces)
+        self.stages = {}      # name -> [calls, total seconds, max seconds]
+        self.counters = {}
+
+    def add(self, trace: Trace) -> None:
+        self.traces.append(trace)
+        for record in trace.spans:
+            stage = self.stages.setdefault(record.name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += record.seconds
+            stage[2] = max(stage[2], record.seconds)
+        for name, value in trace.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.counters[f"{trace.name}_requests"] = self.counters.get(f"{trace.name}_requests", 0) + 1
+
+
+class MetricsRegistry:
+    """Process-wide stage histograms and counters for aggregation across containers.
+
+    Served as Prometheus text on /metrics (and JSON on /metrics.json) when
+    METRICS_PORT is set, and written to METRICS_FILE after every trace when
+    that is set (Prometheus text if it ends in .prom, JSON otherwise).
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, port: Optional[int] = None, path: Optional[str] = None):
+        self.path = path
+        self.started_at = time.time()
+        self.instance = f"{socket.gethostname()}:{os.getpid()}"
+        self._stages = {}     # name -> [bucket counts..., count, sum]
+        self._counters = {}   # (name, trace) -> value
+        self._traces = {}     # trace name -> [count, errors]
+        self._data_lock = threading.Lock()
+        self._server = None
+        if port:
+            self._server = ThreadingHTTPServer(("0.0.0.0", port), self._handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics").start()
+
+    @classmethod
+    def get_registry(cls) -> "MetricsRegistry":
+        with cls._lock:
+            if cls._instance is None:
+                port = os.getenv("METRICS_PORT")
+                cls._instance = cls(port=int(port) if port else None, path=os.getenv("METRICS_FILE") or None)
+            return cls._instance
+
+    def record(self, trace: Trace) -> None:
+        with self._data_lock:
+            for record in trace.spans:
+                stage = self._stages.setdefault(record.name, [0] * (len(BUCKETS) + 2))
+                for i, bound in enumerate(BUCKETS):
+                    if record.seconds <= bound:
+                        stage[i] += 1
+                stage[-2] += 1
+                stage[-1] += record.seconds
+            for name, value in trace.counters.items():
+                key = (name, trace.name)
+                self._counters[key] = self._counters.get(key, 0) + value
+            totals = self._traces.setdefault(trace.name, [0, 0])
+            totals[0] += 1
+            totals[1] += trace.error is not None
+        if self.path:
+            self.write(self.path)
+
+    def as_dict(self) -> dict:
+        with self._data_lock:
+            return {
+                "instance": self.instance,
+                "started_at": self.started_at,
+                "updated_at": time.time(),
+                "buckets": list(BUCKETS),
+                "stages": {name: {"buckets": values[:-2], "count": values[-2], "sum": values[-1]}
+                           for name, values in self._stages.items()},
+                "counters": [{"name": name, "trace": trace, "value": value}
+                             for (name, trace), value in self._counters.items()],
+                "traces": {name: {"count": count, "errors": errors}
+                           for name, (count, errors) in self._traces.items()},
+            }
+
+    def prometheus(self) -> str:
+        data = self.as_dict()
+        lines = [
+            "# HELP dsa_stage_seconds Time spent in each request stage",
+            "# TYPE dsa_stage_seconds histogram",
+        ]
+        for name, stage in data["stages"].items():
+            for bound, count in zip(BUCKETS, stage["buckets"]):
+                lines.append(f'dsa_stage_seconds_bucket{{stage="{name}",le="{bound:g}"}} {count}')
+            lines.append(f'dsa_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'dsa_stage_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+            lines.append(f'dsa_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        # Each family is one block: HELP, TYPE, then all of its samples
+        for family, key, help_text in (("dsa_requests_total", "count", "Traced requests by kind"),
+                                       ("dsa_request_errors_total", "errors", "Traced requests that raised, by kind")):
+            lines += [f"# HELP {family} {help_text}", f"# TYPE {family} counter"]
+            for name, totals in data["traces"].items():
+                lines.append(f'{family}{{trace="{name}"}} {totals[key]}')
+        names = sorted({counter["name"] for counter in data["counters"]})
+        for name in names:
+            lines += [f"# HELP dsa_{name}_total Count of {name.replace('_', ' ')} by trace",
+                      f"# TYPE dsa_{name}_total counter"]
+            for counter in data["counters"]:
+                if counter["name"] == name:
+                    lines.append(f'dsa_{name}_total{{trace="{counter["trace"]}"}} {counter["value"]:g}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Replace path atomically with the current metrics"""
+        text = self.prometheus() if path.endswith(".prom") else json.dumps(self.as_dict(), indent=2)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    def _handler(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/metrics":
+                    body, content_type = registry.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path.rstrip("/") == "/metrics.json":
+                    body, content_type = json.dumps(registry.as_dict()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
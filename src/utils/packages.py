@@ -0,0 +1,165 @@
+import glob
+import importlib
+import importlib.metadata
+import importlib.util
+import os
+import re
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+
+# Import names whose distribution name differs, for packages that are not
+# installed (installed ones are found through importlib.metadata)
+BUNDLED_DISTRIBUTIONS = {
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "cv2": "opencv-python",
+    "PIL": "Pillow",
+    "yaml": "PyYAML",
+    "bs4": "beautifulsoup4",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "docx": "python-docx",
+    "pptx": "python-pptx",
+    "Crypto": "pycryptodome",
+    "google.generativeai": "google-generativeai",
+    "lightgbm": "lightgbm",
+    "xgboost": "xgboost",
+    "catboost": "catboost",
+    "statsmodels": "statsmodels",
+    "pmdarima": "pmdarima",
+    "prophet": "prophet",
+    "umap": "umap-learn",
+    "hdbscan": "hdbscan",
+    "wordcloud": "wordcloud",
+    "nltk": "nltk",
+    "gensim": "gensim",
+    "shap": "shap",
+    "missingno": "missingno",
+    "plotly": "plotly",
+    "seaborn": "seaborn",
+    "scipy": "scipy",
+    "tabulate": "tabulate",
+    "pyarrow": "pyarrow",
+    "openpyxl": "openpyxl",
+}
+
+
+class MissingPackageError(ImportError):
+    """Raised by generated code execution when an import cannot be satisfied"""
+
+    def __init__(self, module: str):
+        self.module = module
+        super().__init__(f"No module named '{module}'")
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class PackageResolver:
+    """Resolves import names to distributions without network access.
+
+    Lookups consult the installed distributions (importlib.metadata), then
+    the bundled mapping, then the wheels in ``wheelhouse``. Positive and
+    negative results are cached until a background install finishes.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, wheelhouse: Optional[str] = None):
+        self.wheelhouse = wheelhouse
+        self._cache = {}
+        self._installed = None
+        self._wheels = None
+        self._installs = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="package-install")
+        self._state_lock = threading.Lock()
+
+    @classmethod
+    def get_resolver(cls) -> "PackageResolver":
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(wheelhouse=os.getenv("PACKAGE_WHEELHOUSE") or None)
+            return cls._instance
+
+    def _installed_map(self) -> dict:
+        if self._installed is None:
+            self._installed = {
+                module: dists[0] for module, dists in importlib.metadata.packages_distributions().items()
+            }
+        return self._installed
+
+    def _wheel_names(self) -> dict:
+        """Normalized distribution name -> wheel file available in the wheelhouse"""
+        if self._wheels is None:
+            self._wheels = {}
+            if self.wheelhouse and os.path.isdir(self.wheelhouse):
+                for path in glob.glob(os.path.join(self.wheelhouse, "*.whl")):
+                    self._wheels[_normalize(os.path.basename(path).split("-")[0])] = path
+        return self._wheels
+
+    def resolve(self, module: str) -> Optional[str]:
+        """Distribution providing ``module`` (dotted import name), or None if unknown"""
+        with self._state_lock:
+            if module in self._cache:
+                return self._cache[module]
+            top_level = module.split(".")[0]
+            # Full dotted names first: namespace packages such as 'google'
+            # are shared by many distributions
+            distribution = (
+                BUNDLED_DISTRIBUTIONS.get(module) if module != top_level else None
+            ) or self._installed_map().get(top_level) or BUNDLED_DISTRIBUTIONS.get(top_level)
+            if distribution is None and _normalize(top_level) in self._wheel_names():
+                distribution = top_level
+            self._cache[module] = distribution
+            return distribution
+
+    @staticmethod
+    def is_importable(module: str) -> bool:
+        try:
+            return importlib.util.find_spec(module) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def can_install(self, distribution: str) -> bool:
+        """True if the wheelhouse holds a wheel for the distribution"""
+        return _normalize(distribution) in self._wheel_names()
+
+    def install_async(self, distribution: str) -> Future:
+        """Install from the local wheelhouse in a background thread.
+
+        Repeated calls for the same distribution share one install.
+        """
+        with self._state_lock:
+            future = self._installs.get(distribution)
+            if future is not None and (not future.done() or future.exception() is None):
+                return future
+            future = self._executor.submit(self._install, distribution)
+            self._installs[distribution] = future
+            return future
+
+    def install_status(self, distribution: str) -> Optional[str]:
+        """'installing', 'installed', 'failed' or None if never requested"""
+        future = self._installs.get(distribution)
+        if future is None:
+            return None
+        if not future.done():
+            return "installing"
+        return "failed" if future.exception() else "installed"
+
+    def _install(self, distribution: str) -> None:
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", "--no-index", "--find-links", self.wheelhouse, distribution],
+            check=True,
+            capture_output=True,
+            timeout=600,
+        )
+        importlib.invalidate_caches()
+        with self._state_lock:
+            self._cache.clear()
+            self._installed = None
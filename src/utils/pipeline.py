@@ -0,0 +1,698 @@
+import ast
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, NamedTuple, Optional
+
+import pandas as pd
+
+from utils import metrics
+from utils.code_transform import call_name, strip_code_fences
+from utils.dtypes import optimize_dtypes, optimize_enabled
+from utils.figures import FigureBudget
+from utils.fingerprint import FrameFingerprint, describe_changes, diff_fingerprints, frame_fingerprint
+from utils.packages import MissingPackageError
+
+
+# Plotting calls whose arguments name columns of a frame passed to them, and those arguments
+_COLUMN_PLOTS = ('px.', 'plotly.express.', 'sns.', 'seaborn.')
+_PLOT_COLUMN_ARGUMENTS = {
+    'x', 'y', 'z', 'color', 'size', 'symbol', 'text', 'names', 'values', 'parents', 'ids', 'path',
+    'facet_row', 'facet_col', 'hover_name', 'hover_data', 'custom_data', 'line_group', 'animation_frame',
+    'animation_group', 'dimensions', 'error_x', 'error_y', 'lat', 'lon', 'hue', 'style', 'row', 'col',
+    'weights', 'units',
+}
+# df.groupby(keys)[columns] reads the keys and the selected columns only
+_GROUPING = {'groupby'}
+
+
+class StepInfo(NamedTuple):
+    """Columns of ``df`` a piece of generated code reads and writes.
+
+    ``reads`` is None when the code depends on the whole frame (its shape,
+    every column, or columns named at run time); ``writes`` is None when it
+    may change any column or the rows.
+    """
+    reads: Optional[frozenset]
+    writes: Optional[frozenset]
+
+
+def _is_df(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == 'df'
+
+
+def _strings(node: ast.AST) -> Optional[list]:
+    """Column names of a string constant or a list/tuple of them; None for anything else"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)) and node.elts and all(
+            isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts):
+        return [e.value for e in node.elts]
+    return None
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.AST]:
+    for keyword in call.keywords:
+        if keyword.arg == name:
+            return keyword.value
+    return None
+
+
+def _dropped_columns(call: ast.Call) -> Optional[list]:
+    """Columns removed by df.drop(...), or None if it may drop rows or names them at run time"""
+    columns = _keyword(call, 'columns')
+    if columns is not None:
+        return _strings(columns)
+    axis = _keyword(call, 'axis')
+    if call.args and isinstance(axis, ast.Constant) and axis.value in (1, 'columns'):
+        return _strings(call.args[0])
+    return None
+
+
+def _renamed_columns(call: ast.Call) -> Optional[list]:
+    """Old and new names of df.rename(columns={...}) with constant names"""
+    mapping = _keyword(call, 'columns')
+    if not isinstance(mapping, ast.Dict) or None in mapping.keys:
+        return None
+    names = [_strings(node) for node in mapping.keys + mapping.values]
+    if any(name is None or len(name) != 1 for name in names):
+        return None
+    return [name[0] for name in names]
+
+
+class _Analyzer(ast.NodeVisitor):
+    """Collects the columns of df read and written by generated code; see analyze_code"""
+
+    def __init__(self):
+        self.reads = set()
+        self.writes = set()
+        self.reads_all = False
+        self.writes_all = False
+
+    # Writes
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self._write_target(target, rebound=True)
+        if any(_is_df(target) for target in node.targets):
+            self._rebind(node.value)
+        else:
+            self.visit(node.value)
+
+    def visit_AnnAssign(self, node):
+        self._write_target(node.target, rebound=node.value is not None)
+        if node.value is not None:
+            if _is_df(node.target):
+                self._rebind(node.value)
+            else:
+                self.visit(node.value)
+
+    def visit_AugAssign(self, node):
+        # df['x'] += 1 reads x as well
+        if _is_df(node.target):
+            self.reads_all = self.writes_all = True
+        else:
+            self._write_target(node.target)
+            columns = self._target_columns(node.target)
+            if columns:
+                self.reads.update(columns)
+        self.visit(node.value)
+
+    def visit_Delete(self, node):
+        for target in node.targets:
+            self._write_target(target)
+
+    def visit_For(self, node):
+        self._write_target(node.target)
+        self.visit(node.iter)
+        for statement in node.body + node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_withitem(self, node):
+        self.visit(node.context_expr)
+        if node.optional_vars is not None:
+            self._write_target(node.optional_vars)
+
+    def visit_NamedExpr(self, node):
+        self._write_target(node.target)
+        self.visit(node.value)
+
+    def _target_columns(self, target: ast.AST) -> Optional[list]:
+        """Columns of df['x'], df[['x', 'y']], df.loc[rows, 'x'] and df.at[row, 'x'] targets"""
+        if not isinstance(target, ast.Subscript):
+            return None
+        if _is_df(target.value):
+            return _strings(target.slice)
+        if (isinstance(target.value, ast.Attribute) and _is_df(target.value.value)
+                and target.value.attr in ('loc', 'at')
+                and isinstance(target.slice, ast.Tuple) and len(target.slice.elts) == 2):
+            return _strings(target.slice.elts[1])
+        return None
+
+    def _write_target(self, target: ast.AST, rebound: bool = False) -> None:
+        if _is_df(target):
+            # For df = value, _rebind looks at the value; for loops, with and del replace the frame
+            if not rebound:
+                self.writes_all = True
+            return
+        if isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                if _is_df(element):
+                    self.writes_all = True
+                else:
+                    self._write_target(element)
+            return
+        if isinstance(target, ast.Starred):
+            self._write_target(target.value)
+            return
+        root = target
+        while isinstance(root, (ast.Subscript, ast.Attribute)):
+            root = root.value
+        if not _is_df(root):
+            self.visit(target)
+            return
+        columns = self._target_columns(target)
+        if columns is None:
+            # df.iloc[...] = ..., df.columns = ..., df[mask] = ..., df[cols] = ...
+            self.writes_all = True
+            self.visit(target.slice if isinstance(target, ast.Subscript) else target)
+            return
+        self.writes.update(columns)
+        if isinstance(target.slice, ast.Tuple):
+            rows = target.slice.elts[0]
+            if not (isinstance(rows, ast.Slice) and rows.lower is None and rows.upper is None and rows.step is None):
+                # df.loc[mask, 'x'] = ...: the rows not selected keep their old x
+                self.reads.update(columns)
+            self.visit(rows)
+
+    def _rebind(self, value: ast.AST) -> None:
+        """df = value: only df.assign/drop/rename keep the rows and other columns"""
+        if (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                and _is_df(value.func.value) and self._column_method(value)):
+            return
+        self.writes_all = True
+        self.visit(value)
+
+    def _column_method(self, call: ast.Call) -> bool:
+        """Record df.assign/drop/rename/insert/pop calls with constant names; False for other calls"""
+        method = call.func.attr
+        if method == 'assign' and not call.args and all(k.arg for k in call.keywords):
+            self.writes.update(k.arg for k in call.keywords)
+            for keyword in call.keywords:
+                self.visit(keyword.value)
+            return True
+        if method == 'drop':
+            columns = _dropped_columns(call)
+        elif method == 'rename':
+            columns = _renamed_columns(call)
+            if columns:
+                self.reads.update(columns[:len(columns) // 2])
+        elif method == 'insert' and len(call.args) >= 3:
+            columns = _strings(call.args[1])
+            if columns:
+                self.visit(call.args[2])
+        elif method == 'pop' and call.args:
+            columns = _strings(call.args[0])
+            if columns:
+                self.reads.update(columns)
+        else:
+            return False
+        if not columns:
+            return False
+        self.writes.update(columns)
+        return True
+
+    # Reads
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Attribute) and _is_df(func.value):
+            inplace = _keyword(node, 'inplace')
+            modifies = (isinstance(inplace, ast.Constant) and inplace.value is True) or func.attr in ('insert', 'pop')
+            if modifies:
+                if func.attr in ('drop', 'rename', 'insert', 'pop') and self._column_method(node):
+                    return
+                self.writes_all = True
+        name = call_name(func)
+        frame_arguments = [arg for arg in node.args if _is_df(arg)] + \
+            [k.value for k in node.keywords if _is_df(k.value)]
+        if name.startswith(_COLUMN_PLOTS) and frame_arguments:
+            # px.scatter(df, x='price', color='region') reads price and region
+            for keyword in node.keywords:
+                if _is_df(keyword.value):
+                    continue
+                if keyword.arg not in _PLOT_COLUMN_ARGUMENTS:
+                    self.visit(keyword.value)
+                    continue
+                columns = _strings(keyword.value)
+                if columns is not None:
+                    self.reads.update(columns)
+                elif not (isinstance(keyword.value, ast.Constant) and keyword.value.value is None):
+                    self.reads_all = True
+            for arg in node.args:
+                columns = _strings(arg)
+                if columns is not None:
+                    self.reads.update(columns)
+                elif not _is_df(arg):
+                    self.visit(arg)
+            return
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        value = node.value
+        if _is_df(value):
+            columns = _strings(node.slice)
+            if columns is not None:
+                self.reads.update(columns)
+                return
+        elif (isinstance(value, ast.Attribute) and _is_df(value.value) and value.attr in ('loc', 'at')
+              and isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2):
+            columns = _strings(node.slice.elts[1])
+            if columns is not None:
+                self.reads.update(columns)
+                self.visit(node.slice.elts[0])
+                return
+        elif (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+              and _is_df(value.func.value) and value.func.attr in _GROUPING):
+            columns = _strings(node.slice)
+            keys = _strings(value.args[0]) if value.args else _strings(_keyword(value, 'by'))
+            if columns is not None and keys is not None:
+                self.reads.update(columns + keys)
+                for keyword in value.keywords:
+                    if keyword.arg != 'by':
+                        self.visit(keyword.value)
+                return
+        self.generic_visit(node)
+
+    def visit_Name(self, node):
+        # df used as a whole: df.describe(), len(df), df.shape, f(df), ...
+        if node.id == 'df':
+            if isinstance(node.ctx, ast.Load):
+                self.reads_all = True
+            else:
+                self.writes_all = True
+
+    def visit_Global(self, node):
+        if 'df' in node.names:
+            self.reads_all = self.writes_all = True
+
+
+@lru_cache(maxsize=512)
+def analyze_code(code: str) -> StepInfo:
+    """Columns of df that generated code reads and writes, from its syntax tree.
+
+    Constant column names in df['x'], df[['x', 'y']], df.loc[rows, 'x'],
+    df.groupby('k')['x'], df.assign/drop/rename/insert/pop and the
+    keyword arguments of Plotly Express and seaborn calls are tracked; any
+    other use of df counts as reading (or, as an assignment target, writing)
+    the whole frame. Code that does not parse reads and writes everything.
+    """
+    try:
+        tree = ast.parse(strip_code_fences(code))
+    except SyntaxError:
+        return StepInfo(None, None)
+    analyzer = _Analyzer()
+    analyzer.visit(tree)
+    return StepInfo(
+        reads=None if analyzer.reads_all else frozenset(analyzer.reads),
+        writes=None if analyzer.writes_all else frozenset(analyzer.writes),
+    )
+
+
+def _format_columns(columns: Optional[frozenset]) -> str:
+    if columns is None:
+        return "all columns"
+    return ", ".join(sorted(map(str, columns))) or "nothing"
+
+
+class Step(NamedTuple):
+    """One recorded operation of a Pipeline"""
+    number: int          # 1-based position
+    code: str
+    request: Optional[str]
+    info: StepInfo
+    after: tuple         # numbers of the steps whose output it reads
+
+    def describe(self) -> str:
+        text = f"reads {_format_columns(self.info.reads)}; writes {_format_columns(self.info.writes)}"
+        if self.after:
+            text += "; after step " + ", ".join(map(str, self.after))
+        return text
+
+
+class StepResult(NamedTuple):
+    step: Step
+    status: str                  # "ran", "skipped" (memoized) or "failed"
+    output: str
+    figures: list                # (kind, figure, note) triples as run_code returns them
+    plots_created: int
+    data_changes: Optional[str]
+    error: Optional[str]
+    seconds: float
+
+
+class ReplayResult(NamedTuple):
+    frame: pd.DataFrame          # the data after the last step that succeeded
+    fingerprint: FrameFingerprint
+    steps: list                  # StepResult per step run, up to the first failure
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.steps) and self.steps[-1].status == "failed"
+
+    def count(self, status: str) -> int:
+        return sum(1 for result in self.steps if result.status == status)
+
+
+def _dependencies(infos: list) -> list:
+    """Numbers of the earlier steps each step depends on: the last writer of every column it reads"""
+    writers = {}           # column -> step number
+    frame_writer = None    # last step that may have changed every column
+    dependencies = []
+    for number, info in enumerate(infos, 1):
+        if info.reads is None:
+            after = set(writers.values())
+        else:
+            after = {writers[col] for col in info.reads if col in writers}
+        if frame_writer is not None:
+            after.add(frame_writer)
+        dependencies.append(tuple(sorted(after)))
+        if info.writes is None:
+            frame_writer = number
+            writers.clear()
+        else:
+            for col in info.writes:
+                writers[col] = number
+    return dependencies
+
+
+class _MemoEntry:
+    """Result of one step on one input: the columns it wrote (or the whole frame), output and figures"""
+
+    __slots__ = ("columns", "removed", "order", "frame", "fingerprint", "output", "figures",
+                 "plots_created", "bytes")
+
+    def __init__(self, output: str, figures: Optional[list], plots_created: int):
+        self.columns = {}         # written column -> Series after the step
+        self.removed = ()         # written columns the step deleted
+        self.order = None         # column order after the step
+        self.frame = None         # the whole frame, for steps that change rows or unknown columns
+        self.fingerprint = None   # fingerprint after the step (columns only, for column entries)
+        self.output = output
+        self.figures = figures
+        self.plots_created = plots_created
+        self.bytes = 0
+
+    @property
+    def complete(self) -> bool:
+        """Whether the step can be skipped; figures are not kept for steps recorded in the app"""
+        return self.figures is not None or not self.plots_created
+
+    def apply(self, df: pd.DataFrame, fingerprint: FrameFingerprint) -> tuple[pd.DataFrame, FrameFingerprint]:
+        """The frame and fingerprint after the step, given those before it"""
+        if self.frame is not None:
+            return self.frame, self.fingerprint
+        if not self.columns and not self.removed:
+            return df, fingerprint
+        frame = df.drop(columns=list(self.removed)) if self.removed else df.copy(deep=False)
+        for col, series in self.columns.items():
+            frame[col] = series
+        frame = frame[list(self.order)]
+        frame.attrs = df.attrs
+        columns = {col: self.fingerprint.columns[col] if col in self.columns else fingerprint.columns[col]
+                   for col in self.order}
+        dtypes = {col: self.fingerprint.dtypes[col] if col in self.columns else fingerprint.dtypes[col]
+                  for col in self.order}
+        return frame, fingerprint._replace(columns=columns, dtypes=dtypes)
+
+
+def _figure_bytes(figures: Optional[list]) -> int:
+    return sum(len(figure) for _, figure, _ in figures or () if isinstance(figure, (str, bytes)))
+
+
+class StepMemo:
+    """LRU cache of step results keyed by the step's code and the content of the columns it reads.
+
+    A step whose code and read columns (plus the row index and column
+    names) match an earlier run is not executed again: its written columns,
+    output and figures are taken from the memo. When a run changes more
+    than the static analysis predicted, the step's code is keyed by the
+    whole frame from then on. Entries beyond ``memory_budget_mb`` are
+    evicted, least recently used first.
+    """
+
+    def __init__(self, memory_budget_mb: int = 256):
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self._entries = OrderedDict()
+        self._opaque = set()       # code whose analysis missed a write
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "StepMemo":
+        return cls(memory_budget_mb=int(os.getenv("PIPELINE_MEMO_MB", "256")))
+
+    def key(self, code: str, fingerprint: FrameFingerprint) -> str:
+        code = strip_code_fences(code)
+        info = StepInfo(None, None) if code in self._opaque else analyze_code(code)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(code.encode("utf-8"))
+        h.update(b"".join(fingerprint.index))
+        h.update(repr(list(fingerprint.columns)).encode())
+        if info.reads is None:
+            h.update(fingerprint.token.encode())
+        else:
+            for col in sorted(info.reads, key=str):
+                h.update(repr(col).encode())
+                h.update(fingerprint.column_token(col).encode() if col in fingerprint.columns else b"-")
+        return h.hexdigest()
+
+    def get(self, code: str, fingerprint: FrameFingerprint) -> Optional[_MemoEntry]:
+        key = self.key(code, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.complete:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def record(self, code: str, before: FrameFingerprint, frame: pd.DataFrame, after: FrameFingerprint,
+               output: str, plots_created: int, figures: Optional[list] = None) -> None:
+        """Remember what code did to the frame with fingerprint ``before``.
+
+        ``frame`` and ``after`` are the data after the step; ``figures`` is
+        None when they were not kept, and the step then runs again if it
+        made plots.
+        """
+        code = strip_code_fences(code)
+        info = analyze_code(code)
+        diff = diff_fingerprints(before, after)
+        touched = set(diff.changed_columns) | set(diff.removed) | set(diff.type_changes)
+        entry = _MemoEntry(output, figures, plots_created)
+        if (info.writes is not None and code not in self._opaque and not diff.index_changed
+                and before.rows == after.rows and touched <= info.writes):
+            entry.columns = {col: frame[col] for col in info.writes if col in after.columns}
+            entry.removed = tuple(col for col in info.writes if col in before.columns and col not in after.columns)
+            entry.order = tuple(after.columns)
+            entry.fingerprint = after
+            entry.bytes = sum(int(series.memory_usage(deep=True, index=False)) for series in entry.columns.values())
+        else:
+            if info.writes is not None:
+                # The analysis missed a write: key this code by the whole frame
+                self._opaque.add(code)
+            entry.frame, entry.fingerprint = frame, after
+            entry.bytes = int(frame.memory_usage(deep=True).sum())
+        entry.bytes += _figure_bytes(figures)
+        key = self.key(code, before)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.bytes
+            self._entries[key] = entry
+            self._bytes += entry.bytes
+            while self._bytes > self.memory_budget and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def _indent(code: str, prefix: str = "    ") -> str:
+    return "\n".join(prefix + line if line.strip() else "" for line in code.splitlines())
+
+
+_SCRIPT_HEADER = '''"""Data pipeline exported from the Data Science Academy Assistant.
+
+Recorded on {file_path}. Replays the {count} operations on another file with
+the same columns, e.g. next week's export:
+
+    python pipeline.py DATA_FILE [OUTPUT_FILE]
+"""
+import os
+import sys
+
+import pandas as pd
+
+pd.set_option("mode.copy_on_write", True)
+
+READERS = {{
+    ".csv": pd.read_csv,
+    ".tsv": lambda path: pd.read_csv(path, sep="\\t"),
+    ".json": pd.read_json,
+    ".jsonl": lambda path: pd.read_json(path, lines=True),
+    ".parquet": pd.read_parquet,
+    ".feather": pd.read_feather,
+    ".xlsx": pd.read_excel,
+    ".xls": pd.read_excel,
+    ".pkl": pd.read_pickle,
+    ".pickle": pd.read_pickle,
+}}
+WRITERS = {{
+    ".csv": lambda df, path: df.to_csv(path, index=False),
+    ".xlsx": lambda df, path: df.to_excel(path, index=False),
+    ".pkl": pd.DataFrame.to_pickle,
+    ".pickle": pd.DataFrame.to_pickle,
+}}
+'''
+
+_SCRIPT_MAIN = '''
+
+STEPS = [{steps}]
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    df = READERS.get(os.path.splitext(sys.argv[1])[1].lower(), pd.read_csv)(sys.argv[1])
+    for step in STEPS:
+        df = step(df)
+    if len(sys.argv) > 2:
+        WRITERS.get(os.path.splitext(sys.argv[2])[1].lower(), pd.DataFrame.to_parquet)(df, sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+class Pipeline:
+    """The code of the operations that led to the current data, as a graph of column dependencies.
+
+    Built from the execution history: each step is the code the model
+    generated for one request, with the columns it reads and writes (see
+    analyze_code). Steps run in their recorded order; ``Step.after`` names
+    the earlier steps whose output they read.
+    """
+
+    def __init__(self, steps: list):
+        self.steps = steps
+
+    @classmethod
+    def from_codes(cls, codes: list, requests: Optional[list] = None) -> "Pipeline":
+        codes = [strip_code_fences(code) for code in codes]
+        infos = [analyze_code(code) for code in codes]
+        requests = requests or [None] * len(codes)
+        return cls([Step(number, code, request, info, after)
+                    for number, (code, request, info, after)
+                    in enumerate(zip(codes, requests, infos, _dependencies(infos)), 1)])
+
+    @classmethod
+    def from_history(cls, history: list, lineage: Optional[list] = None) -> "Pipeline":
+        """Steps of the execution history that led to the current version.
+
+        ``lineage`` is VersionStore.lineage(); operations on versions that
+        were undone and replaced are left out. Operations older than the
+        oldest version kept are assumed to lead to it.
+        """
+        entries = [entry for entry in history if entry.get('code')]
+        if lineage:
+            kept = set(lineage)
+            entries = [entry for entry in entries
+                       if entry.get('version') is None or entry['version'] in kept or entry['version'] < lineage[0]]
+        return cls.from_codes([entry['code'] for entry in entries], [entry.get('request') for entry in entries])
+
+    def replay(self, df: pd.DataFrame, fingerprint: Optional[FrameFingerprint] = None,
+               memo: Optional[StepMemo] = None, run: Optional[Callable] = None,
+               figure_budget: Optional[FigureBudget] = None,
+               on_step: Optional[Callable[[StepResult, pd.DataFrame, FrameFingerprint], None]] = None) -> ReplayResult:
+        """Run every step on df without calling the model; stops at the first step that fails.
+
+        Steps found in ``memo`` are skipped. Other steps run with ``run``
+        (sandbox.run_code by default) and their dtypes are compacted as in
+        the app. ``on_step`` receives each result with the frame and
+        fingerprint after it.
+        """
+        if run is None:
+            from utils.sandbox import run_code as run
+        if fingerprint is None:
+            fingerprint = frame_fingerprint(df)
+        results = []
+        for step in self.steps:
+            started = time.perf_counter()
+            entry = memo.get(step.code, fingerprint) if memo is not None else None
+            if entry is not None:
+                frame, after = entry.apply(df, fingerprint)
+                status, output, figures, plots_created = "skipped", entry.output, entry.figures, entry.plots_created
+                metrics.count("steps_skipped")
+            else:
+                notices = []
+                try:
+                    with metrics.span("exec", step=step.number, rows=len(df)):
+                        frame, execution_results, figures = run(step.code, df.copy(deep=False),
+                                                                notify=notices.append, figure_budget=figure_budget)
+                except MissingPackageError as e:
+                    error = f"The code needs '{e.module}', which is not installed"
+                except Exception as e:
+                    error = str(e)
+                else:
+                    error = None
+                if error is not None:
+                    results.append(StepResult(step, "failed", "\n".join(notices), [], 0, None, error,
+                                              time.perf_counter() - started))
+                    break
+                if optimize_enabled():
+                    frame, _ = optimize_dtypes(frame)
+                after = frame_fingerprint(frame)
+                status, output, plots_created = "ran", execution_results['output'], execution_results['plots_created']
+                metrics.count("steps_run")
+                if memo is not None:
+                    memo.record(step.code, fingerprint, frame, after, output, plots_created, figures)
+            result = StepResult(step, status, output, figures, plots_created,
+                                describe_changes(diff_fingerprints(fingerprint, after)), None,
+                                time.perf_counter() - started)
+            results.append(result)
+            df, fingerprint = frame, after
+            if on_step is not None:
+                on_step(result, df, fingerprint)
+        return ReplayResult(df, fingerprint, results)
+
+    def to_script(self, file_path: Optional[str] = None) -> str:
+        """A standalone Python script (pandas only) that runs the steps on a file given on the command line"""
+        parts = [_SCRIPT_HEADER.format(file_path=file_path or "the uploaded data", count=len(self.steps))]
+        for step in self.steps:
+            comment = f"    # {step.describe()}\n"
+            if step.request:
+                comment = f"    # Request: {' '.join(step.request.split())}\n" + comment
+            function = f"\n\ndef step_{step.number}(df):\n{comment}{_indent(step.code)}\n    return df\n"
+            try:
+                compile(function, f"step_{step.number}", "exec")
+            except SyntaxError:
+                # e.g. star imports, which only work at module level: run the code as the app does
+                function = (f"\n\ndef step_{step.number}(df):\n{comment}"
+                            f"    namespace = {{'pd': pd, 'df': df}}\n"
+                            f"    exec({step.code!r}, namespace)\n"
+                            f"    return namespace['df']\n")
+            parts.append(function)
+        parts.append(_SCRIPT_MAIN.format(steps=", ".join(f"step_{step.number}" for step in self.steps)))
+        return "".join(parts)
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Hashable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_float_dtype, is_numeric_dtype
+
+from utils.dtypes import logical_dtypes
+from utils.fingerprint import FrameFingerprint, frame_fingerprint
+
+
+TOP_K = 10
+HISTOGRAM_BINS = 20
+CORRELATION_MAX_COLUMNS = 100
+
+
+class ColumnProfile(NamedTuple):
+    """Statistics of one column; ``stats`` is empty and ``histogram`` None for non-numeric columns"""
+    dtype: str
+    non_null: int
+    nulls: int
+    unique: Optional[int]        # None for float columns, which are not value-counted
+    stats: dict                  # mean, std, min, 25%, 50%, 75%, max (min/max only for datetimes)
+    top: list                    # (value, count) of the most frequent values
+    histogram: Optional[tuple]   # (counts, bin edges) of the finite values
+
+
+class DataProfile(NamedTuple):
+    """Profile of one DataFrame version, keyed by its FrameFingerprint token"""
+    token: str
+    rows: int
+    columns: dict                # column -> ColumnProfile
+    correlation: Optional[pd.DataFrame]   # of the first CORRELATION_MAX_COLUMNS numeric columns
+    seconds: float
+    numeric_columns: int = 0     # all numeric columns, also those left out of the correlation
+
+
+def _is_number(series: pd.Series) -> bool:
+    return is_numeric_dtype(series.dtype) and not is_bool_dtype(series.dtype)
+
+
+def profile_column(series: pd.Series, dtype: str) -> ColumnProfile:
+    """Null counts, summary statistics, top values and histogram of one column"""
+    non_null = int(series.notna().sum())
+    stats = {}
+    histogram = None
+    if _is_number(series):
+        values = series.dropna().to_numpy(dtype=np.float64)
+        if len(values):
+            q25, q50, q75 = np.percentile(values, [25, 50, 75])
+            stats = {"mean": values.mean(), "std": values.std(ddof=1) if len(values) > 1 else np.nan,
+                     "min": values.min(), "25%": q25, "50%": q50, "75%": q75, "max": values.max()}
+            finite = values[np.isfinite(values)]
+            if len(finite):
+                counts, edges = np.histogram(finite, bins=HISTOGRAM_BINS)
+                histogram = (counts.tolist(), edges.tolist())
+    elif is_datetime64_any_dtype(series.dtype) and non_null:
+        stats = {"min": series.min(), "max": series.max()}
+
+    unique = None
+    top = []
+    if not is_float_dtype(series.dtype):
+        try:
+            counts = series.value_counts()
+        except TypeError:  # unhashable objects such as lists
+            counts = None
+        if counts is not None:
+            counts = counts[counts > 0]
+            unique = len(counts)
+            top = [(value, int(count)) for value, count in counts.head(TOP_K).items()]
+    return ColumnProfile(dtype=dtype, non_null=non_null, nulls=len(series) - non_null,
+                         unique=unique, stats=stats, top=top, histogram=histogram)
+
+
+# ColumnProfile keyed by FrameFingerprint.column_token, correlation matrices
+# by the tokens of their columns: a new version only profiles what changed
+_column_profiles = OrderedDict()
+_correlations = OrderedDict()
+MAX_CACHED_PROFILES = 4096
+MAX_CACHED_CORRELATIONS = 8
+_cache_lock = threading.Lock()
+
+
+def _cached(cache: OrderedDict, key, limit: int, compute):
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    value = compute()
+    with _cache_lock:
+        cache[key] = value
+        while len(cache) > limit:
+            cache.popitem(last=False)
+    return value
+
+
+def profile_frame(df: pd.DataFrame, fingerprint: Optional[FrameFingerprint] = None) -> DataProfile:
+    """Profile every column of df and correlate up to CORRELATION_MAX_COLUMNS numeric columns"""
+    started = time.perf_counter()
+    fingerprint = fingerprint or frame_fingerprint(df)
+    cacheable = not df.columns.has_duplicates
+    columns = {}
+    for position, (col, dtype) in enumerate(zip(df.columns, logical_dtypes(df))):
+        series = df.iloc[:, position]
+        if cacheable:
+            columns[col] = _cached(_column_profiles, fingerprint.column_token(col), MAX_CACHED_PROFILES,
+                                   lambda: profile_column(series, dtype))
+        else:
+            columns[col] = profile_column(series, dtype)
+
+    numeric = [col for position, col in enumerate(df.columns) if _is_number(df.iloc[:, position])]
+    numeric_columns = len(numeric)
+    numeric = numeric[:CORRELATION_MAX_COLUMNS]
+    correlation = None
+    if cacheable and len(numeric) >= 2:
+        key = tuple((col, fingerprint.column_token(col)) for col in numeric)
+        correlation = _cached(_correlations, key, MAX_CACHED_CORRELATIONS,
+                              lambda: df[numeric].astype(np.float64).corr())
+    return DataProfile(token=fingerprint.token, rows=len(df), columns=columns,
+                       correlation=correlation, seconds=time.perf_counter() - started,
+                       numeric_columns=numeric_columns)
+
+
+class Profiler:
+    """Profiles DataFrame versions on a background thread.
+
+    Profiles are shared by all sessions and keyed by fingerprint token.
+    Submitting a new version cancels the profiles its owner (a session)
+    submitted that are still queued and no other owner asked for, so each
+    session only waits for its latest version; ``max_profiles`` bounds the
+    rest.
+    """
+
+    _instance = None
+    # Sessions run in their own threads and may ask for the shared profiler at once
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_profiles: int = 8):
+        self.max_profiles = max_profiles
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler")
+        self._futures = OrderedDict()
+        self._owners = {}       # token -> owners that submitted it; None never gives it up
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_profiler(cls) -> Optional["Profiler"]:
+        """Shared profiler, or None when PROFILE_ENABLED=0"""
+        if os.getenv("PROFILE_ENABLED", "1").lower() in ("0", "false", "no", "off"):
+            return None
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(max_profiles=int(os.getenv("PROFILE_CACHE_SIZE", "8")))
+            return cls._instance
+
+    def submit(self, df: pd.DataFrame, fingerprint: FrameFingerprint, owner: Optional[Hashable] = None) -> Future:
+        """Start profiling df unless a profile of the same content exists or is queued.
+
+        Profiles still queued for ``owner`` alone are cancelled; without an
+        owner nothing is cancelled.
+        """
+        with self._lock:
+            token = fingerprint.token
+            future = self._futures.get(token)
+            if future is not None and not future.cancelled():
+                self._futures.move_to_end(token)
+                self._owners[token].add(owner)
+                return future
+            if owner is not None:
+                for queued_token, queued in self._futures.items():
+                    owners = self._owners[queued_token]
+                    if owner in owners:
+                        owners.discard(owner)
+                        if not owners:
+                            queued.cancel()
+            for cancelled in [t for t, f in self._futures.items() if f.cancelled()]:
+                del self._futures[cancelled], self._owners[cancelled]
+            future = self._executor.submit(profile_frame, df, fingerprint)
+            self._futures[token] = future
+            self._owners[token] = {owner}
+            while len(self._futures) > self.max_profiles:
+                evicted, _ = self._futures.popitem(last=False)
+                del self._owners[evicted]
+            return future
+
+    def get(self, token: str, wait: float = 0.0) -> Optional[DataProfile]:
+        """Profile of the frame with this fingerprint token, waiting up to ``wait`` seconds for it"""
+        with self._lock:
+            future = self._futures.get(token)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=wait)
+        except TimeoutError:
+            return None
+        except Exception:
+            # Profiling failed (e.g. out of memory); callers fall back to the LLM
+            return None
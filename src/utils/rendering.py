@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import pandas as pd
+import streamlit as st
+
+from utils import metrics
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pages are passed to Streamlit as pandas
+    pa = None
+
+
+PAGE_SIZES = (10, 50, 100, 500, 1000)
+SAMPLE_THRESHOLD = 1_000_000
+MAX_CACHED_PAGES = 32
+
+
+def _to_arrow(page: pd.DataFrame) -> Any:
+    """Serialize a page once; Streamlit falls back to its own fixes if Arrow rejects it"""
+    if pa is None:
+        return page
+    try:
+        return pa.Table.from_pandas(page, preserve_index=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return page
+
+
+def _count_rendered(page: Any) -> None:
+    if metrics.active():
+        nbytes = page.nbytes if hasattr(page, "nbytes") else int(page.memory_usage(deep=True).sum())
+        metrics.count("bytes_rendered", nbytes)
+
+
+def _page_cache() -> OrderedDict:
+    if '_page_cache' not in st.session_state:
+        st.session_state._page_cache = OrderedDict()
+    return st.session_state._page_cache
+
+
+def _slice(df: pd.DataFrame, start: int, size: int, sample: bool) -> pd.DataFrame:
+    if sample:
+        return df.sample(n=min(size, len(df)), random_state=0).sort_index()
+    return df.iloc[start:start + size]
+
+
+def get_page(df: pd.DataFrame, start: int, size: int, version: Optional[Hashable] = None,
+             sample: bool = False) -> Any:
+    """Arrow table for rows [start, start+size), or a random sample of ``size`` rows.
+
+    Pages are cached per session under ``version`` (the DataFrame version
+    the caller tracks), so reruns that did not change the data reuse the
+    already-converted page. Pages of older versions are dropped.
+    """
+    if version is None:
+        return _to_arrow(_slice(df, start, size, sample))
+
+    cache = _page_cache()
+    key = (version, 'sample' if sample else start, size)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    for stale in [k for k in cache if k[0] != version]:
+        del cache[stale]
+    cache[key] = _to_arrow(_slice(df, start, size, sample))
+    while len(cache) > MAX_CACHED_PAGES:
+        cache.popitem(last=False)
+    return cache[key]
+
+
+def render_dataframe(df: pd.DataFrame, version: Optional[Hashable], key: str) -> None:
+    """Show df one page at a time instead of sending the whole frame to the browser.
+
+    Frames above SAMPLE_THRESHOLD rows can also be browsed as a random
+    sample.
+    """
+    total = len(df)
+    controls = st.columns([1, 1, 2])
+    size = controls[0].selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = max((total + size - 1) // size, 1)
+    page_key = f"{key}_page"
+    # Carry the page over when the page count changes, clamped so a shrunk frame never shows an empty page
+    st.session_state[page_key] = min(int(st.session_state.get(page_key, 1)), pages)
+    page = controls[1].number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    sample = False
+    if total > SAMPLE_THRESHOLD:
+        sample = controls[2].toggle("Random sample", key=f"{key}_sample",
+                                    help="Show a random sample of rows instead of one page")
+
+    start = (int(page) - 1) * size
+    table = get_page(df, start, size, version=version, sample=sample)
+    _count_rendered(table)
+    st.dataframe(table)
+    if sample:
+        st.caption(f"Random sample of {min(size, total):,} of {total:,} rows × {len(df.columns)} columns")
+    else:
+        st.caption(f"Rows {start + 1:,}–{min(start + size, total):,} of {total:,} × {len(df.columns)} columns")
+
+
+def render_first_page(df: pd.DataFrame, rows: int = 100) -> None:
+    """Show only the first rows of df, e.g. right after an operation"""
+    table = get_page(df, 0, rows)
+    _count_rendered(table)
+    st.dataframe(table)
+    if len(df) > rows:
+        st.caption(f"First {rows:,} of {len(df):,} rows × {len(df.columns)} columns")
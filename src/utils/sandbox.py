@@ -0,0 +1,407 @@
+import ctypes
+import io
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+import pandas as pd
+
+from utils.dtypes import arrow_roundtrips
+from utils.figures import FigureBudget
+from utils.packages import MissingPackageError
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - frames are pickled instead
+    pa = None
+
+
+# Imported once per worker so generated code does not pay for them per request
+WARM_MODULES = (
+    "numpy", "pandas", "plotly.express", "plotly.graph_objects", "plotly.io",
+    "matplotlib.pyplot", "seaborn", "scipy", "sklearn",
+)
+
+
+class SandboxError(Exception):
+    """Raised when a worker is killed or fails outside the generated code"""
+
+
+class SandboxTimeout(SandboxError):
+    """Raised when generated code exceeds its wall-clock, CPU or memory limit"""
+
+
+class _UnreadableFrame(Exception):
+    """The worker could not decode the frame it was sent; it is sent again pickled"""
+
+
+def _arrow_size(table) -> int:
+    """Room an IPC stream of table needs: its buffers plus padding and message metadata"""
+    buffers = sum(len(chunk.buffers()) for column in table.columns for chunk in column.chunks)
+    return table.get_total_buffer_size() + 2 * table.schema.serialize().size + 128 * buffers + 4096
+
+
+def _write_arrow(shm: shared_memory.SharedMemory, table) -> Optional[int]:
+    """Write table into shm as an IPC stream; the bytes written, or None if it does not fit"""
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    try:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    except OSError:
+        # "Write out of bounds"
+        return None
+    # Returning drops the writer, which keeps shm.buf exported until released
+    return sink.tell()
+
+
+def _write_frame(df: pd.DataFrame, arrow: bool = True) -> tuple[str, int, str]:
+    """Write df into a new shared memory block as Arrow IPC (pickle if Arrow rejects it).
+
+    The block is sized from the table's buffers and the stream is written
+    into it directly, once; a block that turns out too small is replaced by
+    one twice the size. Frames Arrow converts but cannot restore (see
+    dtypes.arrow_roundtrips) are pickled, as is every frame when ``arrow``
+    is False. Returns (block name, payload size, format). The block is left
+    for the receiving side to unlink.
+    """
+    table = None
+    if pa is not None and arrow and arrow_roundtrips(df):
+        try:
+            # The default keeps a RangeIndex as metadata instead of an int64 column
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowException, TypeError, ValueError):
+            table = None
+    if table is not None:
+        size = _arrow_size(table)
+        while True:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            written = _write_arrow(shm, table)
+            shm.close()
+            if written is not None:
+                return shm.name, written, "arrow"
+            shm.unlink()
+            size *= 2
+
+    payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    shm = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+    try:
+        shm.buf[:len(payload)] = payload
+        return shm.name, len(payload), "pickle"
+    finally:
+        shm.close()
+
+
+def _read_frame(name: str, size: int, fmt: str, attrs: dict) -> pd.DataFrame:
+    """Load a frame written by _write_frame and unlink its shared memory block.
+
+    Arrow frames are decoded in place: the columns to_pandas does not copy
+    keep pointing into the block, which stays mapped (its name is already
+    gone) until the last of them is freed.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    shm.unlink()
+    if fmt == "arrow":
+        # foreign_buffer keeps shm, and so its mapping, alive for the buffers
+        # sliced from it; the ctypes view is released as soon as it is read
+        address = ctypes.addressof(ctypes.c_char.from_buffer(shm.buf))
+        payload = pa.foreign_buffer(address, size, base=shm)
+        df = pa.ipc.open_stream(pa.BufferReader(payload)).read_all().to_pandas()
+    else:
+        try:
+            df = pickle.loads(shm.buf[:size])
+        finally:
+            shm.close()
+    df.attrs = attrs
+    return df
+
+
+def _serialize_figures(figures: list) -> list:
+    """Convert live figures into picklable payloads for the parent process"""
+    serialized = []
+    for kind, fig, note in figures:
+        try:
+            if kind == "plotly":
+                serialized.append(("plotly_json", fig.to_json(), note))
+            elif kind == "matplotlib":
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format="png", bbox_inches="tight")
+                serialized.append(("png", buffer.getvalue(), note))
+        except Exception:
+            pass
+    return serialized
+
+
+def _status_bytes(field: str, pid: str = "self") -> Optional[int]:
+    """A size from /proc/<pid>/status, e.g. VmData (private writable memory) or VmRSS"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _worker_main(conn, sys_path: list, memory_bytes: int) -> None:
+    """Worker loop: receive (code, frame) tasks and send results back"""
+    sys.path[:] = sys_path
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    for module in WARM_MODULES:
+        try:
+            __import__(module)
+        except Exception:
+            pass
+
+    import resource
+    from utils.execution import run_generated_code, run_lazy_code
+
+    # Allocations past the warmed-up size plus memory_bytes fail with
+    # MemoryError instead of waiting for the parent's RSS poll. RLIMIT_DATA
+    # rather than RLIMIT_AS: it counts the heap and anonymous mappings, but
+    # not the address space threads and malloc arenas only reserve.
+    baseline = _status_bytes("VmData")
+    if baseline is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+        limit = baseline + memory_bytes
+        resource.setrlimit(resource.RLIMIT_DATA, (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard))
+
+    conn.send(("ready", _rss_bytes(os.getpid()) or 0))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        code, frame, cpu_seconds, figure_budget = task
+        notices = []
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        # SIGXCPU terminates the worker once the task uses cpu_seconds
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, hard))
+        try:
+            if isinstance(frame, tuple):
+                try:
+                    df = _read_frame(*frame)
+                except Exception as e:
+                    raise _UnreadableFrame(str(e))
+                modified_df, execution_results, figures = run_generated_code(code, df, notify=notices.append,
+                                                                             figure_budget=figure_budget)
+                reply = ("ok", _write_frame(modified_df) + (modified_df.attrs,), execution_results,
+                         _serialize_figures(figures), notices)
+            else:
+                # A LazySource: the worker opens its own connection to the file
+                execution_results, figures = run_lazy_code(code, frame, notify=notices.append,
+                                                           figure_budget=figure_budget)
+                reply = ("ok", None, execution_results, _serialize_figures(figures), notices)
+        except _UnreadableFrame as e:
+            reply = ("unreadable", str(e), notices)
+        except MissingPackageError as e:
+            reply = ("missing", e.module, notices)
+        except MemoryError:
+            reply = ("error", "Error executing code: out of memory", notices)
+        except Exception as e:
+            reply = ("error", str(e), notices)
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+            plt = sys.modules.get("matplotlib.pyplot")
+            if plt is not None:
+                plt.close("all")
+        conn.send(reply)
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Worker:
+    def __init__(self, context, memory_bytes: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, list(sys.path), memory_bytes),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.baseline_rss = 0   # resident memory after the warm-up imports
+
+    def wait_ready(self, timeout: float) -> None:
+        """Block until the worker finished its warm-up imports"""
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise SandboxError("Execution worker did not start in time")
+        message = self.conn.recv()
+        if not (isinstance(message, tuple) and message[0] == "ready"):
+            raise SandboxError("Execution worker sent an unexpected message during startup")
+        self.baseline_rss = message[1]
+        self.ready = True
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+
+
+class SandboxPool:
+    """Pool of warm worker processes that run generated code out of process.
+
+    Each task is limited to ``cpu_seconds`` of CPU time, ``wall_seconds`` of
+    wall-clock time and ``memory_mb`` of memory on top of what the worker
+    holds after its warm-up imports; a worker that exceeds a limit is killed
+    and replaced. Memory is capped by an rlimit in the worker, so a large
+    allocation fails with MemoryError, and by polling its resident size. DataFrames travel both ways as
+    Arrow IPC in shared memory rather than through the pipe.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, workers: int = 2, cpu_seconds: int = 60, wall_seconds: float = 120,
+                 memory_mb: int = 2048, start_method: str = "spawn", startup_seconds: float = 120):
+        self.cpu_seconds = cpu_seconds
+        self.startup_seconds = startup_seconds
+        self.wall_seconds = wall_seconds
+        self.memory_bytes = memory_mb * 2 ** 20
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(_Worker(self._context, self.memory_bytes))
+
+    @classmethod
+    def get_pool(cls) -> Optional["SandboxPool"]:
+        """Shared pool configured by SANDBOX_* variables; None when SANDBOX_WORKERS=0"""
+        with cls._lock:
+            if cls._instance is None:
+                workers = int(os.getenv("SANDBOX_WORKERS", "2"))
+                if workers <= 0 or sys.platform == "win32":
+                    return None
+                cls._instance = cls(
+                    workers=workers,
+                    cpu_seconds=int(os.getenv("SANDBOX_CPU_SECONDS", "60")),
+                    wall_seconds=float(os.getenv("SANDBOX_WALL_SECONDS", "120")),
+                    memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", "2048")),
+                )
+            return cls._instance
+
+    def run(self, code: str, df: pd.DataFrame, notify: Optional[Callable[[str], None]] = None,
+            figure_budget: Optional[FigureBudget] = None) -> tuple[pd.DataFrame, dict, list]:
+        """Run code in a worker; same return shape as run_generated_code"""
+        _, result_frame, execution_results, figures, _ = self._run(code, df, notify, figure_budget)
+        return _read_frame(*result_frame), execution_results, figures
+
+    def run_lazy(self, code: str, source, notify: Optional[Callable[[str], None]] = None,
+                 figure_budget: Optional[FigureBudget] = None) -> tuple[dict, list]:
+        """Run code against a LazySource in a worker; same return shape as run_lazy_code"""
+        _, _, execution_results, figures, _ = self._run(code, source, notify, figure_budget)
+        return execution_results, figures
+
+    def _run(self, code: str, data, notify: Optional[Callable[[str], None]],
+             figure_budget: Optional[FigureBudget]) -> tuple:
+        worker = self._idle.get()
+        frame = None
+        try:
+            if not worker.process.is_alive():
+                worker = _Worker(self._context, self.memory_bytes)
+            # Warm-up imports do not count against the task's time limit
+            worker.wait_ready(self.startup_seconds)
+            for arrow in (True, False):
+                frame = _write_frame(data, arrow) + (data.attrs,) if isinstance(data, pd.DataFrame) else data
+                worker.conn.send((code, frame, self.cpu_seconds, figure_budget))
+                reply = self._wait(worker)
+                frame = None  # the worker unlinked the input block
+                # A frame the worker could not decode from Arrow is sent again pickled
+                if reply[0] != "unreadable" or not isinstance(data, pd.DataFrame):
+                    break
+        except BaseException:
+            worker.kill()
+            worker = _Worker(self._context, self.memory_bytes)
+            if isinstance(frame, tuple):
+                self._unlink(frame[0])
+            raise
+        finally:
+            self._idle.put(worker)
+
+        if notify is not None:
+            for message in reply[-1]:
+                notify(message)
+        if reply[0] == "missing":
+            raise MissingPackageError(reply[1])
+        if reply[0] in ("error", "unreadable"):
+            raise Exception(reply[1])
+        return reply
+
+    def _wait(self, worker: _Worker):
+        deadline = time.monotonic() + self.wall_seconds
+        crashed = "Execution stopped: the code exceeded its CPU time limit or crashed the worker"
+        while not worker.conn.poll(0.1):
+            if not worker.process.is_alive():
+                raise SandboxTimeout(crashed)
+            if time.monotonic() > deadline:
+                raise SandboxTimeout(f"Execution stopped: the code ran longer than {self.wall_seconds:g}s")
+            rss = _rss_bytes(worker.process.pid)
+            if rss is not None and rss - worker.baseline_rss > self.memory_bytes:
+                raise SandboxTimeout(
+                    f"Execution stopped: the code used more than {self.memory_bytes // 2 ** 20} MB of memory")
+        try:
+            return worker.conn.recv()
+        except EOFError:
+            raise SandboxTimeout(crashed)
+
+    @staticmethod
+    def _unlink(name: str) -> None:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+def run_code(code: str, df: pd.DataFrame, notify: Optional[Callable[[str], None]] = None,
+             figure_budget: Optional[FigureBudget] = None) -> tuple[pd.DataFrame, dict, list]:
+    """Run generated code in the shared SandboxPool, or in-process when the pool is disabled"""
+    pool = SandboxPool.get_pool()
+    if pool is not None:
+        # Runs in a warm worker process with CPU, wall-clock and memory limits
+        return pool.run(code, df, notify=notify, figure_budget=figure_budget)
+    from utils.execution import run_generated_code
+    return run_generated_code(code, df, notify=notify, figure_budget=figure_budget)
+
+
+def run_lazy(code: str, source, notify: Optional[Callable[[str], None]] = None,
+             figure_budget: Optional[FigureBudget] = None) -> tuple[dict, list]:
+    """Run generated code against a LazySource in the shared SandboxPool, or in-process when it is disabled"""
+    pool = SandboxPool.get_pool()
+    if pool is not None:
+        return pool.run_lazy(code, source, notify=notify, figure_budget=figure_budget)
+    from utils.execution import run_lazy_code
+    return run_lazy_code(code, source, notify=notify, figure_budget=figure_budget)
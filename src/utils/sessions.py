@@ -0,0 +1,392 @@
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import pandas as pd
+
+from utils.dtypes import arrow_roundtrips
+from utils.fingerprint import FrameFingerprint, frame_fingerprint
+from utils.versions import VersionStore
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - frames are pickled instead
+    pa = None
+
+_SESSION_ID = re.compile(r"[0-9a-f]{32}")
+_ATTRS_KEY = b"dsa.attrs"
+
+
+def default_session_dir() -> str:
+    """Private per-user directory for saved sessions: $XDG_CACHE_HOME/dsa/sessions or ~/.cache/dsa/sessions"""
+    cache = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "dsa", "sessions")
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(value) -> bool:
+    """Whether value can name a session; ids come from the URL and end up in file paths"""
+    return isinstance(value, str) and _SESSION_ID.fullmatch(value) is not None
+
+
+class SessionBackend:
+    """Persistent storage for sessions: a state dict and the current DataFrame per session id"""
+
+    def save_state(self, session_id: str, state: dict) -> None:
+        raise NotImplementedError
+
+    def load_state(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def save_frame(self, session_id: str, df: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def load_frame(self, session_id: str) -> Optional[pd.DataFrame]:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def expire(self, max_age: float) -> int:
+        """Delete the sessions not saved for max_age seconds; returns how many"""
+        raise NotImplementedError
+
+
+class LocalSessionBackend(SessionBackend):
+    """One directory per session under ``root`` with state.pkl and data.arrow.
+
+    The DataFrame is written as an uncompressed Arrow IPC file so that it
+    can be memory-mapped when the session is restored; frames Arrow cannot
+    represent or restore (e.g. mixed-type object columns, pd.cut intervals)
+    are pickled to data.pkl.
+    Files are replaced atomically.
+
+    The state is unpickled on load, so ``root`` and the session directories
+    are created readable by the owner only (0700). The session id is the only
+    credential: anyone who has it (e.g. from a shared URL) opens the session.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        # makedirs leaves an existing directory's mode alone
+        os.chmod(root, 0o700)
+
+    def _path(self, session_id: str, name: str = "") -> str:
+        if not valid_session_id(session_id):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        return os.path.join(self.root, session_id, name)
+
+    @staticmethod
+    def _replace(path: str, write) -> None:
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write(temporary)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def save_state(self, session_id: str, state: dict) -> None:
+        os.makedirs(self._path(session_id), mode=0o700, exist_ok=True)
+
+        def write(path):
+            with open(path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._replace(self._path(session_id, "state.pkl"), write)
+
+    def load_state(self, session_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(session_id, "state.pkl"), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save_frame(self, session_id: str, df: pd.DataFrame) -> None:
+        os.makedirs(self._path(session_id), mode=0o700, exist_ok=True)
+        arrow_path, pickle_path = self._path(session_id, "data.arrow"), self._path(session_id, "data.pkl")
+        try:
+            if not arrow_roundtrips(df):
+                raise TypeError("Arrow cannot restore this frame")
+            # RangeIndex is kept as metadata, other indexes as columns
+            table = pa.Table.from_pandas(df)
+            table = table.replace_schema_metadata(
+                {**(table.schema.metadata or {}), _ATTRS_KEY: pickle.dumps(df.attrs)})
+
+            def write(path):
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+            self._replace(arrow_path, write)
+            stale = pickle_path
+        except (TypeError, ValueError, getattr(pa, "ArrowException", TypeError)):
+            self._replace(pickle_path, lambda path: df.to_pickle(path))
+            stale = arrow_path
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def load_frame(self, session_id: str) -> Optional[pd.DataFrame]:
+        arrow_path, pickle_path = self._path(session_id, "data.arrow"), self._path(session_id, "data.pkl")
+        if pa is not None and os.path.exists(arrow_path):
+            # Columns converted without copying keep the mapping open
+            table = pa.ipc.open_file(pa.memory_map(arrow_path)).read_all()
+            df = table.to_pandas()
+            attrs = (table.schema.metadata or {}).get(_ATTRS_KEY)
+            if attrs:
+                df.attrs = pickle.loads(attrs)
+            return df
+        if os.path.exists(pickle_path):
+            return pd.read_pickle(pickle_path)
+        return None
+
+    def delete(self, session_id: str) -> None:
+        shutil.rmtree(self._path(session_id), ignore_errors=True)
+
+    def expire(self, max_age: float) -> int:
+        cutoff = time.time() - max_age
+        expired = 0
+        for name in os.listdir(self.root):
+            if not valid_session_id(name):
+                continue
+            directory = os.path.join(self.root, name)
+            try:
+                saved = max(os.path.getmtime(os.path.join(directory, file)) for file in os.listdir(directory))
+            except (OSError, ValueError):
+                saved = 0.0
+            if saved < cutoff:
+                self.delete(name)
+                expired += 1
+        return expired
+
+
+class _Session:
+    __slots__ = ("id", "versions", "state", "last_used", "saved_token", "spilled")
+
+    def __init__(self, session_id: str, versions: VersionStore, state: dict, saved_token: Optional[str]):
+        self.id = session_id
+        self.versions = versions
+        self.state = state
+        self.last_used = time.monotonic()
+        self.saved_token = saved_token
+        self.spilled = False
+
+
+class SessionManager:
+    """Server-side sessions of this process, kept within one memory budget.
+
+    Each session has a VersionStore holding its DataFrames and a state dict
+    (chat and execution history and the like). When the frames of all
+    sessions exceed ``memory_budget_mb``, the least recently used sessions
+    other than the one being served are spilled to disk; sessions idle for
+    ``idle_seconds`` are spilled by a background thread. A spilled session
+    reads its current frame back (memory-mapped) on its next request.
+
+    With a ``backend``, the state and the current frame of every session
+    are saved after each request (the frame only when it changed, on a
+    background thread), so a session can be restored by id after a
+    restart. Sessions not used for ``ttl_seconds`` are dropped from memory
+    and from the backend.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, backend: Optional[SessionBackend] = None, memory_budget_mb: int = 2048,
+                 idle_seconds: float = 600, ttl_seconds: float = 72 * 3600, check_interval: float = 30):
+        self.backend = backend
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self.idle_seconds = idle_seconds
+        self.ttl_seconds = ttl_seconds
+        self.counters = {"restored": 0, "evicted": 0, "idle_spilled": 0, "expired": 0, "saves": 0, "frame_saves": 0}
+        self._sessions = {}
+        self._pending = {}    # session id -> (state, frame or None) waiting to be saved
+        self._lock = threading.RLock()
+        self._saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-save")
+        self._stop = threading.Event()
+        if backend is not None and ttl_seconds:
+            self._saver.submit(self._expire)
+        self._watcher = threading.Thread(target=self._watch, args=(check_interval,), daemon=True,
+                                         name="session-idle")
+        self._watcher.start()
+
+    @classmethod
+    def get_manager(cls) -> "SessionManager":
+        with cls._instance_lock:
+            if cls._instance is None:
+                backend = None
+                if os.getenv("SESSION_BACKEND", "local").lower() == "local":
+                    backend = LocalSessionBackend(
+                        os.getenv("SESSION_DIR") or default_session_dir())
+                cls._instance = cls(
+                    backend=backend,
+                    memory_budget_mb=int(os.getenv("SESSION_MEMORY_MB", "2048")),
+                    idle_seconds=float(os.getenv("SESSION_IDLE_MINUTES", "10")) * 60,
+                    ttl_seconds=float(os.getenv("SESSION_TTL_HOURS", "72")) * 3600,
+                )
+            return cls._instance
+
+    def open(self, session_id: str) -> tuple[VersionStore, dict]:
+        """VersionStore and state of a session: the live ones, else restored from the backend, else new"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._restore(session_id) or _Session(session_id, VersionStore.from_env(), {}, None)
+                self._sessions[session_id] = session
+            self._touch(session)
+            return session.versions, session.state
+
+    def _restore(self, session_id: str) -> Optional[_Session]:
+        if self.backend is None:
+            return None
+        state = self.backend.load_state(session_id)
+        if state is None:
+            return None
+        state = dict(state)
+        version_id = state.pop("version", None)
+        fingerprint = state.pop("fingerprint", None)
+        versions = VersionStore.from_env(first_id=version_id or 0)
+        df = self.backend.load_frame(session_id)
+        if df is not None:
+            if not isinstance(fingerprint, FrameFingerprint):
+                fingerprint = frame_fingerprint(df)
+            versions.commit(df, fingerprint, label="Restored session")
+        self.counters["restored"] += 1
+        return _Session(session_id, versions, state, fingerprint.token if df is not None else None)
+
+    def touch(self, session_id: str) -> None:
+        """Mark a session as in use, spilling others if the memory budget is exceeded"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._touch(session)
+
+    def _touch(self, session: _Session) -> None:
+        session.last_used = time.monotonic()
+        if session.spilled:
+            # Read the frame back before making room for it
+            session.versions.current_frame()
+            session.spilled = False
+        self._enforce_budget(session)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(session.versions.stats()["memory_bytes"] for session in self._sessions.values())
+
+    def _enforce_budget(self, keep: _Session) -> None:
+        sizes = {session.id: session.versions.stats()["memory_bytes"] for session in self._sessions.values()}
+        total = sum(sizes.values())
+        for session in sorted(self._sessions.values(), key=lambda session: session.last_used):
+            if total <= self.memory_budget:
+                break
+            if session is keep or not sizes[session.id]:
+                continue
+            total -= session.versions.spill_all()
+            session.spilled = True
+            self.counters["evicted"] += 1
+
+    def save(self, session_id: str, state: dict) -> None:
+        """Record the state of a session and save it, and its current frame if changed, in the background"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session.state = state
+            self._touch(session)
+            # Visitors who never upload anything leave nothing on disk
+            if self.backend is None or session.versions.current is None:
+                return
+            fingerprint = session.versions.current_fingerprint
+            token = fingerprint.token if fingerprint is not None else None
+            # Lists are copied so that the app can append while the copy is pickled
+            state = {key: list(value) if isinstance(value, list) else value for key, value in state.items()}
+            state.update(version=session.versions.current, fingerprint=fingerprint)
+            frame = None
+            if token is not None and token != session.saved_token:
+                frame = session.versions.current_frame()
+                session.saved_token = token
+            queued = session_id in self._pending
+            if queued and frame is None:
+                frame = self._pending[session_id][1]
+            self._pending[session_id] = (state, frame)
+            if not queued:
+                self._saver.submit(self._write, session_id)
+
+    def _write(self, session_id: str) -> None:
+        with self._lock:
+            state, frame = self._pending.pop(session_id, (None, None))
+        if state is None:
+            return
+        try:
+            if frame is not None:
+                self.backend.save_frame(session_id, frame)
+                self.counters["frame_saves"] += 1
+            self.backend.save_state(session_id, state)
+            self.counters["saves"] += 1
+        except OSError:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None:
+                    session.saved_token = None
+
+    def flush(self) -> None:
+        """Wait for the saves queued so far"""
+        self._saver.submit(lambda: None).result()
+
+    def discard(self, session_id: str) -> None:
+        """Forget a session: close its versions and delete its saved copy"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            self._pending.pop(session_id, None)
+        if session is not None:
+            session.versions.close()
+        if self.backend is not None:
+            self._saver.submit(self.backend.delete, session_id).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.counters,
+                sessions=len(self._sessions),
+                spilled=sum(1 for session in self._sessions.values() if session.spilled),
+                memory_bytes=self.memory_bytes(),
+                memory_budget=self.memory_budget,
+            )
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.spill_idle()
+
+    def spill_idle(self) -> None:
+        """Spill the sessions idle for idle_seconds and drop those idle for ttl_seconds"""
+        now = time.monotonic()
+        with self._lock:
+            for session in list(self._sessions.values()):
+                idle = now - session.last_used
+                if self.ttl_seconds and idle > self.ttl_seconds and session.id not in self._pending:
+                    del self._sessions[session.id]
+                    session.versions.close()
+                    self.counters["expired"] += 1
+                elif idle > self.idle_seconds and not session.spilled:
+                    session.versions.spill_all()
+                    session.spilled = True
+                    self.counters["idle_spilled"] += 1
+        if self.backend is not None and self.ttl_seconds:
+            # On the saver thread, so that a session is not deleted while it is written
+            self._saver.submit(self._expire)
+
+    def _expire(self) -> None:
+        self.counters["expired"] += self.backend.expire(self.ttl_seconds)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._saver.shutdown(wait=True)
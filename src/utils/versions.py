@@ -0,0 +1,267 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import weakref
+from typing import Optional
+
+import pandas as pd
+
+from utils.dtypes import arrow_roundtrips
+from utils.fingerprint import FrameFingerprint
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - versions are pickled instead
+    pa = None
+
+
+class _Version:
+    """One committed DataFrame; ``frame`` is None while it is spilled to ``path``"""
+
+    __slots__ = ("id", "label", "frame", "path", "fingerprint", "attrs", "last_used")
+
+    def __init__(self, version_id: int, label: str, frame: pd.DataFrame, fingerprint: FrameFingerprint):
+        self.id = version_id
+        self.label = label
+        self.frame = frame
+        self.path = None
+        self.fingerprint = fingerprint
+        self.attrs = frame.attrs
+        self.last_used = 0
+
+
+def _share_columns(df: pd.DataFrame, fingerprint: FrameFingerprint,
+                   previous: pd.DataFrame, previous_fingerprint: FrameFingerprint) -> pd.DataFrame:
+    """df with every column whose content equals a column of previous replaced by that column.
+
+    Requires pandas copy-on-write: the shared column is copied on the first
+    write through either frame, so older versions are never modified.
+    """
+    if (df.columns.has_duplicates or previous.columns.has_duplicates
+            or fingerprint.index != previous_fingerprint.index):
+        return df
+    by_token = {previous_fingerprint.column_token(col): col for col in previous.columns}
+    shared = None
+    for col in df.columns:
+        source = by_token.get(fingerprint.column_token(col))
+        if source is None:
+            continue
+        if shared is None:
+            shared = df.copy(deep=False)
+        shared[col] = previous[source]
+    if shared is None:
+        return df
+    shared.attrs = df.attrs
+    return shared
+
+
+class VersionStore:
+    """Undo/redo history of one session's DataFrame.
+
+    Versions share the buffers of columns that did not change (detected
+    with FrameFingerprint column tokens). When the distinct column buffers
+    held in memory exceed ``memory_budget_mb``, the least recently used
+    versions other than the current one are spilled to Arrow IPC files in
+    ``spill_dir`` and read back (memory-mapped) when checked out. At most
+    ``max_versions`` are kept; committing after an undo discards the
+    versions that could have been redone.
+    """
+
+    def __init__(self, memory_budget_mb: int = 1024, spill_dir: Optional[str] = None,
+                 max_versions: int = 50, first_id: int = 0):
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self.max_versions = max_versions
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(prefix="versions-", dir=spill_dir)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+        self._versions = []
+        self._position = -1
+        self._next_id = first_id
+        self._clock = 0
+        self._column_bytes = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls, first_id: int = 0) -> "VersionStore":
+        return cls(
+            memory_budget_mb=int(os.getenv("VERSION_MEMORY_MB", "1024")),
+            spill_dir=os.getenv("VERSION_SPILL_DIR") or None,
+            max_versions=int(os.getenv("VERSION_MAX_COUNT", "50")),
+            first_id=first_id,
+        )
+
+    @property
+    def current(self) -> Optional[int]:
+        """Id of the checked-out version, None before the first commit"""
+        return self._versions[self._position].id if self._versions else None
+
+    @property
+    def current_fingerprint(self) -> Optional[FrameFingerprint]:
+        return self._versions[self._position].fingerprint if self._versions else None
+
+    @property
+    def can_undo(self) -> bool:
+        return self._position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self._position < len(self._versions) - 1
+
+    def version_ids(self) -> list:
+        return [version.id for version in self._versions]
+
+    def lineage(self) -> list:
+        """Ids of the kept versions the current one derives from, oldest first, ending with it"""
+        return [version.id for version in self._versions[:self._position + 1]]
+
+    def commit(self, df: pd.DataFrame, fingerprint: FrameFingerprint, label: str = "") -> tuple[int, pd.DataFrame]:
+        """Add df as the newest version and check it out.
+
+        Returns (version id, frame to use from now on); the frame shares
+        unchanged columns with the previous version.
+        """
+        with self._lock:
+            for dropped in self._versions[self._position + 1:]:
+                self._remove_file(dropped)
+            del self._versions[self._position + 1:]
+
+            if self._versions and self._versions[-1].frame is not None:
+                previous = self._versions[-1]
+                df = _share_columns(df, fingerprint, previous.frame, previous.fingerprint)
+            version = _Version(self._next_id, label, df, fingerprint)
+            self._next_id += 1
+            self._versions.append(version)
+            while len(self._versions) > self.max_versions:
+                self._remove_file(self._versions.pop(0))
+            self._position = len(self._versions) - 1
+            self._touch(version)
+            self._enforce_budget()
+            return version.id, df
+
+    def checkout(self, version_id: int) -> tuple[pd.DataFrame, FrameFingerprint]:
+        """Make version_id current; returns its frame (loaded from disk if spilled) and fingerprint"""
+        with self._lock:
+            for position, version in enumerate(self._versions):
+                if version.id == version_id:
+                    break
+            else:
+                raise KeyError(f"Unknown version {version_id}")
+            self._position = position
+            if version.frame is None:
+                version.frame = self._load(version)
+            self._touch(version)
+            self._enforce_budget()
+            return version.frame, version.fingerprint
+
+    def current_frame(self) -> Optional[pd.DataFrame]:
+        """The checked-out frame, read back from disk if it was spilled; None before the first commit"""
+        with self._lock:
+            if not self._versions:
+                return None
+            version = self._versions[self._position]
+            if version.frame is None:
+                version.frame = self._load(version)
+                self._touch(version)
+                self._enforce_budget()
+            return version.frame
+
+    def undo(self) -> tuple[pd.DataFrame, FrameFingerprint]:
+        return self.checkout(self._versions[self._position - 1].id)
+
+    def redo(self) -> tuple[pd.DataFrame, FrameFingerprint]:
+        return self.checkout(self._versions[self._position + 1].id)
+
+    def stats(self) -> dict:
+        """Versions kept, how many are spilled, and bytes held in memory"""
+        with self._lock:
+            return {
+                "versions": len(self._versions),
+                "spilled": sum(1 for version in self._versions if version.frame is None),
+                "memory_bytes": self._memory_bytes(),
+            }
+
+    def spill_all(self) -> int:
+        """Spill every version held in memory, the current one included; returns the bytes released"""
+        with self._lock:
+            released = self._memory_bytes()
+            for version in self._versions:
+                if version.frame is not None:
+                    self._spill(version)
+            return released
+
+    def close(self) -> None:
+        """Drop all versions and delete the spill files"""
+        with self._lock:
+            self._versions.clear()
+            self._position = -1
+            self._finalizer()
+
+    def _touch(self, version: _Version) -> None:
+        self._clock += 1
+        version.last_used = self._clock
+
+    def _token_bytes(self, version: _Version) -> dict:
+        """Column token -> bytes for the columns of an in-memory version"""
+        sizes = {}
+        for col in version.frame.columns.unique():
+            token = version.fingerprint.column_token(col)
+            if token not in self._column_bytes:
+                self._column_bytes[token] = int(version.frame[col].memory_usage(deep=True, index=False))
+            sizes[token] = self._column_bytes[token]
+        return sizes
+
+    def _memory_bytes(self) -> int:
+        # Shared columns have the same token and are counted once
+        sizes = {}
+        for version in self._versions:
+            if version.frame is not None:
+                sizes.update(self._token_bytes(version))
+        return sum(sizes.values())
+
+    def _enforce_budget(self) -> None:
+        current = self._versions[self._position]
+        while self._memory_bytes() > self.memory_budget:
+            candidates = [v for v in self._versions if v.frame is not None and v is not current]
+            if not candidates:
+                break
+            self._spill(min(candidates, key=lambda v: v.last_used))
+
+    def _spill(self, version: _Version) -> None:
+        path = os.path.join(self.spill_dir, f"v{version.id}")
+        if version.path is None:
+            try:
+                # Decided here: a spilled version that cannot be read back is lost
+                if not arrow_roundtrips(version.frame):
+                    raise TypeError("Arrow cannot restore this frame")
+                # RangeIndex is kept as metadata, other indexes as columns
+                table = pa.Table.from_pandas(version.frame)
+                path += ".arrow"
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            except (TypeError, ValueError, getattr(pa, "ArrowException", TypeError)):
+                path += ".pkl"
+                with open(path, "wb") as f:
+                    pickle.dump(version.frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+            version.path = path
+        version.frame = None
+
+    def _load(self, version: _Version) -> pd.DataFrame:
+        if version.path.endswith(".arrow"):
+            # Columns converted without copying keep the mapping open
+            df = pa.ipc.open_file(pa.memory_map(version.path)).read_all().to_pandas()
+        else:
+            with open(version.path, "rb") as f:
+                df = pickle.load(f)
+        df.attrs = version.attrs
+        return df
+
+    @staticmethod
+    def _remove_file(version: _Version) -> None:
+        if version.path is not None:
+            try:
+                os.remove(version.path)
+            except OSError:
+                pass
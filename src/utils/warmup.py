@@ -0,0 +1,99 @@
+import importlib
+import os
+import threading
+import time
+from typing import Optional
+
+from utils import metrics
+
+
+def _start_sandbox() -> None:
+    """Start the execution workers, which import the libraries generated code uses.
+
+    With SANDBOX_WORKERS=0 the code runs in this process, so the libraries
+    are imported here instead.
+    """
+    from utils.sandbox import WARM_MODULES, SandboxPool
+
+    if SandboxPool.get_pool() is not None:
+        return
+    # Generated code runs in a worker thread of the server, which has no display
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    importlib.import_module("utils.execution")
+    for module in WARM_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+
+def _build_chain() -> None:
+    """Import LangChain and build the shared LLMChainManager and response cache"""
+    from llm.chain import LLMChainManager, format_instructions
+
+    format_instructions()
+    LLMChainManager.get_cache()
+    LLMChainManager.get_instance()
+    # Imported by the LLMClient when it sends its first request
+    importlib.import_module("httpx")
+
+
+def _import_plots() -> None:
+    """Plotly Express, which draws the answers given from the data profile (see utils.intents)"""
+    importlib.import_module("plotly.express")
+
+
+# (name, task); the sandbox comes first so that its workers start while the chain is built
+TASKS = (("sandbox", _start_sandbox), ("chain", _build_chain), ("plots", _import_plots))
+
+
+class Warmup:
+    """Does the work of a first request in a background thread while the server starts.
+
+    Heavy libraries (LangChain, httpx, plotly, matplotlib, seaborn, DuckDB)
+    are not imported with the app, so a new container serves its first
+    page quickly. Starting the warm-up then builds the LLM chain and the
+    execution workers before the first "Analyze". Each task's time, or its
+    error (e.g. a missing API key, reported again by the request), is kept
+    for the benchmark.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, tasks: tuple = TASKS):
+        self.seconds = {}       # task name -> seconds
+        self.errors = {}        # task name -> error message
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(tasks,), name="warmup", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def start(cls) -> Optional["Warmup"]:
+        """Start the shared warm-up once per process; None when WARMUP_ENABLED=0"""
+        if os.getenv("WARMUP_ENABLED", "1").lower() in ("0", "false", "no", "off"):
+            return None
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _run(self, tasks: tuple) -> None:
+        with metrics.trace("warmup"):
+            for name, task in tasks:
+                started = time.perf_counter()
+                try:
+                    with metrics.span(name):
+                        task()
+                except Exception as e:
+                    self.errors[name] = f"{type(e).__name__}: {e}"
+                self.seconds[name] = time.perf_counter() - started
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every task finished; False if timeout passed first"""
+        return self._done.wait(timeout)